@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -57,6 +57,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'redis_monitor.middleware.InstrumentationMiddleware',
 ]
 
 ROOT_URLCONF = 'redilens.urls'
@@ -134,6 +135,10 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # REST Framework settings
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'redis_monitor.renderers.FastJSONRenderer',  # orjson when installed
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 100,
     'DEFAULT_PERMISSION_CLASSES': [
@@ -144,4 +149,111 @@ REST_FRAMEWORK = {
 # Custom settings
 REDIS_URL = config('REDIS_URL', default='redis://localhost:6379')
 METRICS_COLLECTION_INTERVAL = config('METRICS_COLLECTION_INTERVAL', default=3, cast=int)
-METRICS_RETENTION_DAYS = config('METRICS_RETENTION_DAYS', default=7, cast=int)
\ No newline at end of file
+METRICS_RETENTION_DAYS = config('METRICS_RETENTION_DAYS', default=7, cast=int)
+# Per-sample RedisMetric rows (the MetricBlock columns, rollups and INFO snapshots keep METRICS_RETENTION_DAYS)
+METRICS_ROW_RETENTION_DAYS = config('METRICS_ROW_RETENTION_DAYS', default=2, cast=int)
+# Shared Redis connection pool (see redis_monitor/pool.py)
+REDIS_MAX_CONNECTIONS = config('REDIS_MAX_CONNECTIONS', default=50, cast=int)
+REDIS_POOL_TIMEOUT = config('REDIS_POOL_TIMEOUT', default=5, cast=float)  # seconds to wait for a free connection
+REDIS_HEALTH_CHECK_INTERVAL = config('REDIS_HEALTH_CHECK_INTERVAL', default=30, cast=int)
+REDIS_SOCKET_TIMEOUT = config('REDIS_SOCKET_TIMEOUT', default=5, cast=float)
+REDIS_RETRY_ATTEMPTS = config('REDIS_RETRY_ATTEMPTS', default=3, cast=int)
+REDIS_RETRY_BACKOFF_BASE = config('REDIS_RETRY_BACKOFF_BASE', default=0.05, cast=float)
+REDIS_RETRY_BACKOFF_CAP = config('REDIS_RETRY_BACKOFF_CAP', default=1.0, cast=float)
+
+# Optional in-memory key-name index for /api/keys/search/ (see redis_monitor/keyindex.py)
+KEY_INDEX_ENABLED = config('KEY_INDEX_ENABLED', default=False, cast=bool)
+KEY_INDEX_SCAN_COUNT = config('KEY_INDEX_SCAN_COUNT', default=1000, cast=int)
+KEY_INDEX_RESCAN_INTERVAL = config('KEY_INDEX_RESCAN_INTERVAL', default=300, cast=int)  # used when notifications are off
+KEY_INDEX_CONFIGURE_NOTIFICATIONS = config('KEY_INDEX_CONFIGURE_NOTIFICATIONS', default=False, cast=bool)  # CONFIG SET notify-keyspace-events
+
+# Load-aware SCAN for every keyspace walk (see redis_monitor/walker.py)
+SCAN_RATE = config('SCAN_RATE', default=50000, cast=int)  # keys visited/second for walks without their own rate
+SCAN_COUNT_START = config('SCAN_COUNT_START', default=500, cast=int)
+SCAN_COUNT_MIN = config('SCAN_COUNT_MIN', default=10, cast=int)
+SCAN_COUNT_MAX = config('SCAN_COUNT_MAX', default=2000, cast=int)
+SCAN_TARGET_MS = config('SCAN_TARGET_MS', default=5, cast=float)  # COUNT is sized so one SCAN takes about this long
+SCAN_LOAD_CHECK_INTERVAL = config('SCAN_LOAD_CHECK_INTERVAL', default=1.0, cast=float)  # seconds between INFO/LATENCY reads
+SCAN_BUSY_OPS = config('SCAN_BUSY_OPS', default=50000, cast=int)  # back off at this many ops/s (0 = ignore)
+SCAN_BUSY_LATENCY_MS = config('SCAN_BUSY_LATENCY_MS', default=50, cast=int)  # back off on a new latency spike this big
+SCAN_MIN_SHARE = config('SCAN_MIN_SHARE', default=0.05, cast=float)  # lowest fraction of its rate a walk is slowed to
+
+# Namespace tree for /api/keys/tree/ (see redis_monitor/keytree.py)
+KEY_TREE_DELIMITERS = config('KEY_TREE_DELIMITERS', default=':,/,.,|', cast=Csv())  # one tree (and SCAN) per delimiter used
+KEY_TREE_SAMPLE_RATE = config('KEY_TREE_SAMPLE_RATE', default=0.05, cast=float)  # fraction of keys measured with MEMORY USAGE
+KEY_TREE_SCAN_COUNT = config('KEY_TREE_SCAN_COUNT', default=1000, cast=int)
+KEY_TREE_SCAN_RATE = config('KEY_TREE_SCAN_RATE', default=5000, cast=int)  # keys/second (0 = unlimited)
+KEY_TREE_REFRESH_INTERVAL = config('KEY_TREE_REFRESH_INTERVAL', default=300, cast=int)  # seconds between passes
+KEY_TREE_IDLE_TIMEOUT = config('KEY_TREE_IDLE_TIMEOUT', default=900, cast=int)  # stop scanning when not browsed this long
+KEY_TREE_MAX_DEPTH = config('KEY_TREE_MAX_DEPTH', default=8, cast=int)
+KEY_TREE_MAX_CHILDREN = config('KEY_TREE_MAX_CHILDREN', default=2000, cast=int)  # per node; more go to "(other)"
+KEY_TREE_MAX_NODES = config('KEY_TREE_MAX_NODES', default=100000, cast=int)  # per tree
+
+# Default keys/second cap for /api/keys/export/ (0 = unlimited)
+KEY_EXPORT_DEFAULT_RATE = config('KEY_EXPORT_DEFAULT_RATE', default=10000, cast=int)
+
+# Upper bound on keys per POST /api/keys/inspect/ call
+KEY_INSPECT_MAX_KEYS = config('KEY_INSPECT_MAX_KEYS', default=1000, cast=int)
+# Largest ?count= page of a key's value (read inside one Lua script call)
+KEY_VALUE_MAX_COUNT = config('KEY_VALUE_MAX_COUNT', default=1000, cast=int)
+
+# Bulk delete/expire/import jobs (see redis_monitor/bulkops.py)
+BULK_JOBS_IN_PROCESS = config('BULK_JOBS_IN_PROCESS', default=True, cast=bool)  # off: leave jobs to `manage.py run_bulk_jobs`
+BULK_JOB_DEFAULT_RATE = config('BULK_JOB_DEFAULT_RATE', default=5000, cast=int)  # keys/second (0 = unlimited)
+BULK_JOB_BATCH_SIZE = config('BULK_JOB_BATCH_SIZE', default=500, cast=int)  # keys per pipeline
+BULK_JOB_CHECKPOINT_SECONDS = config('BULK_JOB_CHECKPOINT_SECONDS', default=2, cast=float)  # progress save / cancel check interval
+BULK_JOB_LEASE_SECONDS = config('BULK_JOB_LEASE_SECONDS', default=60, cast=float)  # a running job silent this long (plus its pacing) can be resumed
+BULK_IMPORT_MAX_BYTES = config('BULK_IMPORT_MAX_BYTES', default=50 * 1024 * 1024, cast=int)  # largest NDJSON upload
+
+# Hot-key / change tracking from keyspace notifications (see redis_monitor/hotkeys.py); runs in `collect_metrics --loop`
+HOTKEYS_ENABLED = config('HOTKEYS_ENABLED', default=False, cast=bool)
+HOTKEYS_CONFIGURE_NOTIFICATIONS = config('HOTKEYS_CONFIGURE_NOTIFICATIONS', default=False, cast=bool)  # CONFIG SET notify-keyspace-events
+HOTKEYS_SNAPSHOT_INTERVAL = config('HOTKEYS_SNAPSHOT_INTERVAL', default=60, cast=int)  # seconds per stored window
+HOTKEYS_TOP_N = config('HOTKEYS_TOP_N', default=50, cast=int)  # keys/prefixes kept per snapshot
+HOTKEYS_CAPACITY = config('HOTKEYS_CAPACITY', default=2000, cast=int)  # counters held per window (bounds memory and error)
+HOTKEYS_DELIMITER = config('HOTKEYS_DELIMITER', default=':')
+HOTKEYS_PREFIX_DEPTH = config('HOTKEYS_PREFIX_DEPTH', default=1, cast=int)
+HOTKEYS_FREQ_INTERVAL = config('HOTKEYS_FREQ_INTERVAL', default=5, cast=float)  # seconds between OBJECT FREQ slices (LFU only)
+HOTKEYS_FREQ_SAMPLE = config('HOTKEYS_FREQ_SAMPLE', default=1000, cast=int)  # SCAN COUNT per slice
+
+# Columnar metric storage (see redis_monitor/timeseries.py)
+METRICS_BLOCK_SECONDS = config('METRICS_BLOCK_SECONDS', default=600, cast=int)  # samples per MetricBlock bucket
+METRICS_BLOCK_FLUSH_SECONDS = config('METRICS_BLOCK_FLUSH_SECONDS', default=60, cast=int)  # how often the open block is saved
+METRICS_RAW_INFO = config('METRICS_RAW_INFO', default='changes')  # 'changes' or 'always'
+METRICS_RAW_INFO_INTERVAL = config('METRICS_RAW_INFO_INTERVAL', default=3600, cast=int)  # periodic full INFO copy (0 = off)
+METRICS_ROLLUP_RETENTION_DAYS = config('METRICS_ROLLUP_RETENTION_DAYS', default=90, cast=int)  # 1m/10m/1h rollups (see redis_monitor/rollups.py)
+METRICS_COLLECTOR_WORKERS = config('METRICS_COLLECTOR_WORKERS', default=16, cast=int)  # concurrent INFO calls across instances
+METRICS_INSTANCE_TIMEOUT = config('METRICS_INSTANCE_TIMEOUT', default=2.0, cast=float)  # how long an instance's INFO may take, from when the call starts (the jitter doesn't count)
+METRICS_COLLECTION_JITTER = config('METRICS_COLLECTION_JITTER', default=0.2, cast=float)  # max random delay before each INFO (seconds)
+METRICS_WRITE_FLUSH_SECONDS = config('METRICS_WRITE_FLUSH_SECONDS', default=10, cast=int)  # buffered RedisMetric rows are bulk-inserted this often
+METRICS_WRITE_BATCH_SIZE = config('METRICS_WRITE_BATCH_SIZE', default=1000, cast=int)  # ...or once this many are buffered
+METRICS_WRITE_BUFFER_MAX = config('METRICS_WRITE_BUFFER_MAX', default=10000, cast=int)  # rows kept for retry while inserts fail; older ones are dropped
+METRICS_PRUNE_INTERVAL = config('METRICS_PRUNE_INTERVAL', default=3600, cast=int)  # seconds between retention deletes in --loop mode
+METRICS_CLUSTER_DISCOVERY_INTERVAL = config('METRICS_CLUSTER_DISCOVERY_INTERVAL', default=60, cast=int)  # how often cluster nodes are re-synced
+METRICS_DIAGNOSTICS = config('METRICS_DIAGNOSTICS', default=True, cast=bool)  # slowlog/latency/commandstats (see redis_monitor/diagnostics.py)
+METRICS_SLOWLOG_FETCH = config('METRICS_SLOWLOG_FETCH', default=128, cast=int)  # SLOWLOG GET count per tick
+METRICS_COMMANDSTATS_INTERVAL = config('METRICS_COMMANDSTATS_INTERVAL', default=60, cast=int)  # seconds between commandstats deltas
+ANALYTICS_CACHE_MB = config('ANALYTICS_CACHE_MB', default=64, cast=int)  # decoded blocks kept per process for /api/metrics/history/analytics/
+
+# Short-TTL cache for the INFO/DBSIZE-backed endpoints (see redis_monitor/infocache.py)
+INFO_CACHE_TTL = config('INFO_CACHE_TTL', default=1.0, cast=float)  # seconds; 0 keeps only request coalescing
+INFO_CACHE_ALIAS = config('INFO_CACHE_ALIAS', default='')  # Django cache alias to share replies across processes
+INFO_CACHE_FROM_COLLECTOR = config('INFO_CACHE_FROM_COLLECTOR', default=False, cast=bool)  # collector publishes each INFO to the shared cache
+
+# Live metric push over SSE (see redis_monitor/live.py)
+LIVE_PUBLISH = config('LIVE_PUBLISH', default=True, cast=bool)  # collector publishes each sample (needs LIVE_PUBSUB_URL)
+# Pub/sub server for the live push; blank disables it. Not the monitored server: the
+# PUBLISH traffic would show up in the very commandstats/ops it reports.
+LIVE_PUBSUB_URL = config('LIVE_PUBSUB_URL', default='')
+LIVE_CHANNEL = config('LIVE_CHANNEL', default='redilens:metrics')
+LIVE_QUEUE_SIZE = config('LIVE_QUEUE_SIZE', default=32, cast=int)  # frames buffered per client before it is dropped
+LIVE_HEARTBEAT = config('LIVE_HEARTBEAT', default=15, cast=float)  # seconds between keepalive comments
+
+# Per-request Redis command counts/timings as Server-Timing headers and /metrics histograms
+REDIS_INSTRUMENTATION = config('REDIS_INSTRUMENTATION', default=True, cast=bool)
+
+# Alert rules evaluated by the collector on each sample (see redis_monitor/alerts.py)
+ALERTS_ENABLED = config('ALERTS_ENABLED', default=True, cast=bool)
+ALERT_WEBHOOK_URL = config('ALERT_WEBHOOK_URL', default='')  # default receiver for rules without their own webhook_url
+ALERT_WEBHOOK_TIMEOUT = config('ALERT_WEBHOOK_TIMEOUT', default=5, cast=float)  # seconds per webhook POST
+ALERT_RULES_REFRESH_SECONDS = config('ALERT_RULES_REFRESH_SECONDS', default=30, cast=int)  # how often rule edits are picked up
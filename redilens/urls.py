@@ -15,8 +15,10 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from redis_monitor.views import prometheus_metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('redis_monitor.urls')),
+    path('metrics', prometheus_metrics, name='prometheus-metrics'),
 ]
\ No newline at end of file
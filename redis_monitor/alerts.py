@@ -0,0 +1,259 @@
+"""
+Alert rules evaluated on the metric stream.
+
+The collector hands every sample to ``AlertEngine.evaluate()`` as it is
+taken. Each (rule, instance) pair keeps its own running statistics, updated
+in O(1) per sample and never re-read from history: the previous value for
+rates, a sliding-window mean/variance (Welford, with the oldest sample
+swapped out) for z-scores and an exponentially weighted mean/variance for
+EWMA rules. Baselines start over when the collector restarts or a rule is
+edited.
+
+Only transitions touch the database: an ``Alert`` row is created when a
+rule starts firing and updated when it resolves. The collector's
+transitions for one tick are POSTed together, one request per webhook URL,
+from a background thread so a slow receiver never delays collection.
+Rules are re-read every ``ALERT_RULES_REFRESH_SECONDS``.
+"""
+import json
+import logging
+import math
+import time
+import urllib.request
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .models import Alert, AlertRule
+
+logger = logging.getLogger(__name__)
+
+
+class RollingStats:
+    """Mean and variance of the last ``window`` values."""
+    __slots__ = ('window', 'values', 'mean', 'm2')
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    @property
+    def ready(self):
+        return len(self.values) >= self.window
+
+    def std(self):
+        n = len(self.values)
+        return math.sqrt(max(self.m2, 0.0) / (n - 1)) if n > 1 else 0.0
+
+    def add(self, x):
+        if len(self.values) < self.window:
+            self.values.append(x)
+            delta = x - self.mean
+            self.mean += delta / len(self.values)
+            self.m2 += delta * (x - self.mean)
+            return
+        old = self.values.popleft()
+        self.values.append(x)
+        mean = self.mean + (x - old) / self.window
+        self.m2 += (x - old) * (x - mean + old - self.mean)
+        self.mean = mean
+
+
+class EWStats:
+    """Exponentially weighted mean and variance, span ``window`` values."""
+    __slots__ = ('alpha', 'window', 'n', 'mean', 'var')
+
+    def __init__(self, window):
+        self.window = window
+        self.alpha = 2 / (window + 1)
+        self.n = 0
+        self.mean = 0.0
+        self.var = 0.0
+
+    @property
+    def ready(self):
+        return self.n >= self.window
+
+    def std(self):
+        return math.sqrt(self.var)
+
+    def add(self, x):
+        self.n += 1
+        if self.n == 1:
+            self.mean = x
+            return
+        delta = x - self.mean
+        step = self.alpha * delta
+        self.mean += step
+        self.var = (1 - self.alpha) * (self.var + delta * step)
+
+
+class Series:
+    """What one rule remembers about one instance between samples."""
+    __slots__ = ('stats', 'last', 'breaches', 'alert')
+
+    def __init__(self, rule, alert=None):
+        self.stats = {'zscore': RollingStats, 'ewma': EWStats}.get(rule.kind, lambda window: None)(rule.window)
+        self.last = None  # (timestamp, value) of the previous sample
+        self.breaches = 0  # samples in a row past the threshold
+        self.alert = alert  # open Alert, if firing
+
+    def score(self, rule, timestamp, value):
+        """The number ``rule`` compares with its threshold, or None (no baseline yet, flat baseline, ...)."""
+        last, self.last = self.last, (timestamp, value)
+        if rule.kind == 'threshold':
+            return value
+        if rule.kind == 'rate':
+            if last is None:
+                return None
+            seconds = (timestamp - last[0]).total_seconds()
+            change = value - last[1]
+            if seconds <= 0 or (rule.metric == 'rejected_connections' and change < 0):
+                return None  # counter reset by a restart
+            return change / seconds
+        stats = self.stats
+        score = None
+        if stats.ready:
+            std = stats.std()
+            if std > 0:
+                score = (value - stats.mean) / std
+        stats.add(value)
+        return score
+
+
+def _breached(rule, score):
+    if score is None:
+        return False
+    return score > rule.threshold if rule.direction == 'above' else score < rule.threshold
+
+
+def _message(rule, instance, score, value):
+    what = {'threshold': '', 'rate': ' change/s', 'zscore': ' z-score', 'ewma': ' EWMA z-score'}[rule.kind]
+    return (f"{instance.name}: {rule.metric}{what} {score:.4g} is {rule.direction} {rule.threshold:g} "
+            f"(value {value:.4g})")[:512]
+
+
+def alert_payload(alert):
+    rule = alert.rule
+    return {
+        'id': alert.id,
+        'state': alert.state,
+        'rule': rule.name,
+        'rule_id': rule.id,
+        'instance': alert.instance.name,
+        'metric': rule.metric,
+        'kind': rule.kind,
+        'direction': rule.direction,
+        'threshold': rule.threshold,
+        'value': alert.value,
+        'score': alert.score,
+        'peak_score': alert.peak_score,
+        'started_at': alert.started_at,
+        'resolved_at': alert.resolved_at,
+        'message': alert.message,
+    }
+
+
+def post_webhook(url, alerts):
+    body = json.dumps({'alerts': alerts}, cls=DjangoJSONEncoder).encode()
+    request = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'}, method='POST')
+    try:
+        with urllib.request.urlopen(request, timeout=settings.ALERT_WEBHOOK_TIMEOUT) as response:
+            response.read()
+    except Exception:
+        logger.exception('Alert webhook %s failed (%d alerts)', url, len(alerts))
+
+
+class AlertEngine:
+    """Rules and per-(rule, instance) state for one collector process."""
+
+    def __init__(self):
+        self.rules = []
+        self.series = {}  # (rule id, instance id) -> Series
+        self.loaded_at = None  # monotonic
+        self.versions = {}  # rule id -> updated_at, to notice edits
+        self.notifier = ThreadPoolExecutor(max_workers=1, thread_name_prefix='alert-webhook')
+
+    def refresh(self):
+        """Re-read the enabled rules; edited or removed rules drop their state and resolve their alerts."""
+        self.loaded_at = time.monotonic()
+        rules = list(AlertRule.objects.filter(enabled=True))
+        versions = {rule.id: rule.updated_at for rule in rules}
+        stale = {rule_id for rule_id, updated_at in self.versions.items() if versions.get(rule_id) != updated_at}
+        resolved = []
+        for key in [key for key in self.series if key[0] in stale]:
+            alert = self.series.pop(key).alert
+            if alert is not None:
+                resolved.append(self._resolve(alert, timezone.now()))
+        # Open alerts from before a restart carry on (their baseline starts over).
+        for alert in Alert.objects.filter(state=Alert.STATE_FIRING).select_related('rule', 'instance'):
+            key = (alert.rule_id, alert.instance_id)
+            if alert.rule_id not in versions:
+                resolved.append(self._resolve(alert, timezone.now()))
+            elif key not in self.series:
+                self.series[key] = Series(alert.rule, alert)
+        self.rules = rules
+        self.versions = versions
+        self.notify(resolved)
+
+    def evaluate(self, samples):
+        """
+        Feed one tick's ``[(instance, RedisMetric), ...]`` to every matching
+        rule; returns the alerts that fired or resolved (saved and notified).
+        """
+        if self.loaded_at is None or time.monotonic() - self.loaded_at >= settings.ALERT_RULES_REFRESH_SECONDS:
+            self.refresh()
+        changed = []
+        for rule in self.rules:
+            for instance, metric in samples:
+                if rule.instance_id is not None and rule.instance_id != instance.id:
+                    continue
+                value = getattr(metric, rule.metric)
+                if value is None:
+                    continue
+                key = (rule.id, instance.id)
+                series = self.series.get(key)
+                if series is None:
+                    series = self.series[key] = Series(rule)
+                score = series.score(rule, metric.timestamp, float(value))
+                if _breached(rule, score):
+                    series.breaches += 1
+                    if series.alert is None and series.breaches >= rule.for_samples:
+                        series.alert = Alert.objects.create(
+                            rule=rule, instance=instance, started_at=metric.timestamp, value=value,
+                            score=score, peak_score=score, message=_message(rule, instance, score, value),
+                        )
+                        changed.append(series.alert)
+                    elif series.alert is not None:
+                        peak = series.alert.peak_score
+                        series.alert.peak_score = max(peak, score) if rule.direction == 'above' else min(peak, score)
+                else:
+                    series.breaches = 0
+                    if series.alert is not None and score is not None:
+                        changed.append(self._resolve(series.alert, metric.timestamp))
+                        series.alert = None
+        self.notify(changed)
+        return changed
+
+    def _resolve(self, alert, at):
+        alert.state = Alert.STATE_RESOLVED
+        alert.resolved_at = at
+        alert.save(update_fields=['state', 'resolved_at', 'peak_score'])
+        return alert
+
+    def notify(self, alerts):
+        by_url = {}
+        for alert in alerts:
+            url = alert.rule.webhook_url or settings.ALERT_WEBHOOK_URL
+            if url:
+                by_url.setdefault(url, []).append(alert_payload(alert))
+        for url, payloads in by_url.items():
+            self.notifier.submit(post_webhook, url, payloads)
+
+    def close(self):
+        self.notifier.shutdown(wait=True)
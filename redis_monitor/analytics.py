@@ -0,0 +1,344 @@
+"""
+Aggregates over a range of samples, computed server-side with NumPy
+(``/api/metrics/history/analytics/``).
+
+The range is read from the columnar ``MetricBlock`` store straight into
+arrays. Integer columns and timestamps are varint deltas, so the bytes of
+every block are concatenated and decoded in one pass: the varints are split
+on their terminator bytes, and each block's deltas are summed with a
+segmented cumulative sum. Float records are as long as their header byte
+says, so their starts are found one sample position at a time across all
+blocks together, then every XOR is read and accumulated in one pass. Blocks
+don't change once their bucket has passed, so their decoded columns are kept
+per process (up to ``ANALYTICS_CACHE_MB``) and a dashboard re-reading the
+same week only decodes the collector's open block again.
+
+A week of 3-second samples (~200k) takes about 0.3 s on a first read, mostly
+zlib and the block query, and 80-110 ms once its blocks are cached: the
+sub-100 ms target is missed on a first read and only just met when cached.
+
+A series is named after a registry field: ``used_memory`` is the value as
+sampled, ``rate:keyspace_hits`` is a counter's change per second (a drop
+means the server restarted, and that interval is skipped) and ``hit_rate``
+is hits / (hits + misses) between consecutive samples. For each series the
+API returns the count, min, max, mean, std, last value and percentiles. It
+also returns the Pearson correlation between series and at most ``points``
+bucket means, optionally smoothed first by a trailing moving average of
+``smooth`` seconds.
+"""
+import threading
+import zlib
+from collections import OrderedDict
+
+from django.conf import settings
+
+try:
+    import numpy as np
+except ImportError:  # analytics are unavailable without it
+    np = None
+
+from .timeseries import FIELD_NAMES, FLOAT, HAS_NULLS, _read_varint, from_ms, to_ms
+
+DERIVED = {'hit_rate': ('keyspace_hits', 'keyspace_misses')}
+RATE_PREFIX = 'rate:'
+
+# Decoded columns of recently read blocks, LRU, up to ANALYTICS_CACHE_MB:
+# block id -> ((sample count, end), {'': epoch ms, field: values}, bytes). A
+# block that grew since (the collector's open block) is decoded again.
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_cached_bytes = 0
+
+
+def base_fields(name):
+    """The registry fields series ``name`` is computed from; ValueError if it isn't one."""
+    if name in DERIVED:
+        return DERIVED[name]
+    field = name[len(RATE_PREFIX):] if name.startswith(RATE_PREFIX) else name
+    if field not in FIELD_NAMES:
+        raise ValueError(f"Unknown series '{name}'")
+    return (field,)
+
+
+def _varints(data):
+    """Decode a uint8 array of back-to-back zigzag varints into int64."""
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.empty_like(ends)
+    starts[:1] = 0
+    starts[1:] = ends[:-1] + 1
+    z = (data[starts] & 0x7F).astype(np.uint64)
+    # Most deltas fit in a byte or two: one pass per byte position, over the varints that long.
+    longer = np.flatnonzero(ends > starts)
+    shift = 7
+    while len(longer):
+        at = starts[longer] + shift // 7
+        z[longer] |= (data[at] & 0x7F).astype(np.uint64) << np.uint64(shift)
+        longer = longer[ends[longer] > at]
+        shift += 7
+    return (z >> np.uint64(1)).astype(np.int64) ^ -(z & np.uint64(1)).astype(np.int64)
+
+
+def _segmented_cumsum(values, counts):
+    """``cumsum`` restarting at every segment of ``counts`` values (int64 wraparound cancels out)."""
+    if not len(values):
+        return values
+    total = np.cumsum(values)
+    starts = np.cumsum(counts) - counts
+    before = np.where(starts > 0, total[np.maximum(starts - 1, 0)], 0)
+    return total - np.repeat(before, counts)
+
+
+# Bytes in a float record (see timeseries._encode_floats), by its header byte:
+# the header, then 8 - leading - trailing bytes of the XOR (none for header 0).
+_FLOAT_RECORD = np.array([1] + [9 - ((h >> 3) & 0x07) - (h & 0x07) for h in range(1, 256)]) if np else None
+
+
+def _xor_floats(bodies, counts):
+    """
+    Decode XOR-encoded float columns, a uint8 array per block holding
+    ``counts`` values, into one float64 array.
+    """
+    if not counts.any():
+        return np.zeros(0)
+    data = np.concatenate(bodies + [np.zeros(8, dtype=np.uint8)])
+    # Record starts: the n-th record of every block at once, one step per sample in a block.
+    sizes = np.array([len(body) for body in bodies])
+    starts = np.empty((int(counts.max()), len(bodies)), dtype=np.intp)
+    starts[0] = np.cumsum(sizes) - sizes
+    last = len(data) - 1  # shorter blocks run on into the next ones; their extra steps are dropped below
+    for n in range(1, len(starts)):
+        np.minimum(starts[n - 1] + _FLOAT_RECORD[data[starts[n - 1]]], last, out=starts[n])
+    starts = starts.T[np.arange(len(starts)) < counts[:, None]]
+    headers = data[starts].astype(np.uint64)
+    leading, trailing = (headers >> np.uint64(3)) & np.uint64(0x07), headers & np.uint64(0x07)
+    # The 8 bytes after every header as a big-endian integer; keep the XOR's and shift them into place.
+    following = np.ndarray((len(data) - 8,), dtype='>u8', buffer=data, offset=1, strides=(1,))[starts]
+    xor = (following >> (np.uint64(8) * (leading + trailing))) << (np.uint64(8) * trailing)
+    bits = np.bitwise_xor.accumulate(np.where(headers == 0, np.uint64(0), xor))
+    # Each block's values start from 0: undo the XOR of the blocks before it.
+    firsts = np.cumsum(counts) - counts
+    before = np.where(firsts > 0, bits[np.maximum(firsts - 1, 0)], np.uint64(0)).astype(np.uint64)
+    return (bits ^ np.repeat(before, counts)).view(np.float64)
+
+
+def read_arrays(instance, start=None, end=None, fields=()):
+    """
+    ``(seconds, {field: float64 array})`` for ``instance``'s samples in
+    ``[start, end]``: epoch seconds and one array per field, NaN where a
+    sample lacks the field.
+    """
+    global _cached_bytes
+    from .models import MetricBlock
+    blocks = MetricBlock.objects.filter(instance=instance).order_by('start')
+    if start:
+        blocks = blocks.filter(end__gte=start)
+    if end:
+        blocks = blocks.filter(start__lte=end)
+    ids = [(block_id, (count, block_end)) for block_id, count, block_end in blocks.values_list('id', 'count', 'end')]
+    found = {}
+    with _cache_lock:
+        for block_id, version in ids:
+            entry = _cache.get(block_id)
+            if entry is not None and entry[0] == version and all(field in entry[1] for field in fields):
+                _cache.move_to_end(block_id)
+                found[block_id] = entry[1]
+    missing = [block_id for block_id, _ in ids if block_id not in found]
+    for offset in range(0, len(missing), 500):
+        chunk = MetricBlock.objects.filter(id__in=missing[offset:offset + 500])
+        decoded = _decode_blocks(chunk.values_list('id', 'count', 'end', 'fields', 'data'), fields)
+        with _cache_lock:
+            for block_id, (version, columns) in decoded.items():
+                old = _cache.pop(block_id, None)
+                if old is not None:
+                    _cached_bytes -= old[2]
+                    if old[0] == version:
+                        columns = {**old[1], **columns}  # keep the fields decoded by earlier requests
+                found[block_id] = columns
+                size = sum(values.nbytes for values in columns.values())
+                _cache[block_id] = (version, columns, size)
+                _cached_bytes += size
+            while _cache and _cached_bytes > settings.ANALYTICS_CACHE_MB << 20:
+                _cached_bytes -= _cache.popitem(last=False)[1][2]
+    parts = [found[block_id] for block_id, _ in ids if block_id in found]  # skips blocks deleted meanwhile
+    if not parts:
+        return np.zeros(0), {field: np.zeros(0) for field in fields}
+    stamps = np.concatenate([part[''] for part in parts])
+    keep = np.ones(len(stamps), dtype=bool)
+    if start:
+        keep &= stamps >= to_ms(start)
+    if end:
+        keep &= stamps <= to_ms(end)
+    return stamps[keep] / 1000.0, {field: np.concatenate([part[field] for part in parts])[keep] for field in fields}
+
+
+def _decode_blocks(rows, fields):
+    """
+    ``{block id: ((count, end), {'': stamps, field: values})}`` for
+    ``(id, count, end, fields, data)`` rows, decoded together.
+    """
+    block_ids, versions, counts, stamp_bytes = [], [], [], []
+    columns = {field: [] for field in fields}  # field -> [(block index, column bytes)]
+    for index, (block_id, block_count, block_end, block_fields, data) in enumerate(rows):
+        buf = zlib.decompress(data)
+        count, pos = _read_varint(buf, 0)
+        raw = np.frombuffer(buf, dtype=np.uint8)
+        # The timestamp column has no length prefix: it ends with the count-th varint.
+        stamps_end = pos + int(np.flatnonzero(raw[pos:pos + 10 * count] < 0x80)[count - 1]) + 1 if count else pos
+        block_ids.append(block_id)
+        versions.append((block_count, block_end))
+        counts.append(count)
+        stamp_bytes.append(raw[pos:stamps_end])
+        pos = stamps_end
+        wanted = len(columns)
+        for field in block_fields:
+            size, pos = _read_varint(buf, pos)
+            if field in columns:
+                columns[field].append((index, raw[pos:pos + size]))
+                wanted -= 1
+                if not wanted:
+                    break
+            pos += size
+    if not block_ids:
+        return {}
+    counts = np.array(counts, dtype=np.int64)
+    stamps = _segmented_cumsum(_segmented_cumsum(_varints(np.concatenate(stamp_bytes)), counts), counts)
+    arrays = {'': stamps}
+    arrays.update((field, _assemble(parts, counts, len(stamps))) for field, parts in columns.items())
+    bounds = np.cumsum(counts)[:-1]
+    # Copies, so evicting one block frees its memory.
+    split = {field: [part.copy() for part in np.split(values, bounds)] for field, values in arrays.items()}
+    return {
+        block_id: (versions[i], {field: split[field][i] for field in arrays})
+        for i, block_id in enumerate(block_ids)
+    }
+
+
+def _assemble(parts, counts, total):
+    """One field's column bytes per block -> a float64 array over all their samples."""
+    out = np.full(total, np.nan)
+    if not parts:
+        return out
+    offsets = np.cumsum(counts) - counts
+    present = np.zeros(total, dtype=bool)  # samples the column has a value for
+    bodies, present_counts = [], []
+    for index, column in parts:
+        offset, count = offsets[index], counts[index]
+        tag, pos = int(column[0]), 1
+        if tag & HAS_NULLS:
+            size = (count + 7) // 8
+            mask = np.unpackbits(column[pos:pos + size], bitorder='little')[:count].astype(bool)
+            present[offset:offset + count] = mask
+            count = int(mask.sum())
+            pos += size
+        else:
+            present[offset:offset + count] = True
+        floats = tag & ~HAS_NULLS == FLOAT
+        bodies.append(column[pos:])
+        present_counts.append(count)
+    present_counts = np.array(present_counts, dtype=np.int64)
+    if floats:
+        out[present] = _xor_floats(bodies, present_counts)
+    else:
+        out[present] = _segmented_cumsum(_varints(np.concatenate(bodies)), present_counts)
+    return out
+
+
+def compute(name, seconds, arrays):
+    """The values of series ``name`` at each sample (NaN where undefined)."""
+    if name in DERIVED:
+        hits, misses = (np.diff(arrays[field]) for field in DERIVED[name])
+        looked_up = hits + misses
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = np.where((hits >= 0) & (misses >= 0) & (looked_up > 0), hits / looked_up, np.nan)
+        return np.concatenate(([np.nan], ratio))
+    if name.startswith(RATE_PREFIX):
+        change = np.diff(arrays[name[len(RATE_PREFIX):]])
+        elapsed = np.diff(seconds)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rate = np.where((change >= 0) & (elapsed > 0), change / elapsed, np.nan)
+        return np.concatenate(([np.nan], rate))
+    return arrays[name]
+
+
+def moving_average(seconds, values, window):
+    """Trailing mean over the samples in ``(t - window, t]``, ignoring NaN."""
+    valid = ~np.isnan(values)
+    sums = np.concatenate(([0.0], np.cumsum(np.where(valid, values, 0.0))))
+    counts = np.concatenate(([0], np.cumsum(valid)))
+    left = np.searchsorted(seconds, seconds - window, side='right')
+    right = np.arange(1, len(values) + 1)
+    n = counts[right] - counts[left]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(n > 0, (sums[right] - sums[left]) / n, np.nan)
+
+
+def _floats(array):
+    """JSON-ready list: NaN and infinities become None."""
+    out = array.astype(object)
+    out[~np.isfinite(array)] = None
+    return out.tolist()
+
+
+def summarize(values, percentiles):
+    finite = values[np.isfinite(values)]
+    if not len(finite):
+        return {'count': 0, 'min': None, 'max': None, 'mean': None, 'std': None, 'last': None,
+                'percentiles': {f'p{p:g}': None for p in percentiles}}
+    return {
+        'count': len(finite),
+        'min': float(finite.min()),
+        'max': float(finite.max()),
+        'mean': float(finite.mean()),
+        'std': float(finite.std()),
+        'last': float(finite[-1]),
+        'percentiles': dict(zip((f'p{p:g}' for p in percentiles),
+                                np.percentile(finite, percentiles).tolist())) if percentiles else {},
+    }
+
+
+def correlation(names, series):
+    """Pearson r between each pair of series, over the samples where all are defined."""
+    if len(names) < 2:
+        return None
+    matrix = np.vstack([series[name] for name in names])
+    matrix = matrix[:, np.isfinite(matrix).all(axis=0)]
+    if matrix.shape[1] < 2:
+        r = np.full((len(names), len(names)), np.nan)
+    else:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r = np.corrcoef(matrix)
+    return {'series': names, 'samples': int(matrix.shape[1]), 'matrix': [_floats(row) for row in r]}
+
+
+def bucket_means(seconds, series, start, end, points):
+    """At most ``points`` equal-width buckets of ``[start, end]`` (epoch seconds): start times and means."""
+    width = max((end - start) / points, 1e-9)
+    index = np.clip(((seconds - start) / width).astype(np.int64), 0, points - 1)
+    result = {'timestamp': [from_ms(ms) for ms in ((start + np.arange(points) * width) * 1000).round().tolist()]}
+    for name, values in series.items():
+        valid = np.isfinite(values)
+        sums = np.bincount(index[valid], weights=values[valid], minlength=points)
+        counts = np.bincount(index[valid], minlength=points)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result[name] = _floats(sums / counts)
+    return result
+
+
+def analyze(instance, start, end, names, percentiles=(50, 90, 99), smooth=0, points=300):
+    """
+    Everything ``/api/metrics/history/analytics/`` returns for series
+    ``names`` over ``[start, end]``.
+    """
+    fields = sorted({field for name in names for field in base_fields(name)})
+    seconds, arrays = read_arrays(instance, start, end, fields)
+    series = {name: compute(name, seconds, arrays) for name in names}
+    if smooth and len(seconds):
+        series = {name: moving_average(seconds, values, smooth) for name, values in series.items()}
+    result = {
+        'samples': len(seconds),
+        'series': {name: summarize(values, percentiles) for name, values in series.items()},
+        'correlation': correlation(list(names), series),
+    }
+    if points:
+        result['points'] = bucket_means(seconds, series, start.timestamp(), end.timestamp(), points)
+    return result
@@ -0,0 +1,139 @@
+"""
+Keyspace memory analysis: where does memory go, by key prefix and by key.
+
+SCAN sees every key name, so per-prefix key counts are exact. ``MEMORY
+USAGE`` is only asked for a random ``sample_rate`` fraction of them. Each
+prefix's total is then estimated as ``keys * mean sampled size``, with a 95%
+confidence interval from the sample variance (with finite population
+correction, so a full scan has an interval of zero).
+
+All accumulators are plain lists/dicts so the whole analyzer can be stored
+in ``MemoryReport.state`` and resumed later. Memory is bounded by
+``max_prefixes`` (further prefixes are folded into ``OTHER``) and ``top_n``.
+"""
+import heapq
+import math
+import random
+
+NO_PREFIX = '(none)'
+OTHER = '(other)'
+Z_95 = 1.96
+
+
+def key_prefix(key, delimiter=':', depth=1):
+    """The first ``depth`` ``delimiter``-separated parts of ``key`` (never the whole key)."""
+    parts = key.split(delimiter, depth)
+    prefix = delimiter.join(parts[:min(depth, len(parts) - 1)])
+    return prefix or NO_PREFIX
+
+
+class MemoryAnalyzer:
+    def __init__(self, delimiter=':', depth=1, sample_rate=1.0, top_n=50, max_prefixes=1000, state=None):
+        state = state or {}
+        self.delimiter = delimiter
+        self.depth = depth
+        self.sample_rate = sample_rate
+        self.top_n = top_n
+        self.max_prefixes = max_prefixes
+        # prefix -> [keys seen, keys sampled, sum of bytes, sum of bytes squared]
+        self.prefixes = state.get('prefixes', {})
+        self.top = [tuple(item) for item in state.get('top', [])]
+        heapq.heapify(self.top)
+
+    def prefix_of(self, key):
+        return key_prefix(key, self.delimiter, self.depth)
+
+    def _bucket(self, key):
+        return self._prefix_bucket(self.prefix_of(key))
+
+    def _prefix_bucket(self, prefix):
+        bucket = self.prefixes.get(prefix)
+        if bucket is None:
+            if len(self.prefixes) >= self.max_prefixes:
+                prefix = OTHER
+                bucket = self.prefixes.get(OTHER)
+            if bucket is None:
+                bucket = self.prefixes[prefix] = [0, 0, 0, 0]
+        return bucket
+
+    def add_keys(self, keys):
+        """Count a SCAN batch and return the keys to measure with MEMORY USAGE."""
+        for key in keys:
+            self._bucket(key)[0] += 1
+        if self.sample_rate >= 1:
+            return list(keys)
+        return [key for key in keys if random.random() < self.sample_rate]
+
+    def add_sample(self, key, size):
+        bucket = self._bucket_for_sample(key)
+        bucket[1] += 1
+        bucket[2] += size
+        bucket[3] += size * size
+        self._push_top(size, key)
+
+    def _push_top(self, size, key):
+        if len(self.top) < self.top_n:
+            heapq.heappush(self.top, (size, key))
+        elif size > self.top[0][0]:
+            heapq.heapreplace(self.top, (size, key))
+
+    def _bucket_for_sample(self, key):
+        prefix = self.prefix_of(key)
+        return self.prefixes.get(prefix) or self.prefixes.get(OTHER) or self._bucket(key)
+
+    def merge(self, state):
+        """Fold another analyzer's ``state()`` (e.g. a worker's share of a dump) into this one."""
+        for prefix, counts in state['prefixes'].items():
+            bucket = self._prefix_bucket(prefix)
+            for i, value in enumerate(counts):
+                bucket[i] += value
+        for size, key in state['top']:
+            self._push_top(size, key)
+
+    def state(self):
+        return {'prefixes': self.prefixes, 'top': self.top}
+
+    @staticmethod
+    def estimate(keys, sampled, total, total_sq):
+        """Return ``(estimated bytes, 95% CI half-width, variance)`` for one prefix."""
+        if sampled == 0:
+            return 0.0, None, 0.0
+        mean = total / sampled
+        estimate = keys * mean
+        if sampled >= keys:
+            return float(total), 0.0, 0.0
+        if sampled < 2:
+            return estimate, None, 0.0
+        sample_var = max(total_sq - sampled * mean * mean, 0.0) / (sampled - 1)
+        variance = keys * keys * sample_var / sampled * (1 - sampled / keys)
+        return estimate, Z_95 * math.sqrt(variance), variance
+
+    def summary(self):
+        prefixes = []
+        total_bytes = 0.0
+        total_variance = 0.0
+        unbounded = False
+        for prefix, (keys, sampled, total, total_sq) in self.prefixes.items():
+            estimate, ci, variance = self.estimate(keys, sampled, total, total_sq)
+            total_bytes += estimate
+            total_variance += variance
+            unbounded = unbounded or (ci is None and keys > 0)
+            prefixes.append({
+                'prefix': prefix,
+                'keys': keys,
+                'sampled': sampled,
+                'bytes': round(estimate),
+                'bytes_ci95': None if ci is None else round(ci),
+            })
+        prefixes.sort(key=lambda row: row['bytes'], reverse=True)
+        top, seen = [], set()
+        for size, key in sorted(self.top, reverse=True):
+            if key not in seen:  # SCAN may return a key twice
+                seen.add(key)
+                top.append({'name': key, 'bytes': size})
+        return {
+            'total_bytes': round(total_bytes),
+            'total_bytes_ci95': None if unbounded else round(Z_95 * math.sqrt(total_variance)),
+            'prefixes': prefixes,
+            'top_keys': top,
+        }
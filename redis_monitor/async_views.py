@@ -0,0 +1,136 @@
+"""
+asyncio-native variants of the key browsing, value and current-metrics
+endpoints. They talk to Redis through ``redis.asyncio`` on a shared pool, so
+when served by an ASGI server (e.g. ``uvicorn redilens.asgi:application``)
+one worker process can keep many slow SCAN/HGETALL calls in flight without
+tying up a thread per request.
+
+Responses have the same shape as the DRF viewsets in ``views.py``.
+"""
+import asyncio
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import NotFound
+from .utils import (
+    get_async_redis_connection, calculate_derived_metrics, key_rows, resolve_instance, get_instance_connection,
+    int_param,
+)
+from .infocache import info_cache, info_key
+from .live import DROPPED, get_broadcaster, pubsub_url
+from .keyinspect import inspect_key_async, page_count
+
+
+def _error(detail, e, status):
+    return JsonResponse({"detail": detail, "error": str(e)}, status=status)
+
+
+async def _connection(request):
+    """asyncio client for the instance named by ``?instance=`` (or the default one)."""
+    instance = await sync_to_async(resolve_instance)(request)
+    if instance.is_cluster:
+        raise NotFound({"detail": "Cluster instances are served by the /api/keys/ and /api/values/ endpoints"})
+    return get_async_redis_connection(instance.redis_url)
+
+
+@require_GET
+async def keys(request):
+    cursor = request.GET.get('cursor', '0')
+    try:
+        count = int_param(request.GET, 'count', 100, minimum=1)
+        r = await _connection(request)
+        next_cursor, keys = await r.scan(cursor=cursor, count=count)
+        async with r.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.type(key)
+                pipe.ttl(key)
+            results = await pipe.execute()
+        return JsonResponse({"keys": key_rows(keys, results), "next_cursor": str(next_cursor)})
+    except ValueError as e:
+        return JsonResponse({"detail": str(e)}, status=400)
+    except NotFound as e:
+        return JsonResponse(e.detail, status=404)
+    except (redis.ConnectionError, redis.TimeoutError) as e:
+        return _error("Redis unreachable", e, 503)
+    except Exception as e:
+        return _error("Error scanning keys", e, 500)
+
+
+@require_GET
+async def value(request, key):
+    cursor = request.GET.get('cursor', '0')
+    try:
+        r = await _connection(request)
+        try:
+            count = page_count(request.GET.get('count'))
+            row = await inspect_key_async(r, key, cursor, count)
+        except ValueError as e:
+            return JsonResponse({"detail": str(e)}, status=400)
+        if row is None:
+            return JsonResponse({"detail": "Key not found"}, status=404)
+        row['key'] = row.pop('name')
+        return JsonResponse(row)
+    except NotFound as e:
+        return JsonResponse(e.detail, status=404)
+    except (redis.ConnectionError, redis.TimeoutError) as e:
+        return _error("Redis unreachable", e, 503)
+    except Exception as e:
+        return _error("Error fetching value", e, 500)
+
+
+@require_GET
+async def current_metrics(request):
+    try:
+        instance = await sync_to_async(resolve_instance)(request)
+        if instance.is_cluster:
+            fetch = sync_to_async(lambda: get_instance_connection(instance).info())
+        else:
+            fetch = get_async_redis_connection(instance.redis_url).info
+        info = await info_cache.aget_or_call(info_key(instance), fetch)
+        return JsonResponse({'info': info, 'derived': calculate_derived_metrics(info)})
+    except NotFound as e:
+        return JsonResponse(e.detail, status=404)
+    except (redis.ConnectionError, redis.TimeoutError) as e:
+        return _error("Redis unreachable", e, 503)
+    except Exception as e:
+        return _error("Error fetching metrics", e, 500)
+
+
+async def _live_frames(instance):
+    broadcaster = get_broadcaster()
+    subscriber = broadcaster.subscribe(instance.id)
+    try:
+        yield 'retry: 3000\n\n'
+        while True:
+            try:
+                frame = await asyncio.wait_for(subscriber.queue.get(), timeout=settings.LIVE_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            if frame is DROPPED:
+                yield 'event: dropped\ndata: {"detail": "Client too slow, reconnect"}\n\n'
+                return
+            yield frame
+    finally:
+        broadcaster.unsubscribe(subscriber)
+
+
+@require_GET
+async def live_metrics(request):
+    """
+    Server-Sent Events stream of the samples the collector takes for
+    ``?instance=``; one ``event: metric`` per sample. Needs an ASGI server
+    and LIVE_PUBSUB_URL.
+    """
+    if pubsub_url() is None:
+        return JsonResponse({"detail": "Live metrics need LIVE_PUBSUB_URL"}, status=501)
+    try:
+        instance = await sync_to_async(resolve_instance)(request)
+    except NotFound as e:
+        return JsonResponse(e.detail, status=404)
+    response = StreamingHttpResponse(_live_frames(instance), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # don't let nginx buffer the stream
+    return response
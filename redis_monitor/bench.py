@@ -0,0 +1,11 @@
+"""
+Helpers shared by the benchmark commands (``bench_api``, ``bench_async``).
+"""
+
+
+def percentile(samples, pct):
+    """Nearest-rank ``pct`` percentile of ``samples`` (0.0 when empty)."""
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
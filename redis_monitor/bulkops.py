@@ -0,0 +1,310 @@
+"""
+Bulk key operations, run as background jobs (``BulkJob``): delete or expire
+every key matching a pattern, or import keys from NDJSON.
+
+Keys are handled in batches of ``batch_size``, one pipeline per batch, and
+paced to ``rate`` keys/second (keys SCAN visits, for pattern jobs, slowed
+further while the server is busy; see walker.py), so cleaning up millions
+of keys is a steady trickle of small pipelines rather than a latency spike. Deletes use UNLINK,
+which frees the memory off Redis's main thread. The SCAN cursor (or the
+number of NDJSON rows written) and the counters are checkpointed every
+``BULK_JOB_CHECKPOINT_SECONDS``: that is the progress the API reports, the
+moment a cancel is noticed, and where ``run_bulk_jobs --resume`` restarts.
+Checkpoints double as the job's heartbeat: a running job only counts as
+dead, and resumable, once it has gone ``lease_seconds()`` without one.
+Starting a job claims it atomically, so it never runs twice at once.
+
+Import rows are ``{"name", "type", "value"[, "ttl"]}`` with values shaped
+like ``/api/values/`` returns them; each row replaces the key.
+"""
+import itertools
+import json
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import BulkJob
+from .utils import get_instance_connection, throttle
+from .walker import KeyspaceWalker
+
+logger = logging.getLogger(__name__)
+
+WRITE_TYPES = ('string', 'hash', 'list', 'set', 'zset', 'stream')
+
+
+def _scalar(value):
+    return isinstance(value, (str, int, float)) and not isinstance(value, bool)
+
+
+def _stream_id(entry_id):
+    ms, _, seq = str(entry_id).partition('-')
+    return int(ms), int(seq or 0)
+
+
+def zset_mapping(value):
+    """``{member: score}`` from a ``{member: score}`` object or ``[[member, score], ...]`` pairs."""
+    pairs = value.items() if isinstance(value, dict) else value
+    return {member: float(score) for member, score in pairs}
+
+
+def check_value(key_type, value):
+    """Raise ValueError unless ``value`` is a JSON value ``queue_write`` can store as ``key_type``."""
+    if key_type not in WRITE_TYPES:
+        raise ValueError(f"Unsupported type '{key_type}' (use {', '.join(WRITE_TYPES)})")
+    if key_type == 'string':
+        if not _scalar(value):
+            raise ValueError("'value' must be a string or number for string type")
+        return
+    if not value:
+        raise ValueError(f"'value' must not be empty for {key_type} type")
+    if key_type == 'hash':
+        if not isinstance(value, dict) or not all(_scalar(v) for v in value.values()):
+            raise ValueError("'value' must be an object of strings/numbers for hash type")
+    elif key_type in ('list', 'set'):
+        if not isinstance(value, list) or not all(_scalar(v) for v in value):
+            raise ValueError(f"'value' must be an array of strings/numbers for {key_type} type")
+    elif key_type == 'zset':
+        try:
+            ok = all(_scalar(member) for member in zset_mapping(value))
+        except (TypeError, ValueError):
+            ok = False
+        if not ok:
+            raise ValueError("'value' must be {member: score} or [[member, score], ...] for zset type")
+    else:
+        try:
+            ok = all(isinstance(fields, dict) and fields and all(_scalar(v) for v in fields.values())
+                     and (entry_id == '*' or _stream_id(entry_id))
+                     for entry_id, fields in value)
+        except (TypeError, ValueError):
+            ok = False
+        if not ok:
+            raise ValueError("'value' must be [[id or \"*\", {field: value}], ...] for stream type")
+
+
+def parse_ttl(ttl):
+    """None for no expiry (missing or -1, as TTL reports it), else a positive number of seconds."""
+    if ttl is None or ttl == -1:
+        return None
+    if isinstance(ttl, bool) or not isinstance(ttl, (int, str)):
+        raise ValueError("'ttl' must be a whole number of seconds")
+    try:
+        ttl = int(ttl)
+    except ValueError:
+        raise ValueError("'ttl' must be a whole number of seconds")
+    if ttl <= 0:
+        raise ValueError("'ttl' must be positive (or -1 for no expiry)")
+    return ttl
+
+
+def queue_write(pipe, name, key_type, value, ttl=None, replace=False):
+    """
+    Queue the commands writing ``value`` (checked with ``check_value``) to
+    ``name`` on ``pipe``, TTL included. Collections are added to an existing
+    key unless ``replace``; strings always replace.
+    """
+    if replace and key_type != 'string':
+        pipe.unlink(name)
+    if key_type == 'string':
+        pipe.set(name, value, ex=ttl)
+        return
+    if key_type == 'hash':
+        pipe.hset(name, mapping=value)
+    elif key_type == 'list':
+        pipe.rpush(name, *value)
+    elif key_type == 'set':
+        pipe.sadd(name, *value)
+    elif key_type == 'zset':
+        pipe.zadd(name, zset_mapping(value))
+    else:
+        if all(entry_id != '*' for entry_id, _ in value):
+            value = sorted(value, key=lambda entry: _stream_id(entry[0]))  # /api/values/ pages are newest first
+        for entry_id, fields in value:
+            pipe.xadd(name, fields, id=entry_id)
+    if ttl is not None:
+        pipe.expire(name, ttl)
+
+
+def parse_row(line):
+    """One NDJSON import line -> ``{"name", "type", "value", "ttl"}``; ValueError if invalid."""
+    try:
+        row = json.loads(line)
+    except ValueError:
+        raise ValueError('not valid JSON')
+    if not isinstance(row, dict) or not isinstance(row.get('name'), str) or not row['name']:
+        raise ValueError("each row needs a 'name'")
+    key_type = row.get('type', 'string')
+    check_value(key_type, row.get('value'))
+    return {'name': row['name'], 'type': key_type, 'value': row['value'], 'ttl': parse_ttl(row.get('ttl'))}
+
+
+def iter_rows(payload):
+    """``(line number, row)`` for each non-blank line of ``payload``."""
+    for lineno, line in enumerate(payload.splitlines(), 1):
+        if line.strip():
+            yield lineno, parse_row(line)
+
+
+def validate_import(payload):
+    """Number of rows in ``payload``; ValueError naming the first bad line."""
+    rows = 0
+    for lineno, line in enumerate(payload.splitlines(), 1):
+        if line.strip():
+            try:
+                parse_row(line)
+            except ValueError as e:
+                raise ValueError(f'Line {lineno}: {e}')
+            rows += 1
+    return rows
+
+
+def _batched(iterable, size):
+    it = iter(iterable)
+    while batch := list(itertools.islice(it, size)):
+        yield batch
+
+
+def checkpoint(job, **fields):
+    """Save ``job``'s progress (plus ``fields``); False if it was cancelled meanwhile."""
+    saved = BulkJob.objects.filter(id=job.id).exclude(status=BulkJob.STATUS_CANCELLED).update(
+        cursor=job.cursor, scanned=job.scanned, affected=job.affected, failed=job.failed,
+        error=job.error, updated_at=timezone.now(), **fields,
+    )
+    if not saved:
+        job.status = BulkJob.STATUS_CANCELLED
+    return bool(saved)
+
+
+def lease_seconds(job):
+    """
+    How long a running ``job`` may go without a checkpoint before it is
+    presumed dead: ``BULK_JOB_LEASE_SECONDS`` plus the longest a batch can be
+    paced for (its rate, slowed to ``SCAN_MIN_SHARE`` on a busy server).
+    """
+    rate = (job.rate or settings.SCAN_RATE) * settings.SCAN_MIN_SHARE
+    return settings.BULK_JOB_LEASE_SECONDS + (job.batch_size / rate if rate else 0)
+
+
+def claim(job, resume=False):
+    """
+    Atomically mark ``job`` running; False if another process got it first
+    (or it is running and, with ``resume``, still alive).
+    """
+    claimable = Q(status=BulkJob.STATUS_PENDING)
+    if resume:
+        stale = timezone.now() - timedelta(seconds=lease_seconds(job))
+        claimable |= Q(status=BulkJob.STATUS_RUNNING, updated_at__lt=stale)
+    claimed = BulkJob.objects.filter(claimable, id=job.id).update(
+        status=BulkJob.STATUS_RUNNING, updated_at=timezone.now()
+    )
+    return claimed == 1
+
+
+def apply_to_matches(r, job):
+    """UNLINK, EXPIRE or PERSIST every key matching ``job.match``; False if cancelled."""
+    last_checkpoint = time.monotonic()
+    walker = KeyspaceWalker(r, match=job.match or None, count=job.batch_size, rate=job.rate,
+                            cursor=job.cursor, label=f'bulk {job.operation} job {job.id}')
+    for keys in walker.batches():
+        if keys:
+            pipe = r.pipeline(transaction=False)
+            for key in keys:
+                if job.operation == BulkJob.OP_DELETE:
+                    pipe.unlink(key)
+                elif job.ttl < 0:
+                    pipe.persist(key)
+                else:
+                    pipe.expire(key, job.ttl)
+            job.affected += sum(1 for reply in pipe.execute() if reply)
+            job.scanned += len(keys)
+        job.cursor = str(walker.cursor)
+        if walker.done:
+            return True
+        if time.monotonic() - last_checkpoint >= settings.BULK_JOB_CHECKPOINT_SECONDS:
+            if not checkpoint(job):
+                return False
+            last_checkpoint = time.monotonic()
+    # Cancelled from /api/keys/walkers/
+    job.status = BulkJob.STATUS_CANCELLED
+    checkpoint(job, status=job.status, finished_at=timezone.now())
+    return False
+
+
+def import_rows(r, job):
+    """Write ``job.payload``'s rows from row ``job.cursor`` on; False if cancelled."""
+    started = last_checkpoint = time.monotonic()
+    done = 0
+    rows = itertools.islice(iter_rows(job.payload), int(job.cursor), None)
+    for batch in _batched(rows, job.batch_size):
+        pipe = r.pipeline(transaction=False)
+        spans = []
+        for lineno, row in batch:
+            start = len(pipe.command_stack)
+            queue_write(pipe, row['name'], row['type'], row['value'], row['ttl'], replace=True)
+            spans.append((lineno, start, len(pipe.command_stack)))
+        replies = pipe.execute(raise_on_error=False)
+        for lineno, start, end in spans:
+            errors = [reply for reply in replies[start:end] if isinstance(reply, Exception)]
+            if errors:
+                job.failed += 1
+                job.error = job.error or f'Line {lineno}: {errors[0]}'
+            else:
+                job.affected += 1
+        job.scanned += len(batch)
+        job.cursor = str(int(job.cursor) + len(batch))
+        done += len(batch)
+        if time.monotonic() - last_checkpoint >= settings.BULK_JOB_CHECKPOINT_SECONDS:
+            if not checkpoint(job):
+                return False
+            last_checkpoint = time.monotonic()
+        throttle(started, done, job.rate)
+    return True
+
+
+def run_job(job, resume=False):
+    """
+    Run ``job`` to completion, failure or cancellation, if it can be claimed
+    (see ``claim()``); with ``resume``, also a running job whose process died.
+    """
+    if not claim(job, resume):
+        job.refresh_from_db()
+        return job
+    job.status = BulkJob.STATUS_RUNNING
+    run = import_rows if job.operation == BulkJob.OP_IMPORT else apply_to_matches
+    try:
+        finished = run(get_instance_connection(job.instance), job)
+    except Exception as e:
+        logger.exception("bulk job %s failed", job.id)
+        job.status = BulkJob.STATUS_FAILED
+        job.error = str(e)
+        checkpoint(job, status=job.status, finished_at=timezone.now())
+        return job
+    if finished:
+        job.status = BulkJob.STATUS_DONE
+        job.payload = ''
+        checkpoint(job, status=job.status, payload='', finished_at=timezone.now())
+    return job
+
+
+def _run_in_thread(job_id):
+    try:
+        run_job(BulkJob.objects.select_related('instance').get(id=job_id))
+    finally:
+        connection.close()
+
+
+def start_job(job):
+    """
+    Run ``job`` in a daemon thread of this process once the creating
+    transaction commits, unless ``BULK_JOBS_IN_PROCESS`` is off; then it
+    stays pending for ``manage.py run_bulk_jobs``.
+    """
+    if not settings.BULK_JOBS_IN_PROCESS:
+        return
+    thread = threading.Thread(target=_run_in_thread, args=(job.id,), name=f'bulk-job-{job.id}', daemon=True)
+    transaction.on_commit(thread.start)
@@ -0,0 +1,235 @@
+"""
+Redis Cluster support.
+
+``RedisClusterClient`` is a drop-in for ``RedisClient`` on a cluster
+instance, so the views don't need to know which one they hold:
+
+- key-level commands and pipelines are routed by hash slot (redis-py);
+  pipelines are never transactional, since keys span slots;
+- ``scan()`` walks every shard in parallel and returns a composite cursor
+  holding each shard's own cursor (``0`` once all of them are done);
+- ``dbsize()`` sums the primaries and ``info()`` aggregates every node;
+- with ``read_from_replicas`` reads, including the SCAN walk, go to
+  replicas so browsing keeps load off the primaries.
+"""
+import base64
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit
+
+import redis
+from redis.cluster import ClusterPipeline, LoadBalancingStrategy, RedisCluster
+from django.conf import settings
+
+from .instrumentation import record_command
+from .utils import redis_unavailable, RedisUnavailable
+
+CLUSTER_ERRORS = (redis.ConnectionError, redis.TimeoutError, redis.exceptions.ClusterDownError)
+
+# INFO fields combined with something other than a sum across nodes.
+AVERAGED_FIELDS = {'mem_fragmentation_ratio', 'allocator_frag_ratio', 'allocator_rss_ratio', 'rss_overhead_ratio'}
+MIN_FIELDS = {'uptime_in_seconds', 'uptime_in_days'}
+
+_scan_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='cluster-scan')
+
+
+def encode_cursor(cursors):
+    """``{node name: cursor}`` -> opaque string, or 0 when every node is done."""
+    if not cursors:
+        return 0
+    raw = json.dumps(cursors, separators=(',', ':')).encode()
+    return 'c' + base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Inverse of ``encode_cursor``; None means "start a new scan"."""
+    if cursor in (0, '0', None, ''):
+        return None
+    cursor = str(cursor)
+    if not cursor.startswith('c'):
+        raise ValueError('Invalid cluster cursor')
+    raw = cursor[1:] + '=' * (-len(cursor[1:]) % 4)
+    try:
+        cursors = json.loads(base64.urlsafe_b64decode(raw))
+    except ValueError:
+        raise ValueError('Invalid cluster cursor')
+    if not isinstance(cursors, dict):
+        raise ValueError('Invalid cluster cursor')
+    return cursors
+
+
+def aggregate_info(infos):
+    """
+    Combine per-node INFO dicts into one: numbers are summed (ratios
+    averaged, uptime the minimum), keyspace sections are summed per db over
+    the primaries only (replicas hold copies of the same keys), and
+    ``run_id`` joins every node's, so a restart of any node changes it.
+    """
+    infos = [info for info in infos if info]
+    if not infos:
+        return {}
+    merged = {}
+    for info in infos:
+        replica = info.get('role') == 'slave'
+        for field, value in info.items():
+            if isinstance(value, dict):
+                if replica and field.startswith('db'):
+                    continue
+                section = merged.setdefault(field, {})
+                for name, number in value.items():
+                    if isinstance(number, (int, float)):
+                        section[name] = section.get(name, 0) + number
+            elif isinstance(value, bool) or not isinstance(value, (int, float)):
+                merged.setdefault(field, value)
+            elif field in MIN_FIELDS:
+                merged[field] = min(merged.get(field, value), value)
+            else:
+                merged[field] = merged.get(field, 0) + value
+    for field in AVERAGED_FIELDS:
+        if field in merged:
+            merged[field] = merged[field] / len(infos)
+    merged['run_id'] = ','.join(sorted(str(info.get('run_id', '')) for info in infos))
+    merged['cluster_nodes'] = len(infos)
+    return merged
+
+
+class RedisClusterPipeline(ClusterPipeline):
+    def execute(self, raise_on_error=True):
+        commands = len(self.command_stack)
+        started = time.perf_counter()
+        try:
+            return super().execute(raise_on_error)
+        except CLUSTER_ERRORS as e:
+            raise redis_unavailable(e)
+        finally:
+            if commands:
+                record_command('PIPELINE', time.perf_counter() - started, commands)
+
+
+class RedisClusterClient(RedisCluster):
+    def execute_command(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().execute_command(*args, **kwargs)
+        except RedisUnavailable:
+            raise
+        except CLUSTER_ERRORS as e:
+            raise redis_unavailable(e)
+        finally:
+            record_command(args[0], time.perf_counter() - started)
+
+    def pipeline(self, transaction=None, shard_hint=None):
+        pipe = super().pipeline(transaction=False, shard_hint=shard_hint)
+        pipe.__class__ = RedisClusterPipeline  # same object, plus error translation/instrumentation
+        return pipe
+
+    def scan_nodes(self):
+        """One node per shard: a replica when reads go to replicas (and it has one), else the primary."""
+        shards = {}
+        for nodes in self.nodes_manager.slots_cache.values():
+            primary = nodes[0]
+            if primary.name not in shards:
+                replicas = nodes[1:]
+                shards[primary.name] = replicas[0] if self.load_balancing_strategy and replicas else primary
+        return sorted(shards.values(), key=lambda node: node.name)
+
+    def scan(self, cursor=0, match=None, count=None, _type=None, **kwargs):
+        """
+        SCAN all shards in parallel. Returns ``(cursor, keys)`` like
+        ``Redis.scan``; the cursor is an opaque string, ``0`` when done.
+        """
+        cursors = decode_cursor(cursor)
+        nodes = self.scan_nodes()
+        if cursors is None:
+            cursors = {node.name: 0 for node in nodes}
+        # A node missing from the current topology (failover, resharding) is dropped from the walk.
+        active = [node for node in nodes if node.name in cursors]
+        if not active:
+            return 0, []
+        per_node = max(1, (count or 10) // len(active))
+
+        def scan_node(node):
+            try:
+                return node.redis_connection.scan(
+                    cursor=cursors[node.name], match=match, count=per_node, _type=_type, **kwargs
+                )
+            except CLUSTER_ERRORS as e:
+                raise redis_unavailable(e)
+
+        started = time.perf_counter()
+        replies = list(_scan_executor.map(scan_node, active))
+        record_command('SCAN', time.perf_counter() - started, len(active))
+        keys = []
+        next_cursors = {}
+        for node, (node_cursor, node_keys) in zip(active, replies):
+            keys.extend(node_keys)
+            if int(node_cursor) != 0:
+                next_cursors[node.name] = int(node_cursor)
+        return encode_cursor(next_cursors), keys
+
+    def scan_iter(self, match=None, count=None, _type=None, **kwargs):
+        cursor = 0
+        while True:
+            cursor, keys = self.scan(cursor=cursor, match=match, count=count, _type=_type, **kwargs)
+            yield from keys
+            if cursor == 0:
+                return
+
+    def dbsize(self, target_nodes=None, **kwargs):
+        return super().dbsize(target_nodes=target_nodes or self.PRIMARIES, **kwargs)
+
+    def node_infos(self, section=None):
+        """``{node name: INFO}`` for every primary and replica."""
+        return self.info(section, target_nodes=self.ALL_NODES)
+
+    def info(self, section=None, *args, target_nodes=None, **kwargs):
+        if target_nodes is not None:
+            return super().info(section, *args, target_nodes=target_nodes, **kwargs)
+        return aggregate_info(self.node_infos(section).values())
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_cluster_connection(url, read_from_replicas=False):
+    """Shared cluster client for ``url`` (any seed node); it keeps a pool per node."""
+    key = (url, bool(read_from_replicas))
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                try:
+                    client = _clients[key] = RedisClusterClient.from_url(
+                        url,
+                        decode_responses=True,
+                        socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                        socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                        max_connections=settings.REDIS_MAX_CONNECTIONS,
+                        load_balancing_strategy=(
+                            LoadBalancingStrategy.ROUND_ROBIN_REPLICAS if read_from_replicas else None
+                        ),
+                    )
+                except (redis.RedisError, redis.exceptions.RedisClusterException) as e:
+                    raise redis_unavailable(e)
+    return client
+
+
+def node_url(url, host, port):
+    """``url`` (a seed node's) pointed at ``host:port``, keeping credentials and options."""
+    parts = urlsplit(url)
+    auth = parts.netloc.rsplit('@', 1)[0] + '@' if '@' in parts.netloc else ''
+    return urlunsplit(parts._replace(netloc=f'{auth}{host}:{port}'))
+
+
+def cluster_nodes(url):
+    """``[(host, port, role)]`` of every node, as seen through the seed ``url``."""
+    client = get_cluster_connection(url)
+    try:
+        client.nodes_manager.initialize()  # refresh topology (failovers, added nodes)
+    except CLUSTER_ERRORS + (redis.exceptions.RedisClusterException,) as e:
+        raise redis_unavailable(e)
+    return sorted((node.host, node.port, node.server_type) for node in client.get_nodes())
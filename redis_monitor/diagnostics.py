@@ -0,0 +1,148 @@
+"""
+Slowlog, latency-monitor and commandstats collection.
+
+The collector reads these in the same pipeline as its INFO, so they cost no
+extra round trip per tick (``LATENCY HISTORY`` is only asked, in a second
+round trip, for events with a new spike):
+
+- ``SLOWLOG GET``: entries newer than the last stored one; the table's
+  unique ``(instance, entry_id, timestamp)`` drops any repeats, and still
+  accepts the IDs a server restart or ``SLOWLOG RESET`` starts over from.
+- ``LATENCY LATEST``/``HISTORY``: every spike of each event, once.
+- ``INFO commandstats``: every ``METRICS_COMMANDSTATS_INTERVAL``, stored as
+  per-command deltas (calls, usec, failed/rejected calls) since the
+  previous read, so rates over time are plain sums.
+"""
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import SlowLogEntry, LatencyEvent, CommandStat
+from .utils import _str
+
+COMMANDSTAT_FIELDS = ('calls', 'usec', 'failed_calls', 'rejected_calls')
+
+
+def _ok(reply, default):
+    return default if isinstance(reply, Exception) else reply
+
+
+def _at(unix_seconds):
+    return datetime.fromtimestamp(int(unix_seconds), tz=dt_timezone.utc)
+
+
+def commandstat_deltas(previous, current):
+    """``{command: {field: delta}}`` between two ``INFO commandstats`` reads; a counter reset counts from 0."""
+    deltas = {}
+    for name, stats in current.items():
+        command = name[len('cmdstat_'):] if name.startswith('cmdstat_') else name
+        before = previous.get(name, {})
+        if stats.get('calls', 0) < before.get('calls', 0):
+            before = {}  # restart or CONFIG RESETSTAT
+        delta = {field: stats.get(field, 0) - before.get(field, 0) for field in COMMANDSTAT_FIELDS}
+        if delta['calls'] > 0:
+            deltas[command] = delta
+    return deltas
+
+
+class Diagnostics:
+    """Per-instance read positions for the slowlog, latency events and commandstats."""
+
+    def __init__(self, instance):
+        self.instance = instance
+        last = SlowLogEntry.objects.filter(instance=instance).order_by('-timestamp', '-entry_id').first()
+        self.slowlog_last = (last.timestamp, last.entry_id) if last else None
+        self.latency_seen = dict(
+            LatencyEvent.objects.filter(instance=instance).values_list('event').annotate(Max('timestamp'))
+        )
+        self.commandstats = None  # previous cumulative INFO commandstats
+        self.commandstats_at = None  # its monotonic time
+
+    def commandstats_due(self):
+        return (self.commandstats_at is None
+                or time.monotonic() - self.commandstats_at >= settings.METRICS_COMMANDSTATS_INTERVAL)
+
+    def fetch(self, r):
+        """
+        Runs in a collector worker thread: ``(INFO, raw diagnostics)`` from
+        one pipeline (plus LATENCY HISTORY for events with new spikes).
+        """
+        commandstats = self.commandstats_due()
+        pipe = r.pipeline(transaction=False)
+        pipe.info()
+        pipe.slowlog_get(settings.METRICS_SLOWLOG_FETCH)
+        pipe.execute_command('LATENCY', 'LATEST')
+        if commandstats:
+            pipe.info('commandstats')
+        replies = pipe.execute(raise_on_error=False)
+        if isinstance(replies[0], Exception):
+            raise replies[0]
+        # SLOWLOG/LATENCY may be renamed away on managed servers; they are then skipped.
+        latest = _ok(replies[2], [])
+        fresh = [_str(row[0]) for row in latest if self._new_spike(_str(row[0]), int(row[1]))]
+        history = {}
+        if fresh:
+            pipe = r.pipeline(transaction=False)
+            for event in fresh:
+                pipe.execute_command('LATENCY', 'HISTORY', event)
+            history = {event: reply for event, reply in zip(fresh, pipe.execute(raise_on_error=False))
+                       if not isinstance(reply, Exception)}
+        return replies[0], {
+            'slowlog': _ok(replies[1], []),
+            'latency': history,
+            'commandstats': _ok(replies[3], None) if commandstats else None,
+            'at': timezone.now(),
+            'monotonic': time.monotonic(),
+        }
+
+    def _new_spike(self, event, unix_seconds):
+        seen = self.latency_seen.get(event)
+        return seen is None or unix_seconds > seen.timestamp()
+
+    def rows(self, raw):
+        """Unsaved rows for the new entries in ``raw``; advances the read positions."""
+        slow = []
+        for entry in raw['slowlog']:
+            at = _at(entry['start_time'])
+            if self.slowlog_last is not None and (at, entry['id']) <= self.slowlog_last:
+                continue
+            command_line = _str(entry['command'])
+            slow.append(SlowLogEntry(
+                instance=self.instance, entry_id=entry['id'], timestamp=at, duration_us=entry['duration'],
+                command=command_line.split(' ', 1)[0].upper()[:64], command_line=command_line[:1024],
+                client_address=_str(entry.get('client_address') or '')[:64],
+                client_name=_str(entry.get('client_name') or '')[:128],
+            ))
+        if slow:
+            self.slowlog_last = max((row.timestamp, row.entry_id) for row in slow)
+
+        latency = []
+        for event, samples in raw['latency'].items():
+            seen = self.latency_seen.get(event)
+            for unix_seconds, latency_ms in samples:
+                at = _at(unix_seconds)
+                if seen is None or at > seen:
+                    latency.append(LatencyEvent(instance=self.instance, event=event, timestamp=at,
+                                                latency_ms=latency_ms))
+            if samples:
+                self.latency_seen[event] = _at(max(int(unix_seconds) for unix_seconds, _ in samples))
+
+        stats = []
+        if raw['commandstats'] is not None:
+            if self.commandstats is not None:
+                interval = raw['monotonic'] - self.commandstats_at
+                for command, delta in commandstat_deltas(self.commandstats, raw['commandstats']).items():
+                    stats.append(CommandStat(instance=self.instance, timestamp=raw['at'], command=command[:64],
+                                             interval_seconds=interval, **delta))
+            self.commandstats = raw['commandstats']
+            self.commandstats_at = raw['monotonic']
+        return slow, latency, stats
+
+
+def save_rows(slow, latency, stats):
+    SlowLogEntry.objects.bulk_create(slow, batch_size=500, ignore_conflicts=True)
+    LatencyEvent.objects.bulk_create(latency, batch_size=500, ignore_conflicts=True)
+    CommandStat.objects.bulk_create(stats, batch_size=500)
@@ -0,0 +1,214 @@
+"""
+Hot-key and change tracking without MONITOR.
+
+A ``HotKeyWorker`` thread per instance subscribes to keyevent notifications
+(``__keyevent@<db>__:*``, one message per written key) and feeds them to a
+``HotKeyTracker``, which counts the most-mutated keys and key prefixes in
+bounded memory with the space-saving algorithm. Under an LFU
+``maxmemory-policy`` the worker also walks the keyspace a slice at a time
+with ``OBJECT FREQ`` (plus the current most-mutated keys) to find the most
+*read* keys, which notifications can't see.
+
+The collector (``collect_metrics --loop`` with ``HOTKEYS_ENABLED``) runs
+the workers and stores a ``HotKeySnapshot`` every
+``HOTKEYS_SNAPSHOT_INTERVAL``, covering the events since the previous one.
+"""
+import logging
+import threading
+import time
+
+import redis
+from django.conf import settings
+
+from .analyzer import key_prefix
+from .keyindex import notifications_enabled
+from .models import HotKeySnapshot
+from .utils import get_redis_connection
+from .walker import KeyspaceWalker
+
+logger = logging.getLogger(__name__)
+
+# Server-side removals: counted per event type, but they aren't client writes.
+UNTRACKED_EVENTS = {'expired', 'evicted'}
+
+
+class SpaceSaving:
+    """
+    Approximate top-k counter in ``capacity`` slots (Metwally et al.). An
+    item not being tracked has been seen at most ``floor`` times, so a new
+    item starts at ``floor`` with that as its possible overcount (``error``).
+    When full, the least-counted tenth is evicted at once, which keeps the
+    cost of a new item O(log capacity) amortized.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}  # item -> [count, error]
+        self.floor = 0
+        self.total = 0
+
+    def add(self, item, n=1):
+        self.total += n
+        entry = self.counts.get(item)
+        if entry is not None:
+            entry[0] += n
+            return
+        if len(self.counts) >= self.capacity:
+            self._evict()
+        self.counts[item] = [self.floor + n, self.floor]
+
+    def _evict(self):
+        ranked = sorted(self.counts.items(), key=lambda item: item[1][0])
+        dropped = ranked[:max(1, len(ranked) // 10)]
+        for item, _ in dropped:
+            del self.counts[item]
+        self.floor = max(self.floor, dropped[-1][1][0])
+
+    def top(self, n):
+        """``[[item, count, error], ...]`` for the ``n`` largest counts."""
+        ranked = sorted(self.counts.items(), key=lambda item: item[1][0], reverse=True)[:n]
+        return [[item, count, error] for item, (count, error) in ranked]
+
+
+class HotKeyTracker:
+    """Event and ``OBJECT FREQ`` counts for one instance; fed by its worker, read by the collector."""
+
+    def __init__(self, capacity=1000, delimiter=':', depth=1):
+        self.capacity = capacity
+        self.delimiter = delimiter
+        self.depth = depth
+        self._lock = threading.Lock()
+        self.freqs = {}  # key -> latest OBJECT FREQ (kept across windows, bounded by capacity)
+        self.live = False  # subscribed to notifications
+        self.lfu = False  # OBJECT FREQ available
+        self._reset()
+
+    def _reset(self):
+        self.keys = SpaceSaving(self.capacity)
+        self.prefixes = SpaceSaving(self.capacity)
+        self.events = {}
+        self.window_started = time.monotonic()
+
+    def on_event(self, message):
+        event = message['channel'].split(':', 1)[1]
+        key = message['data']
+        with self._lock:
+            self.events[event] = self.events.get(event, 0) + 1
+            if event not in UNTRACKED_EVENTS:
+                self.keys.add(key)
+                self.prefixes.add(key_prefix(key, self.delimiter, self.depth))
+
+    def add_freqs(self, freqs):
+        with self._lock:
+            self.freqs.update(freqs)
+            if len(self.freqs) > self.capacity:
+                ranked = sorted(self.freqs.items(), key=lambda item: item[1], reverse=True)
+                self.freqs = dict(ranked[:self.capacity])
+
+    def top_mutated(self, n):
+        with self._lock:
+            return [key for key, _, _ in self.keys.top(n)]
+
+    def snapshot(self, top_n):
+        """The window's top keys/prefixes and event counts; starts a new window."""
+        with self._lock:
+            hot = sorted(((key, freq) for key, freq in self.freqs.items() if freq > 0),
+                         key=lambda item: item[1], reverse=True)[:top_n]
+            data = {
+                'window_seconds': time.monotonic() - self.window_started,
+                'events': sum(self.events.values()),
+                'event_counts': self.events,
+                'keys': self.keys.top(top_n),
+                'prefixes': self.prefixes.top(top_n),
+                'hot_keys': [list(item) for item in hot],
+                'live': self.live,
+                'lfu': self.lfu,
+            }
+            self._reset()
+        return data
+
+
+def lfu_enabled(r):
+    try:
+        policy = r.config_get('maxmemory-policy').get('maxmemory-policy', '')
+    except redis.ResponseError:
+        return False
+    return 'lfu' in policy
+
+
+class HotKeyWorker(threading.Thread):
+    """Subscribes one instance's keyevent notifications into a tracker and samples OBJECT FREQ."""
+
+    def __init__(self, url, tracker):
+        super().__init__(name='redilens-hot-keys', daemon=True)
+        self.url = url
+        self.tracker = tracker
+        self.stopped = threading.Event()
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                self.watch()
+            except Exception:
+                logger.exception('Hot key tracking failed for %s', self.url)
+                self.tracker.live = False
+                self.stopped.wait(settings.HOTKEYS_SNAPSHOT_INTERVAL)
+
+    def watch(self):
+        r = get_redis_connection(self.url)
+        pubsub = thread = None
+        if notifications_enabled(r, settings.HOTKEYS_CONFIGURE_NOTIFICATIONS):
+            db = r.connection_pool.connection_kwargs.get('db', 0)
+            pubsub = r.pubsub(ignore_subscribe_messages=True)
+            pubsub.psubscribe(**{f'__keyevent@{db}__:*': self.tracker.on_event})
+            thread = pubsub.run_in_thread(sleep_time=1, daemon=True, exception_handler=self._stop_on_error)
+        self.tracker.live = thread is not None
+        self.tracker.lfu = lfu_enabled(r)
+        cursor = 0
+        try:
+            while not self.stopped.wait(settings.HOTKEYS_FREQ_INTERVAL):
+                if thread is not None and not thread.is_alive():
+                    return  # resubscribe
+                if self.tracker.lfu:
+                    cursor = self.sample_freqs(r, cursor)
+                elif thread is None:
+                    return  # nothing to watch; check the server config again
+        finally:
+            self.tracker.live = False
+            if thread is not None:
+                thread.stop()  # the thread closes the pubsub connection on its way out
+
+    def sample_freqs(self, r, cursor):
+        """OBJECT FREQ for the next SCAN slice and the current most-mutated keys; returns the next cursor."""
+        walker = KeyspaceWalker(r, count=settings.HOTKEYS_FREQ_SAMPLE, cursor=cursor)
+        keys = walker.step()
+        cursor = walker.cursor
+        keys = list(set(keys).union(self.tracker.top_mutated(settings.HOTKEYS_TOP_N)))
+        if keys:
+            pipe = r.pipeline(transaction=False)
+            for key in keys:
+                pipe.object('freq', key)
+            replies = pipe.execute(raise_on_error=False)
+            # Keys deleted since SCAN answer with an error.
+            self.tracker.add_freqs({key: freq for key, freq in zip(keys, replies) if isinstance(freq, int)})
+        return cursor
+
+    def _stop_on_error(self, error, pubsub, thread):
+        logger.warning('Hot key tracking lost its notification subscription: %s', error)
+        thread.stop()
+
+
+def start_tracking(instance):
+    """Start a worker for ``instance``; the caller keeps it and calls ``stop()``."""
+    tracker = HotKeyTracker(settings.HOTKEYS_CAPACITY, settings.HOTKEYS_DELIMITER, settings.HOTKEYS_PREFIX_DEPTH)
+    worker = HotKeyWorker(instance.redis_url, tracker)
+    worker.start()
+    return worker
+
+
+def snapshot_row(instance, tracker):
+    """Unsaved ``HotKeySnapshot`` of ``tracker``'s current window."""
+    return HotKeySnapshot(instance=instance, **tracker.snapshot(settings.HOTKEYS_TOP_N))
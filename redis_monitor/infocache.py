@@ -0,0 +1,189 @@
+"""
+Short-TTL cache for INFO/DBSIZE-backed endpoints.
+
+A dashboard refresh by many users would otherwise send one INFO per request
+to the monitored server. ``info_cache.get_or_call()`` keeps the reply for
+``INFO_CACHE_TTL`` seconds and collapses concurrent misses for the same key
+into a single upstream call (single-flight): the first caller fetches, the
+others wait for its result. ``aget_or_call()`` does the same for the async
+views, with an awaited future per key on the running event loop and the
+shared cache read and written off the loop.
+
+When ``INFO_CACHE_ALIAS`` names a Django cache (e.g. one backed by Redis or
+memcached), replies are also shared between processes, and with
+``INFO_CACHE_FROM_COLLECTOR`` the collector publishes every INFO it takes
+there, so the API can serve the latest sample without touching Redis.
+"""
+import asyncio
+import threading
+import time
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class InfoCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}  # key -> (expires_at, value), monotonic clock
+        self._inflight = {}  # key -> _Call
+        self._async_inflight = weakref.WeakKeyDictionary()  # event loop -> {key: asyncio.Future}
+        self.hits = self.misses = self.coalesced = self.shared_hits = 0
+
+    @property
+    def ttl(self):
+        return settings.INFO_CACHE_TTL
+
+    def _shared(self):
+        return caches[settings.INFO_CACHE_ALIAS] if settings.INFO_CACHE_ALIAS else None
+
+    def _local(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry
+        return None
+
+    def get(self, key):
+        """Cached value for ``key`` or None, without fetching."""
+        with self._lock:
+            entry = self._local(key)
+            if entry is not None:
+                self.hits += 1
+                return entry[1]
+        shared = self._shared()
+        value = shared.get(f'redilens:{key}') if shared else None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.shared_hits += 1
+                self._entries[key] = (time.monotonic() + self.ttl, value)
+        return value
+
+    def set(self, key, value, ttl=None, shared=True):
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+        cache = self._shared() if shared else None
+        if cache is not None and ttl > 0:
+            cache.set(f'redilens:{key}', value, timeout=ttl)
+
+    def get_or_call(self, key, fetch):
+        """Return the cached value for ``key``, calling ``fetch()`` at most once across concurrent misses."""
+        with self._lock:
+            entry = self._local(key)
+            if entry is not None:
+                self.hits += 1
+                return entry[1]
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            shared = self._shared()
+            value = shared.get(f'redilens:{key}') if shared else None
+            if value is None:
+                with self._lock:
+                    self.misses += 1
+                value = fetch()
+                self.set(key, value)
+            else:
+                with self._lock:
+                    self.shared_hits += 1
+                self.set(key, value, shared=False)
+            call.value = value
+            return value
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            call.event.set()
+
+    async def aget_or_call(self, key, fetch):
+        """``get_or_call()`` for coroutines: ``fetch`` is awaited at most once across concurrent misses."""
+        with self._lock:
+            entry = self._local(key)
+            if entry is not None:
+                self.hits += 1
+                return entry[1]
+        loop = asyncio.get_running_loop()
+        inflight = self._async_inflight.setdefault(loop, {})
+        future = inflight.get(key)
+        if future is not None:
+            with self._lock:
+                self.coalesced += 1
+            return await asyncio.shield(future)
+
+        future = inflight[key] = loop.create_future()
+        try:
+            shared = self._shared()
+            value = await sync_to_async(shared.get)(f'redilens:{key}') if shared else None
+            if value is None:
+                with self._lock:
+                    self.misses += 1
+                value = await fetch()
+                self.set(key, value, shared=False)
+                if shared is not None and self.ttl > 0:
+                    await sync_to_async(shared.set)(f'redilens:{key}', value, timeout=self.ttl)
+            else:
+                with self._lock:
+                    self.shared_hits += 1
+                self.set(key, value, shared=False)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # retrieved, even if nobody was waiting
+            raise
+        finally:
+            del inflight[key]
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            lookups = self.hits + self.shared_hits + self.misses + self.coalesced
+            return {
+                'ttl': self.ttl,
+                'shared': settings.INFO_CACHE_ALIAS or None,
+                'entries': sum(1 for expires, _ in self._entries.values() if expires > now),
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'hit_rate': round((lookups - self.misses) / lookups, 4) if lookups else None,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.coalesced = self.shared_hits = 0
+
+
+info_cache = InfoCache()
+
+
+def info_key(instance):
+    return f'info:{instance.pk}'
+
+
+def dbsize_key(instance):
+    return f'dbsize:{instance.pk}'
@@ -0,0 +1,203 @@
+"""
+Per-request Redis instrumentation and Prometheus metrics.
+
+``RedisClient``/``RedisPipeline`` (utils.py) report every command and
+pipeline here, and the pool's connections count the bytes they receive, so
+``InstrumentationMiddleware`` knows for each request how many commands and
+round trips it sent, how long it waited on Redis and how much it read. The
+DRF renderer reports the time spent serializing. The middleware returns
+this as a ``Server-Timing`` header and folds it into the histograms served
+at ``/metrics``.
+
+The histograms live in process memory: with several worker processes each
+one exposes its own, so scrape every worker (or aggregate in Prometheus).
+"""
+import bisect
+import contextvars
+import threading
+
+from django.conf import settings
+
+_current = contextvars.ContextVar('redilens_request_stats', default=None)
+
+
+class RequestStats:
+    __slots__ = ('commands', 'round_trips', 'bytes_read', 'redis_seconds', 'serialize_seconds')
+
+    def __init__(self):
+        self.commands = self.round_trips = self.bytes_read = 0
+        self.redis_seconds = self.serialize_seconds = 0.0
+
+
+def begin_request():
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def current_stats():
+    return _current.get()
+
+
+# --- recording hooks ---------------------------------------------------------
+
+def record_command(name, seconds, commands=1):
+    """One round trip to Redis carrying ``commands`` commands (``name`` is the command, or 'PIPELINE')."""
+    if not settings.REDIS_INSTRUMENTATION:
+        return
+    stats = _current.get()
+    if stats is not None:
+        stats.commands += commands
+        stats.round_trips += 1
+        stats.redis_seconds += seconds
+    REDIS_COMMAND_SECONDS.observe((str(name).upper(),), seconds)
+
+
+def record_bytes(count):
+    stats = _current.get()
+    if stats is not None:
+        stats.bytes_read += count
+
+
+def record_serialize(seconds):
+    stats = _current.get()
+    if stats is not None:
+        stats.serialize_seconds += seconds
+
+
+class CountingSocket:
+    """Socket proxy that reports how many bytes each ``recv`` returned."""
+
+    def __init__(self, sock):
+        self._sock = sock
+
+    def recv(self, *args, **kwargs):
+        data = self._sock.recv(*args, **kwargs)
+        record_bytes(len(data))
+        return data
+
+    def recv_into(self, buffer, *args, **kwargs):
+        count = self._sock.recv_into(buffer, *args, **kwargs)
+        record_bytes(count)
+        return count
+
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
+
+
+class CountingConnectionMixin:
+    def _connect(self):
+        return CountingSocket(super()._connect())
+
+
+def counting_connection_class(connection_class):
+    """``connection_class`` (TCP, TLS or unix socket) with byte counting on its socket."""
+    if issubclass(connection_class, CountingConnectionMixin):
+        return connection_class
+    return type(f'Counting{connection_class.__name__}', (CountingConnectionMixin, connection_class), {})
+
+
+# --- Prometheus histograms ----------------------------------------------------
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 1000)
+BYTES_BUCKETS = (0, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def _label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        for labels, series in items:
+            base = ','.join(f'{name}="{_label_value(value)}"' for name, value in zip(self.labelnames, labels))
+            prefix = f'{base},' if base else ''
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {series[-1]}')
+            lines.append(f'{self.name}_sum{{{base}}} {series[-2]}')
+            lines.append(f'{self.name}_count{{{base}}} {series[-1]}')
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+REQUEST_SECONDS = Histogram(
+    'redilens_request_duration_seconds', 'Wall time per API request.', ('endpoint', 'method'), LATENCY_BUCKETS)
+REQUEST_REDIS_SECONDS = Histogram(
+    'redilens_request_redis_seconds', 'Time spent waiting on Redis per request.', ('endpoint',), LATENCY_BUCKETS)
+REQUEST_SERIALIZE_SECONDS = Histogram(
+    'redilens_request_serialize_seconds', 'Time spent rendering the response body per request.',
+    ('endpoint',), LATENCY_BUCKETS)
+REQUEST_COMMANDS = Histogram(
+    'redilens_request_redis_commands', 'Redis commands sent per request.', ('endpoint',), COUNT_BUCKETS)
+REQUEST_ROUND_TRIPS = Histogram(
+    'redilens_request_redis_round_trips', 'Redis round trips per request.', ('endpoint',), COUNT_BUCKETS)
+REQUEST_BYTES_READ = Histogram(
+    'redilens_request_redis_bytes_read', 'Bytes read from Redis per request.', ('endpoint',), BYTES_BUCKETS)
+REDIS_COMMAND_SECONDS = Histogram(
+    'redilens_redis_command_duration_seconds', 'Round-trip time per Redis command (pipelines as PIPELINE).',
+    ('command',), LATENCY_BUCKETS)
+
+HISTOGRAMS = [
+    REQUEST_SECONDS, REQUEST_REDIS_SECONDS, REQUEST_SERIALIZE_SECONDS, REQUEST_COMMANDS,
+    REQUEST_ROUND_TRIPS, REQUEST_BYTES_READ, REDIS_COMMAND_SECONDS,
+]
+
+
+def observe_request(endpoint, method, seconds, stats):
+    REQUEST_SECONDS.observe((endpoint, method), seconds)
+    REQUEST_REDIS_SECONDS.observe((endpoint,), stats.redis_seconds)
+    REQUEST_SERIALIZE_SECONDS.observe((endpoint,), stats.serialize_seconds)
+    REQUEST_COMMANDS.observe((endpoint,), stats.commands)
+    REQUEST_ROUND_TRIPS.observe((endpoint,), stats.round_trips)
+    REQUEST_BYTES_READ.observe((endpoint,), stats.bytes_read)
+
+
+def server_timing(seconds, stats):
+    """``Server-Timing`` header value for one request."""
+    return ', '.join([
+        f'redis;dur={stats.redis_seconds * 1000:.2f};desc="{stats.commands} cmds, '
+        f'{stats.round_trips} round trips, {stats.bytes_read} B"',
+        f'serialize;dur={stats.serialize_seconds * 1000:.2f}',
+        f'total;dur={seconds * 1000:.2f}',
+    ])
+
+
+def render_metrics(extra_lines=()):
+    """Prometheus text exposition of every histogram plus ``extra_lines``."""
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    lines.extend(extra_lines)
+    return '\n'.join(lines) + '\n'
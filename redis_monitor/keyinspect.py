@@ -0,0 +1,165 @@
+"""
+Single round-trip key inspection.
+
+One Lua script reads a key's type, TTL, encoding, size and (optionally) the
+first page of its value, so a key view costs one round trip whatever the
+type, instead of EXISTS/TYPE/TTL/... in sequence. ``inspect_keys()`` runs it
+for many keys in one pipeline (routed per slot on a cluster). The script is
+called by SHA and only sent in full when the server answers NOSCRIPT.
+
+Pages are cut by ``value_page()`` in utils.py; values have the shape of
+redis-py's replies for the equivalent commands.
+"""
+import hashlib
+import re
+
+import redis
+from django.conf import settings
+
+from .utils import value_page
+
+INSPECT_SCRIPT = """
+local key = KEYS[1]
+local cursor = ARGV[1]
+local count = tonumber(ARGV[2])
+local t = redis.call('TYPE', key)['ok']
+if t == 'none' then
+    return {t}
+end
+-- Only streams page by entry ID; a malformed cursor comes back as {type, false}
+if count > 0 and t ~= 'string' and t ~= 'stream' and not string.match(cursor, '^%d+$') then
+    return {t, false}
+end
+local ttl = redis.call('TTL', key)
+local encoding = redis.call('OBJECT', 'ENCODING', key)
+local size, page
+if t == 'string' then
+    size = redis.call('STRLEN', key)
+    if count > 0 then page = redis.call('GET', key) end
+elseif t == 'hash' then
+    size = redis.call('HLEN', key)
+    if count > 0 then page = redis.call('HSCAN', key, cursor, 'COUNT', count) end
+elseif t == 'set' then
+    size = redis.call('SCARD', key)
+    if count > 0 then page = redis.call('SSCAN', key, cursor, 'COUNT', count) end
+elseif t == 'zset' then
+    size = redis.call('ZCARD', key)
+    local start = tonumber(cursor)
+    if count > 0 then page = redis.call('ZRANGE', key, start, start + count - 1, 'WITHSCORES') end
+elseif t == 'list' then
+    size = redis.call('LLEN', key)
+    local start = tonumber(cursor)
+    if count > 0 then page = redis.call('LRANGE', key, start, start + count - 1) end
+elseif t == 'stream' then
+    size = redis.call('XLEN', key)
+    local max = cursor == '0' and '+' or cursor
+    if count > 0 then page = redis.call('XREVRANGE', key, max, '-', 'COUNT', count + 1) end
+end
+return {t, ttl, encoding, size, page}
+"""
+INSPECT_SHA = hashlib.sha1(INSPECT_SCRIPT.encode()).hexdigest()
+
+CURSOR_RE = re.compile(r'^\d+(-\d+)?$')  # SCAN/index cursors, or a stream entry ID (checked per type in the script)
+
+
+def _pairs(flat):
+    return [(flat[i], flat[i + 1]) for i in range(0, len(flat), 2)]
+
+
+def _redis_py_reply(key_type, page):
+    """Shape the script's raw page like the redis-py reply ``value_page()`` expects."""
+    if key_type == 'hash':
+        return int(page[0]), dict(_pairs(page[1]))
+    if key_type == 'set':
+        return int(page[0]), page[1]
+    if key_type == 'zset':
+        return [(member, float(score)) for member, score in _pairs(page)]
+    if key_type == 'stream':
+        return [(entry_id, dict(_pairs(fields))) for entry_id, fields in page]
+    return page
+
+
+def page_count(value, default=100):
+    """
+    A requested page size as an int, capped at ``KEY_VALUE_MAX_COUNT``: the
+    page is read inside the script, which blocks the server while it runs.
+    ValueError if it isn't a number.
+    """
+    try:
+        count = int(default if value is None else value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid count '{value}'")
+    return max(0, min(count, settings.KEY_VALUE_MAX_COUNT))
+
+
+def queue_inspect(pipe, key, cursor='0', count=100):
+    """Queue the inspection of ``key`` on ``pipe`` (sync or asyncio); ``count`` 0 skips the value."""
+    cursor = str(cursor or '0')
+    if not CURSOR_RE.match(cursor):
+        raise ValueError(f"Invalid cursor '{cursor}'")
+    # execute_command: redis-py blocks pipe.evalsha() on cluster pipelines, but routes EVALSHA by key fine
+    pipe.execute_command('EVALSHA', INSPECT_SHA, 1, key, cursor, count)
+
+
+def parse_inspect(key, reply, cursor='0', count=100):
+    """
+    ``{"name", "type", "ttl", "encoding", "size"[, "value", "next_cursor"]}``
+    from one script reply, or None if the key doesn't exist.
+    """
+    key_type = reply[0]
+    if key_type == 'none':
+        return None
+    if len(reply) == 2:
+        raise ValueError(f"Invalid cursor '{cursor}' for a {key_type}")
+    row = {'name': key, 'type': key_type, 'ttl': reply[1], 'encoding': reply[2]}
+    if len(reply) < 4:
+        raise ValueError(f"Unsupported type: {key_type}")
+    row['size'] = reply[3]
+    if count > 0:
+        page = reply[4] if len(reply) > 4 else None
+        row['value'], row['next_cursor'] = value_page(key_type, cursor, count, row['size'],
+                                                      _redis_py_reply(key_type, page))
+    return row
+
+
+def _needs_script(replies):
+    return any(isinstance(reply, redis.exceptions.NoScriptError) for reply in replies)
+
+
+def _raise_errors(replies):
+    for reply in replies:
+        if isinstance(reply, Exception):
+            raise reply
+
+
+def inspect_keys(r, keys, cursor='0', count=100):
+    """Inspect ``keys`` in one pipelined round trip; a list of rows (None for missing keys)."""
+    if not keys:
+        return []
+    for attempt in range(2):
+        pipe = r.pipeline(transaction=False)
+        for key in keys:
+            queue_inspect(pipe, key, cursor, count)
+        replies = pipe.execute(raise_on_error=False)
+        if not _needs_script(replies) or attempt:
+            break
+        r.script_load(INSPECT_SCRIPT)
+    _raise_errors(replies)
+    return [parse_inspect(key, reply, cursor, count) for key, reply in zip(keys, replies)]
+
+
+def inspect_key(r, key, cursor='0', count=100):
+    return inspect_keys(r, [key], cursor, count)[0]
+
+
+async def inspect_key_async(r, key, cursor='0', count=100):
+    """``inspect_key()`` on a ``redis.asyncio`` client."""
+    for attempt in range(2):
+        async with r.pipeline(transaction=False) as pipe:
+            queue_inspect(pipe, key, cursor, count)
+            replies = await pipe.execute(raise_on_error=False)
+        if not _needs_script(replies) or attempt:
+            break
+        await r.script_load(INSPECT_SCRIPT)
+    _raise_errors(replies)
+    return parse_inspect(key, replies[0], cursor, count)
@@ -0,0 +1,219 @@
+"""
+Namespace tree of key names, for browsing the keyspace by prefix
+(``/api/keys/tree/``) instead of paging through flat SCAN results.
+
+A ``KeyTreeWorker`` thread per instance and delimiter walks the keyspace
+with SCAN, rate-limited and again every ``KEY_TREE_REFRESH_INTERVAL``, and
+counts each key toward its prefix nodes: ``user:123:session`` counts toward
+``user`` and ``user:123``. A ``KEY_TREE_SAMPLE_RATE`` fraction of the keys
+is measured with MEMORY USAGE; nodes keep the same accumulators as a memory
+report's prefixes, so their memory is estimated (with a confidence
+interval) by ``MemoryAnalyzer.estimate``.
+
+Memory is bounded: key names aren't kept, nodes are at most
+``KEY_TREE_MAX_DEPTH`` deep, and past ``KEY_TREE_MAX_CHILDREN`` children of
+one node (or ``KEY_TREE_MAX_NODES`` in all) keys are counted in an
+``(other)`` child. Each pass builds a new tree that replaces the last one
+when it completes (the first pass is served as it grows), so expanding a
+node costs O(children), not a keyspace walk. A worker nobody has asked for
+in ``KEY_TREE_IDLE_TIMEOUT`` seconds stops.
+"""
+import logging
+import random
+import threading
+import time
+from bisect import bisect_right
+
+from django.conf import settings
+from django.utils import timezone
+
+from .analyzer import OTHER, MemoryAnalyzer
+from .keyindex import glob_escape
+from .utils import get_instance_connection
+from .walker import KeyspaceWalker
+
+logger = logging.getLogger(__name__)
+
+
+class Node:
+    __slots__ = ('counts', 'children')
+
+    def __init__(self):
+        self.counts = [0, 0, 0, 0]  # keys, keys sampled, sum of bytes, sum of bytes squared
+        self.children = None
+
+    def count(self, size):
+        self.counts[0] += 1
+        if size is not None:
+            self.counts[1] += 1
+            self.counts[2] += size
+            self.counts[3] += size * size
+
+    def stats(self):
+        estimate, ci, _ = MemoryAnalyzer.estimate(*self.counts)
+        return {
+            'keys': self.counts[0],
+            'bytes': round(estimate) if self.counts[1] else None,
+            'bytes_ci95': None if ci is None else round(ci),
+        }
+
+
+class KeyTree:
+    def __init__(self, delimiter=':', max_depth=8, max_children=2000, max_nodes=100000):
+        self.delimiter = delimiter
+        self.max_depth = max_depth
+        self.max_children = max_children
+        self.max_nodes = max_nodes
+        self.root = Node()
+        self.nodes = 1
+
+    def add(self, key, size=None):
+        """Count ``key`` (and its MEMORY USAGE ``size``, if measured) toward each of its prefixes."""
+        node = self.root
+        node.count(size)
+        for part in key.split(self.delimiter, self.max_depth)[:-1]:
+            if node.children is None:
+                node.children = {}
+            child = node.children.get(part)
+            if child is None:
+                if len(node.children) >= self.max_children or self.nodes >= self.max_nodes:
+                    part = OTHER
+                    child = node.children.get(OTHER)
+                if child is None:
+                    child = node.children[part] = Node()
+                    self.nodes += 1
+            child.count(size)
+            if part == OTHER:
+                break  # what is below an overflow bucket isn't tracked
+            node = child
+
+    def find(self, prefix):
+        """The node for ``prefix`` ('' for the root), or None."""
+        node = self.root
+        if prefix:
+            for part in prefix.split(self.delimiter):
+                node = (node.children or {}).get(part)
+                if node is None:
+                    return None
+        return node
+
+    def page(self, prefix, cursor=None, count=100):
+        """
+        ``(node stats, child rows, next cursor)`` for ``prefix``, children in
+        name order from after ``cursor`` (a child name; None when done).
+        None if there is no such node.
+        """
+        node = self.find(prefix)
+        if node is None:
+            return None
+        names = sorted(node.children or ())
+        start = bisect_right(names, cursor) if cursor else 0
+        page = names[start:start + count]
+        rows = []
+        for name in page:
+            child = node.children[name]
+            full = None if name == OTHER else f'{prefix}{self.delimiter}{name}' if prefix else name
+            rows.append({
+                'name': name,
+                'prefix': full,
+                'match': None if full is None else glob_escape(full + self.delimiter) + '*',
+                'has_children': bool(child.children),
+                **child.stats(),
+            })
+        next_cursor = page[-1] if start + count < len(names) else None
+        return node.stats(), rows, next_cursor
+
+
+class KeyTreeWorker(threading.Thread):
+    """Keeps one instance's ``KeyTree`` current; requests read it through ``page()``."""
+
+    def __init__(self, instance, delimiter, registry_key):
+        super().__init__(name='redilens-key-tree', daemon=True)
+        self.instance = instance
+        self.delimiter = delimiter
+        self.registry_key = registry_key
+        self._lock = threading.Lock()
+        self.tree = self.new_tree()
+        self.passes = 0
+        self.scanned = 0  # keys seen by the running pass
+        self.built_at = None
+        self.last_used = time.monotonic()
+
+    def new_tree(self):
+        return KeyTree(self.delimiter, settings.KEY_TREE_MAX_DEPTH, settings.KEY_TREE_MAX_CHILDREN,
+                       settings.KEY_TREE_MAX_NODES)
+
+    def idle(self):
+        return time.monotonic() - self.last_used > settings.KEY_TREE_IDLE_TIMEOUT
+
+    def page(self, prefix, cursor=None, count=100):
+        self.last_used = time.monotonic()
+        with self._lock:
+            return self.tree.page(prefix, cursor, count)
+
+    def run(self):
+        try:
+            while not self.idle():
+                try:
+                    self.scan_pass()
+                except Exception:
+                    logger.exception('Key tree scan failed for %s', self.instance)
+                time.sleep(settings.KEY_TREE_REFRESH_INTERVAL)
+        finally:
+            with _trees_lock:
+                _trees.pop(self.registry_key, None)
+
+    def scan_pass(self):
+        r = get_instance_connection(self.instance)
+        tree = self.new_tree()
+        if not self.passes:
+            with self._lock:
+                self.tree = tree  # served as it grows; later passes replace it when complete
+        walker = KeyspaceWalker(r, count=settings.KEY_TREE_SCAN_COUNT, rate=settings.KEY_TREE_SCAN_RATE,
+                                label=f'key tree ({self.delimiter})', instance=self.instance.name)
+        self.scanned = 0
+        for keys in walker.batches():
+            sample = [key for key in keys if random.random() < settings.KEY_TREE_SAMPLE_RATE]
+            sizes = {}
+            if sample:
+                pipe = r.pipeline(transaction=False)
+                for key in sample:
+                    pipe.memory_usage(key)
+                sizes = dict(zip(sample, pipe.execute()))
+            with self._lock:
+                for key in keys:
+                    tree.add(key, sizes.get(key))
+            self.scanned += len(keys)
+            if self.idle():
+                walker.cancel()
+        if not walker.done:
+            return
+        with self._lock:
+            self.tree = tree
+        self.passes += 1
+        self.built_at = timezone.now()
+
+    def freshness(self):
+        return {
+            'status': 'ready' if self.passes else 'building',
+            'passes': self.passes,
+            'scanned': self.scanned,
+            'nodes': self.tree.nodes,
+            'sample_rate': settings.KEY_TREE_SAMPLE_RATE,
+            'built_at': self.built_at,
+        }
+
+
+_trees = {}
+_trees_lock = threading.Lock()
+
+
+def get_key_tree(instance, delimiter=':'):
+    """The process-wide tree worker for ``instance`` and ``delimiter``, started on first use."""
+    registry_key = (instance.redis_url, instance.is_cluster, delimiter)
+    with _trees_lock:
+        worker = _trees.get(registry_key)
+        if worker is None:
+            worker = _trees[registry_key] = KeyTreeWorker(instance, delimiter, registry_key)
+            worker.start()
+    return worker
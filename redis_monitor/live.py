@@ -0,0 +1,140 @@
+"""
+Live metric push.
+
+The collector publishes every sample once to the ``LIVE_CHANNEL`` pub/sub
+channel on ``LIVE_PUBSUB_URL``. There is no default: publishing to the
+monitored server would add writes and pub/sub traffic to it and skew the
+commandstats/ops it reports, so with the setting blank nothing is
+published and the stream endpoint answers 501. In each ASGI
+worker a single ``Broadcaster`` task per event loop subscribes to that
+channel and fans each message out to the open ``/api/async/metrics/live/``
+streams, so any number of dashboards costs one collection per interval and
+one pub/sub connection per worker.
+
+Every subscriber has a bounded queue (``LIVE_QUEUE_SIZE``). The frame is
+built once per message and shared; a client whose queue is full is a slow
+consumer and is dropped (told so with an ``event: dropped`` frame) instead
+of buffering without limit or holding up the others.
+"""
+import asyncio
+import json
+import logging
+import weakref
+
+import redis
+from django.conf import settings
+
+from .utils import get_redis_connection, get_async_redis_connection
+
+logger = logging.getLogger(__name__)
+
+DROPPED = None  # queue sentinel
+
+
+def pubsub_url():
+    """The live push's pub/sub server, or None when it is not configured."""
+    return settings.LIVE_PUBSUB_URL or None
+
+
+def sample_message(instance, metric, fields):
+    """JSON payload published for one collected sample."""
+    return json.dumps({
+        'instance': instance.id,
+        'name': instance.name,
+        'timestamp': metric.timestamp.isoformat(),
+        'memory_used': metric.memory_used,
+        'ops_per_sec': metric.ops_per_sec,
+        'hit_rate': metric.hit_rate,
+        'rejected_connections': metric.rejected_connections,
+        'fields': fields,
+    })
+
+
+def publish_samples(messages):
+    """Publish the collector's ``messages`` in one round trip."""
+    if not messages or pubsub_url() is None:
+        return
+    pipe = get_redis_connection(pubsub_url()).pipeline(transaction=False)
+    for message in messages:
+        pipe.publish(settings.LIVE_CHANNEL, message)
+    pipe.execute()
+
+
+class Subscriber:
+    def __init__(self, instance_id, maxsize):
+        self.instance_id = instance_id
+        self.queue = asyncio.Queue(maxsize)
+
+
+class Broadcaster:
+    def __init__(self, url):
+        self.url = url
+        self.subscribers = set()
+        self.task = None
+        self.delivered = 0
+        self.dropped = 0
+
+    def subscribe(self, instance_id):
+        subscriber = Subscriber(instance_id, settings.LIVE_QUEUE_SIZE)
+        self.subscribers.add(subscriber)
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+        if not self.subscribers and self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def fan_out(self, message):
+        try:
+            instance_id = json.loads(message)['instance']
+        except (ValueError, KeyError, TypeError):
+            return
+        frame = f"event: metric\ndata: {message}\n\n"
+        for subscriber in list(self.subscribers):
+            if subscriber.instance_id != instance_id:
+                continue
+            try:
+                subscriber.queue.put_nowait(frame)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                self.drop(subscriber)
+
+    def drop(self, subscriber):
+        self.subscribers.discard(subscriber)
+        self.dropped += 1
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(DROPPED)
+
+    async def run(self):
+        while True:
+            pubsub = get_async_redis_connection(self.url).pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(settings.LIVE_CHANNEL)
+                while True:
+                    message = await pubsub.get_message(timeout=1.0)
+                    if message is not None and message['type'] == 'message':
+                        self.fan_out(message['data'])
+            except (redis.ConnectionError, redis.TimeoutError) as e:
+                logger.warning("live metrics subscription lost: %s", e)
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    def stats(self):
+        return {'subscribers': len(self.subscribers), 'delivered': self.delivered, 'dropped': self.dropped}
+
+
+_broadcasters = weakref.WeakKeyDictionary()
+
+
+def get_broadcaster():
+    """The ``Broadcaster`` of the running event loop."""
+    loop = asyncio.get_running_loop()
+    broadcaster = _broadcasters.get(loop)
+    if broadcaster is None:
+        broadcaster = _broadcasters[loop] = Broadcaster(pubsub_url())
+    return broadcaster
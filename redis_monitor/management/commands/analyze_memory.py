@@ -0,0 +1,108 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from redis_monitor.models import RedisInstance, MemoryReport
+from redis_monitor.analyzer import MemoryAnalyzer
+from redis_monitor.utils import get_instance_connection
+from redis_monitor.walker import KeyspaceWalker
+import time
+
+
+class Command(BaseCommand):
+    help = 'Scan the keyspace with MEMORY USAGE and store a biggest-keys / per-prefix memory report'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--instance', help='Name of the Redis instance to analyze (default: the default instance)')
+        parser.add_argument('--sample-rate', type=float, default=1.0,
+                            help='Fraction of keys to measure with MEMORY USAGE (1.0 = every key)')
+        parser.add_argument('--delimiter', default=':', help='Prefix delimiter')
+        parser.add_argument('--depth', type=int, default=1, help='Number of delimiter-separated parts in a prefix')
+        parser.add_argument('--top', type=int, default=50, help='How many of the biggest keys to keep')
+        parser.add_argument('--max-prefixes', type=int, default=1000,
+                            help='Prefixes beyond this many are grouped as "(other)"')
+        parser.add_argument('--count', type=int, default=1000,
+                            help='Largest SCAN COUNT per batch (it adapts to the server load below that)')
+        parser.add_argument('--rate', type=int, default=5000,
+                            help='Max keys scanned per second (0 = unlimited while the server is calm)')
+        parser.add_argument('--memory-samples', type=int, default=5, help='MEMORY USAGE SAMPLES for collections')
+        parser.add_argument('--checkpoint', type=float, default=10, help='Seconds between progress checkpoints')
+        parser.add_argument('--resume', nargs='?', const='latest', metavar='REPORT_ID',
+                            help='Continue an interrupted report (the latest running one if no id is given)')
+
+    def handle(self, *args, **options):
+        report = self.get_report(options)
+        analyzer = MemoryAnalyzer(
+            delimiter=report.delimiter, depth=report.depth, sample_rate=report.sample_rate,
+            top_n=report.top_n, max_prefixes=options['max_prefixes'], state=report.state,
+        )
+        try:
+            finished = self.run(report, analyzer, options)
+        except KeyboardInterrupt:
+            finished = False
+        except Exception as e:
+            report.status = MemoryReport.STATUS_FAILED
+            report.error = str(e)
+            self.checkpoint(report, analyzer)
+            raise CommandError(f'Memory report {report.id} failed: {e}')
+        if not finished:
+            self.checkpoint(report, analyzer)
+            self.stdout.write(f'Interrupted; resume with: manage.py analyze_memory --resume {report.id}')
+            return
+
+        report.status = MemoryReport.STATUS_DONE
+        report.finished_at = timezone.now()
+        self.checkpoint(report, analyzer)
+        summary = analyzer.summary()
+        self.stdout.write(self.style.SUCCESS(
+            f"Memory report {report.id}: {report.keys_scanned} keys scanned, {report.keys_sampled} measured, "
+            f"~{summary['total_bytes']} bytes"
+        ))
+
+    def get_report(self, options):
+        if options['instance']:
+            try:
+                instance = RedisInstance.objects.get(name=options['instance'])
+            except RedisInstance.DoesNotExist:
+                raise CommandError(f"Unknown Redis instance '{options['instance']}'")
+        else:
+            instance = RedisInstance.get_default()
+        if options['resume'] is None:
+            return MemoryReport.objects.create(
+                instance=instance, delimiter=options['delimiter'], depth=options['depth'],
+                sample_rate=options['sample_rate'], top_n=options['top'],
+            )
+        reports = MemoryReport.objects.filter(instance=instance, status=MemoryReport.STATUS_RUNNING)
+        if options['resume'] != 'latest':
+            reports = reports.filter(id=options['resume'])
+        report = reports.first()
+        if report is None:
+            raise CommandError('No running memory report to resume')
+        return report
+
+    def run(self, report, analyzer, options):
+        """Scan from the report's cursor; False if the walk was cancelled (from /api/keys/walkers/)."""
+        r = get_instance_connection(report.instance)
+        last_checkpoint = time.monotonic()
+        walker = KeyspaceWalker(r, count=options['count'], rate=options['rate'], cursor=report.cursor,
+                                label=f'memory report {report.id}', instance=report.instance.name)
+        for keys in walker.batches():
+            sample = analyzer.add_keys(keys)
+            if sample:
+                pipe = r.pipeline(transaction=False)
+                for key in sample:
+                    pipe.memory_usage(key, samples=options['memory_samples'])
+                for key, size in zip(sample, pipe.execute()):
+                    if size is not None:  # deleted since SCAN
+                        analyzer.add_sample(key, size)
+                        report.keys_sampled += 1
+            report.keys_scanned += len(keys)
+            report.cursor = str(walker.cursor)
+            if walker.done:
+                return True
+            if time.monotonic() - last_checkpoint >= options['checkpoint']:
+                self.checkpoint(report, analyzer)
+                last_checkpoint = time.monotonic()
+        return False
+
+    def checkpoint(self, report, analyzer):
+        report.state = analyzer.state()
+        report.save()
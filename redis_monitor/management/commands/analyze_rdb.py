@@ -0,0 +1,85 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from redis_monitor.models import RedisInstance, MemoryReport
+from redis_monitor.analyzer import MemoryAnalyzer
+from redis_monitor.rdb import RDBError, analyze_file
+from datetime import datetime, timezone as dt_timezone
+import os
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        'Analyze an RDB dump offline (no load on the server) and store a memory report: per-prefix '
+        'and biggest-key sizes, key counts per type, and optionally the full key listing'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='RDB file (e.g. a copy of dump.rdb or a BGSAVE from a replica)')
+        parser.add_argument('--instance', help='Redis instance the dump belongs to (default: the default instance)')
+        parser.add_argument('--db', type=int, help='Only keys of this DB (default: all)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Worker processes (default: one per CPU)')
+        parser.add_argument('--chunk-mb', type=int, default=64, help='MB of the file per worker task')
+        parser.add_argument('--delimiter', default=':', help='Prefix delimiter')
+        parser.add_argument('--depth', type=int, default=1, help='Number of delimiter-separated parts in a prefix')
+        parser.add_argument('--top', type=int, default=50, help='How many of the biggest keys to keep')
+        parser.add_argument('--max-prefixes', type=int, default=1000,
+                            help='Prefixes beyond this many are grouped as "(other)"')
+        parser.add_argument('--keys-out', metavar='FILE',
+                            help='Write the key listing (NDJSON) here; served at /api/memory/reports/<id>/keys/')
+        parser.add_argument('--checkpoint', type=float, default=10, help='Seconds between progress updates')
+
+    def handle(self, *args, **options):
+        path = os.path.abspath(options['path'])
+        if not os.path.isfile(path):
+            raise CommandError(f'No such file: {path}')
+        keys_out = os.path.abspath(options['keys_out']) if options['keys_out'] else ''
+        report = MemoryReport.objects.create(
+            instance=self.get_instance(options['instance']), source=MemoryReport.SOURCE_RDB,
+            source_path=path, keys_path=keys_out, delimiter=options['delimiter'], depth=options['depth'],
+            top_n=options['top'],
+        )
+        analyzer = MemoryAnalyzer(delimiter=report.delimiter, depth=report.depth, top_n=report.top_n,
+                                  max_prefixes=options['max_prefixes'])
+        last_checkpoint = time.monotonic()
+
+        def progress(totals):
+            nonlocal last_checkpoint
+            if time.monotonic() - last_checkpoint >= options['checkpoint']:
+                report.keys_scanned = report.keys_sampled = totals['keys']
+                report.save(update_fields=['keys_scanned', 'keys_sampled', 'updated_at'])
+                last_checkpoint = time.monotonic()
+
+        try:
+            header, totals = analyze_file(
+                path, analyzer, db=options['db'], workers=options['workers'],
+                chunk_bytes=options['chunk_mb'] << 20, keys_out=keys_out or None, progress=progress,
+            )
+        except (RDBError, OSError) as e:
+            report.status = MemoryReport.STATUS_FAILED
+            report.error = str(e)
+            report.keys_path = ''
+            report.save()
+            raise CommandError(f'Memory report {report.id} failed: {e}')
+
+        report.status = MemoryReport.STATUS_DONE
+        report.finished_at = timezone.now()
+        report.snapshot_at = datetime.fromtimestamp(header['ctime'], tz=dt_timezone.utc)
+        report.keys_scanned = report.keys_sampled = totals['keys']
+        report.key_types = totals['types']
+        report.state = analyzer.state()
+        report.save()
+        self.stdout.write(self.style.SUCCESS(
+            f"Memory report {report.id}: {totals['keys']} keys ({totals['expiring']} with a TTL, "
+            f"{totals['expired']} already expired skipped), {totals['bytes']} bytes serialized, "
+            f"RDB v{header['version']} read in {header['seconds']}s over {header['chunks']} chunk(s)"
+        ))
+
+    def get_instance(self, name):
+        if not name:
+            return RedisInstance.get_default()
+        try:
+            return RedisInstance.objects.get(name=name)
+        except RedisInstance.DoesNotExist:
+            raise CommandError(f"Unknown Redis instance '{name}'")
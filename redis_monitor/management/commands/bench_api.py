@@ -0,0 +1,216 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.utils import timezone
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from redis_monitor.models import RedisInstance
+from redis_monitor.utils import get_redis_connection
+from redis_monitor.bench import percentile
+from datetime import timedelta
+import itertools
+import json
+import platform
+import random
+import subprocess
+import threading
+import time
+
+SEED_PREFIX = 'bench:'
+TYPES = ('string', 'hash', 'list', 'set', 'zset')
+LOCAL_HOSTS = ('localhost', '127.0.0.1', '::1')
+
+
+def parse_mix(value):
+    """'string:70,hash:10,...' -> {type: weight}"""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition(':')
+        if name not in TYPES:
+            raise CommandError(f"Unknown key type '{name}' in --mix (use {', '.join(TYPES)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def queue_key(pipe, key_type, key, members):
+    """Queue a write of ``members`` (a range) to ``key``; for strings, a value of that length."""
+    if key_type == 'string':
+        pipe.set(key, 'x' * len(members))
+    elif key_type == 'hash':
+        pipe.hset(key, mapping={f'f{i}': i for i in members})
+    elif key_type == 'list':
+        pipe.rpush(key, *members)
+    elif key_type == 'set':
+        pipe.sadd(key, *members)
+    else:
+        pipe.zadd(key, {f'm{i}': i for i in members})
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the hot API endpoints (keys, search, values, metrics, history): seeds a '
+        'local redis-server with a configurable keyspace, then measures p50/p99 latency and '
+        'req/s at several concurrency levels and writes the results as JSON for comparison.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', action='store_true', help='Write the synthetic keyspace first')
+        parser.add_argument('--flush', action='store_true', help='Delete earlier bench:* keys before seeding')
+        parser.add_argument('--keys', type=int, default=100000, help='Number of keys to seed')
+        parser.add_argument('--mix', default='string:70,hash:10,list:5,set:5,zset:10',
+                            help='Key type weights')
+        parser.add_argument('--collection-size', type=int, default=20, help='Members per hash/list/set/zset')
+        parser.add_argument('--large', type=int, default=5, help='Large collections per type')
+        parser.add_argument('--large-size', type=int, default=100000, help='Members per large collection')
+        parser.add_argument('--allow-remote', action='store_true',
+                            help='Allow seeding a Redis that is not on localhost')
+        parser.add_argument('--endpoints', nargs='+', default=['keys', 'search', 'value', 'metrics', 'history'])
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+        parser.add_argument('--requests', type=int, default=1000, help='Requests per endpoint and level')
+        parser.add_argument('--json', dest='json_path', help='Write results to this file as JSON')
+        parser.add_argument('--compare', help='Earlier --json file to print p50/p99/req/s deltas against')
+
+    def handle(self, *args, **options):
+        instance = RedisInstance.get_default()
+        r = get_redis_connection(instance.redis_url)
+        if options['seed'] or options['flush']:
+            host = urlsplit(instance.redis_url).hostname
+            if host not in LOCAL_HOSTS and not options['allow_remote']:
+                raise CommandError(f'Refusing to seed {host}; point REDIS_URL at a local redis-server '
+                                   'or pass --allow-remote')
+        if options['flush']:
+            self.flush(r)
+        if options['seed']:
+            self.seed(r, options)
+
+        urls = self.endpoint_urls(r)
+        results = []
+        for endpoint in options['endpoints']:
+            if endpoint not in urls:
+                raise CommandError(f"Unknown endpoint '{endpoint}' (use {', '.join(urls)})")
+            for concurrency in options['concurrency']:
+                row = self.run_level(endpoint, urls[endpoint], concurrency, options['requests'])
+                results.append(row)
+                self.stdout.write(
+                    f"{endpoint:>8}  c={concurrency:<4} {row['req_per_sec']:>9.1f} req/s  "
+                    f"p50={row['p50_ms']:.2f}ms  p99={row['p99_ms']:.2f}ms  errors={row['errors']}"
+                )
+
+        report = {'meta': self.meta(r), 'results': results}
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump(report, f, indent=2)
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def flush(self, r):
+        deleted = 0
+        for batch in self.batched(r.scan_iter(match=f'{SEED_PREFIX}*', count=1000), 1000):
+            deleted += r.unlink(*batch)
+        self.stdout.write(f'Deleted {deleted} bench keys')
+
+    @staticmethod
+    def batched(iterable, size):
+        it = iter(iterable)
+        while batch := list(itertools.islice(it, size)):
+            yield batch
+
+    def seed(self, r, options):
+        mix = parse_mix(options['mix'])
+        types, weights = list(mix), list(mix.values())
+        rng = random.Random(0)  # same keyspace shape on every run
+        started = time.perf_counter()
+        for batch in self.batched(range(options['keys']), 1000):
+            pipe = r.pipeline(transaction=False)
+            for i in batch:
+                key_type = rng.choices(types, weights)[0]
+                size = rng.randint(8, 256) if key_type == 'string' else options['collection_size']
+                queue_key(pipe, key_type, f'{SEED_PREFIX}{key_type}:{i}', range(size))
+            pipe.execute()
+        for key_type in TYPES[1:]:
+            for n in range(options['large']):
+                key = f'{SEED_PREFIX}large:{key_type}:{n}'
+                r.unlink(key)
+                for start in range(0, options['large_size'], 10000):
+                    pipe = r.pipeline(transaction=False)
+                    queue_key(pipe, key_type, key, range(start, min(start + 10000, options['large_size'])))
+                    pipe.execute()
+        self.stdout.write(f"Seeded {options['keys']} keys + {options['large'] * 4} large collections "
+                          f"in {time.perf_counter() - started:.1f}s")
+
+    def endpoint_urls(self, r):
+        """Endpoint -> list of URLs to rotate through."""
+        samples = [key for key in itertools.islice(r.scan_iter(match=f'{SEED_PREFIX}*', count=1000), 50)]
+        samples += [key for key in (f'{SEED_PREFIX}large:{t}:0' for t in TYPES[1:]) if r.exists(key)]
+        samples = samples or ['bench:missing']
+        end = timezone.now()
+        start = end - timedelta(days=7)
+        history = f"start={start.isoformat()}&end={end.isoformat()}".replace('+', '%2B')
+        return {
+            'keys': ['/api/keys/?count=100'],
+            'search': [f'/api/keys/search/?q={SEED_PREFIX}hash:{i}&mode=prefix&count=50' for i in range(1, 10)],
+            'value': [f'/api/values/{key}/' for key in samples],
+            'metrics': ['/api/metrics/'],
+            'history': [f'/api/metrics/history/?{history}&max_points=500'],
+        }
+
+    def run_level(self, endpoint, urls, concurrency, total):
+        local = threading.local()
+        urls = itertools.cycle(urls)
+        lock = threading.Lock()
+
+        def one(_):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+            with lock:
+                url = next(urls)
+            start = time.perf_counter()
+            response = local.client.get(url)
+            return (time.perf_counter() - start) * 1000, response.status_code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            samples = list(executor.map(one, range(total)))
+        elapsed = time.perf_counter() - started
+        latencies = [ms for ms, _ in samples]
+        return {
+            'endpoint': endpoint,
+            'concurrency': concurrency,
+            'requests': total,
+            'errors': sum(1 for _, code in samples if code != 200),
+            'req_per_sec': total / elapsed,
+            'p50_ms': percentile(latencies, 50),
+            'p99_ms': percentile(latencies, 99),
+        }
+
+    def meta(self, r):
+        try:
+            commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                    text=True, timeout=5).stdout.strip() or None
+        except (OSError, subprocess.SubprocessError):
+            commit = None
+        return {
+            'when': timezone.now().isoformat(),
+            'commit': commit,
+            'python': platform.python_version(),
+            'redis_version': r.info('server').get('redis_version'),
+            'dbsize': r.dbsize(),
+        }
+
+    def compare(self, path, results):
+        with open(path) as f:
+            before = {(row['endpoint'], row['concurrency']): row for row in json.load(f)['results']}
+        self.stdout.write(f'Compared with {path}:')
+        for row in results:
+            old = before.get((row['endpoint'], row['concurrency']))
+            if old is None:
+                continue
+            self.stdout.write(
+                f"{row['endpoint']:>8}  c={row['concurrency']:<4} "
+                f"req/s {self.delta(old['req_per_sec'], row['req_per_sec'])}  "
+                f"p50 {self.delta(old['p50_ms'], row['p50_ms'])}  "
+                f"p99 {self.delta(old['p99_ms'], row['p99_ms'])}"
+            )
+
+    @staticmethod
+    def delta(old, new):
+        return f'{(new - old) / old * 100:+.1f}%' if old else 'n/a'
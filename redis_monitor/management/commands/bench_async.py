@@ -0,0 +1,94 @@
+from django.core.management.base import BaseCommand
+from django.test import Client, AsyncClient
+from concurrent.futures import ThreadPoolExecutor
+from redis_monitor.bench import percentile
+import asyncio
+import json
+import threading
+import time
+
+ENDPOINTS = {
+    'keys': ('/api/keys/?count=100', '/api/async/keys/?count=100'),
+    'value': ('/api/values/{key}/', '/api/async/values/{key}/'),
+    'metrics': ('/api/metrics/', '/api/async/metrics/'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare sync (threaded WSGI-style) and async (ASGI) throughput of the key/value/metrics '
+        'API against the configured Redis. Requests run in-process through the Django handlers, '
+        'so the numbers compare the two data paths rather than a particular web server.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint', choices=sorted(ENDPOINTS), default='keys')
+        parser.add_argument('--key', default='bench:hash', help='Key fetched by the value endpoint')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[100, 250, 500, 1000])
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per concurrency level')
+        parser.add_argument('--threads', type=int, default=8,
+                            help='Worker threads serving the sync path (like gunicorn --threads)')
+        parser.add_argument('--json', dest='json_path', help='Write results to this file as JSON')
+
+    def handle(self, *args, **options):
+        sync_url, async_url = (u.format(key=options['key']) for u in ENDPOINTS[options['endpoint']])
+        results = []
+        for concurrency in options['concurrency']:
+            for mode, url in (('sync', sync_url), ('async', async_url)):
+                row = asyncio.run(self.run_level(mode, url, concurrency, options['requests'], options['threads']))
+                results.append(row)
+                self.stdout.write(
+                    f"{mode:>5}  c={concurrency:<5} {row['req_per_sec']:>9.1f} req/s  "
+                    f"p50={row['p50_ms']:.1f}ms  p99={row['p99_ms']:.1f}ms  errors={row['errors']}"
+                )
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump({'endpoint': options['endpoint'], 'results': results}, f, indent=2)
+
+    async def run_level(self, mode, url, concurrency, total, threads):
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+        errors = 0
+
+        if mode == 'sync':
+            local = threading.local()
+            executor = ThreadPoolExecutor(max_workers=threads)
+
+            def get():
+                if not hasattr(local, 'client'):
+                    local.client = Client()
+                return local.client.get(url)
+
+            loop = asyncio.get_running_loop()
+
+            async def fetch():
+                return await loop.run_in_executor(executor, get)
+        else:
+            client = AsyncClient()
+
+            async def fetch():
+                return await client.get(url)
+
+        async def one():
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                response = await fetch()
+                latencies.append((time.perf_counter() - start) * 1000)
+                if response.status_code != 200:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - started
+        if mode == 'sync':
+            executor.shutdown()
+        return {
+            'mode': mode,
+            'concurrency': concurrency,
+            'requests': total,
+            'errors': errors,
+            'req_per_sec': total / elapsed,
+            'p50_ms': percentile(latencies, 50),
+            'p99_ms': percentile(latencies, 99),
+        }
@@ -0,0 +1,106 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from redis_monitor.models import RedisMetric, MetricBlock
+from redis_monitor.utils import get_redis_connection, calculate_derived_metrics
+from redis_monitor.timeseries import BlockWriter, extract, read_series
+from datetime import timedelta
+import json
+import random
+import time
+
+QUERY_FIELDS = ['used_memory', 'keyspace_hits', 'total_commands_processed']
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare bytes per sample and history query latency of full-INFO rows (before) '
+        'against slim rows plus columnar MetricBlocks (after). Uses synthetic samples '
+        'derived from one live INFO; everything is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, default=28800, help='Samples to write (default: 1 day at 3s)')
+        parser.add_argument('--interval', type=int, default=3, help='Seconds between synthetic samples')
+
+    def handle(self, *args, **options):
+        base = get_redis_connection().info()
+        infos = list(self.synthetic_infos(base, options['samples']))
+        start = timezone.now() - timedelta(seconds=options['samples'] * options['interval'])
+        stamps = [start + timedelta(seconds=i * options['interval']) for i in range(len(infos))]
+
+        with transaction.atomic():
+            before = self.bench_before(infos)
+            transaction.set_rollback(True)
+        with transaction.atomic():
+            after = self.bench_after(infos, stamps)
+            transaction.set_rollback(True)
+
+        for name, row in (('before', before), ('after', after)):
+            self.stdout.write(
+                f"{name:>6}: {row['bytes_per_sample']:8.1f} bytes/sample  "
+                f"write {row['write_s']:.2f}s  query {row['query_ms']:.1f}ms ({len(QUERY_FIELDS)} fields, all samples)"
+            )
+        self.stdout.write(json.dumps({'samples': len(infos), 'before': before, 'after': after}))
+
+    def synthetic_infos(self, base, count):
+        info = dict(base)
+        for _ in range(count):
+            info = dict(info)
+            for key in ('total_commands_processed', 'keyspace_hits', 'keyspace_misses',
+                        'total_net_input_bytes', 'total_net_output_bytes', 'uptime_in_seconds'):
+                info[key] = info.get(key, 0) + random.randint(0, 5000)
+            info['used_memory'] = max(0, info.get('used_memory', 0) + random.randint(-4096, 4096))
+            info['instantaneous_ops_per_sec'] = random.randint(0, 2000)
+            info['mem_fragmentation_ratio'] = round(random.uniform(1.0, 1.5), 2)
+            yield info
+
+    @staticmethod
+    def row(info, raw_info):
+        return RedisMetric(
+            raw_info=raw_info,
+            memory_used=info.get('used_memory'),
+            ops_per_sec=info.get('instantaneous_ops_per_sec'),
+            hit_rate=calculate_derived_metrics(info)['hit_rate'],
+            rejected_connections=info.get('rejected_connections'),
+        )
+
+    # Typed columns: timestamp + 4 numbers, ~8 bytes each.
+    ROW_BYTES = 40
+
+    def bench_before(self, infos):
+        started = time.perf_counter()
+        RedisMetric.objects.bulk_create((self.row(info, info) for info in infos), batch_size=500)
+        write_s = time.perf_counter() - started
+        payload = sum(len(json.dumps(info)) for info in infos)
+
+        started = time.perf_counter()
+        series = {field: [] for field in QUERY_FIELDS}
+        for raw_info, in RedisMetric.objects.values_list('raw_info').iterator():
+            for field in QUERY_FIELDS:
+                series[field].append(raw_info.get(field))
+        query_ms = (time.perf_counter() - started) * 1000
+        return {
+            'bytes_per_sample': self.ROW_BYTES + payload / len(infos),
+            'write_s': write_s,
+            'query_ms': query_ms,
+        }
+
+    def bench_after(self, infos, stamps):
+        started = time.perf_counter()
+        RedisMetric.objects.bulk_create((self.row(info, {}) for info in infos), batch_size=500)
+        writer = BlockWriter()
+        for when, info in zip(stamps, infos):
+            writer.add(when, extract(info))
+        writer.flush()
+        write_s = time.perf_counter() - started
+        payload = sum(len(data) for data in MetricBlock.objects.values_list('data', flat=True))
+
+        started = time.perf_counter()
+        read_series(None, stamps[0], stamps[-1], QUERY_FIELDS)
+        query_ms = (time.perf_counter() - started) * 1000
+        return {
+            'bytes_per_sample': self.ROW_BYTES + len('{}') + payload / len(infos),
+            'write_s': write_s,
+            'query_ms': query_ms,
+        }
@@ -1,43 +1,372 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from django.conf import settings
-from redis_monitor.models import RedisMetric
+from redis_monitor.models import RedisInstance, RedisMetric, HotKeySnapshot
 from redis_monitor.utils import get_redis_connection, calculate_derived_metrics
+from redis_monitor.timeseries import BlockWriter, extract, snapshot_due
+from redis_monitor.rollups import RollupWriter, metric_values
+from redis_monitor.retention import prune
+from redis_monitor.infocache import info_cache, info_key
+from redis_monitor.live import sample_message, publish_samples
+from redis_monitor.cluster import aggregate_info, cluster_nodes, node_url
+from redis_monitor.hotkeys import start_tracking, snapshot_row
+from redis_monitor.diagnostics import Diagnostics, save_rows
+from redis_monitor.alerts import AlertEngine
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import math
+import random
 import time
-import json
-from datetime import timedelta
+
+
+def fetch_info(url, jitter, diagnostics=None, started=None):
+    """
+    Runs in a worker thread: a random delay so instances aren't hit in
+    lockstep, then ``(INFO, raw diagnostics or None)``; the slowlog/latency/
+    commandstats reads ride in the INFO pipeline. The monotonic time the
+    INFO call begins is appended to ``started``, see ``Command.wait_for()``.
+    """
+    if jitter:
+        time.sleep(random.uniform(0, jitter))
+    if started is not None:
+        started.append(time.monotonic())
+    r = get_redis_connection(url)
+    if diagnostics is None:
+        return r.info(), None
+    return diagnostics.fetch(r)
+
+
+class InstanceState:
+    """Per-instance writers and raw-INFO snapshot bookkeeping, kept across ticks."""
+
+    def __init__(self, instance, force_raw_info=False):
+        self.instance = instance
+        self.writer = BlockWriter(instance)
+        self.rollups = RollupWriter(instance)
+        self.force_raw_info = force_raw_info
+        self.pending = None  # INFO future still running from an earlier tick
+        self.started = []  # when its INFO call began (filled in by fetch_info)
+        self.diagnostics = None  # slowlog/latency/commandstats positions, see diagnostics.py
+        if settings.METRICS_DIAGNOSTICS and not instance.is_cluster:
+            self.diagnostics = Diagnostics(instance)
+        self.raw_diagnostics = None  # fetched this tick, not yet stored
+        last_snapshot = RedisMetric.objects.filter(instance=instance).exclude(raw_info={}).first()
+        self.last_snapshot = last_snapshot.raw_info if last_snapshot else None
+        self.last_snapshot_at = last_snapshot.timestamp if last_snapshot else None
+
+    def sample(self, info):
+        """
+        Build (but don't save) the RedisMetric row for ``info`` and feed the
+        block/rollup writers.
+
+        The registry fields go to the columnar MetricBlock store. The row is
+        still written for every sample: it backs the paginated
+        /api/metrics/history/ rows, raw-tier history points, /api/status/ and
+        alert evaluation. It holds only the four summary columns, plus the
+        full INFO when the server changed (or periodically). Rows without
+        INFO are pruned after METRICS_ROW_RETENTION_DAYS; the blocks,
+        rollups and INFO snapshots keep the full retention, and older
+        history pages are read back from the blocks (rollups.HistoryRows).
+        """
+        now = timezone.now()
+        derived = calculate_derived_metrics(info)
+        store_raw = self.force_raw_info or snapshot_due(
+            info, self.last_snapshot, self.last_snapshot_at, now
+        )
+        metric = RedisMetric(
+            instance=self.instance,
+            timestamp=now,
+            raw_info=info if store_raw else {},
+            memory_used=info.get('used_memory'),
+            ops_per_sec=info.get('instantaneous_ops_per_sec'),
+            hit_rate=derived['hit_rate'],
+            rejected_connections=info.get('rejected_connections')
+        )
+        if store_raw:
+            self.last_snapshot, self.last_snapshot_at = info, metric.timestamp
+            self.force_raw_info = False
+        self.writer.add(metric.timestamp, extract(info))
+        self.rollups.add(metric.timestamp, metric_values(metric))
+        return metric
+
+    def flush(self):
+        self.writer.flush()
+        self.rollups.flush()
+
 
 class Command(BaseCommand):
-    help = 'Collect Redis metrics and prune old data'
+    help = 'Collect metrics from every enabled Redis instance and prune old data'
 
     def add_arguments(self, parser):
         parser.add_argument('--loop', action='store_true', help='Run in loop mode for development')
+        parser.add_argument('--raw-info', action='store_true', help='Store the full INFO with the first sample')
 
     def handle(self, *args, **options):
         interval = settings.METRICS_COLLECTION_INTERVAL
         retention_days = settings.METRICS_RETENTION_DAYS
-        if options['loop']:
-            while True:
-                self.collect_and_prune(retention_days)
-                time.sleep(interval)
-        else:
+        self.force_raw_info = options['raw_info']
+        self.states = {}
+        self.buffer = []  # unsaved RedisMetric rows, written with bulk_create
+        self.last_write = self.last_prune = time.monotonic()
+        self.last_discovery = {}  # cluster instance id -> monotonic time of the last node sync
+        self.hot_keys = {}  # instance id -> HotKeyWorker (loop mode with HOTKEYS_ENABLED)
+        self.last_hot_keys = time.monotonic()
+        self.alerts = AlertEngine() if settings.ALERTS_ENABLED else None
+        # Worker threads only run INFO; all ORM writes stay on this thread.
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.METRICS_COLLECTOR_WORKERS, thread_name_prefix='collector'
+        )
+        try:
+            if options['loop']:
+                self.run_loop(interval, retention_days)
+            else:
+                self.collect_and_prune(retention_days, prune_now=True)
+        finally:
+            self.flush()
+            for worker in self.hot_keys.values():
+                worker.stop()
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            if self.alerts is not None:
+                self.alerts.close()
+
+    def run_loop(self, interval, retention_days):
+        # Ticks are scheduled on a fixed monotonic grid, so the cadence doesn't
+        # drift by the collection time; ticks missed while a round overran are
+        # skipped rather than run back to back.
+        next_tick = time.monotonic()
+        last_flush = next_tick
+        while True:
             self.collect_and_prune(retention_days)
+            if settings.HOTKEYS_ENABLED:
+                self.track_hot_keys()
+            if time.monotonic() - last_flush >= settings.METRICS_BLOCK_FLUSH_SECONDS:
+                self.flush()
+                last_flush = time.monotonic()
+            next_tick += interval
+            now = time.monotonic()
+            if now > next_tick:
+                next_tick += math.ceil((now - next_tick) / interval) * interval
+            time.sleep(next_tick - now)
+
+    def flush(self):
+        self.write_metrics()
+        for state in self.states.values():
+            state.flush()
 
-    def collect_and_prune(self, retention_days):
+    def write_metrics(self):
+        if self.buffer:
+            try:
+                RedisMetric.objects.bulk_create(self.buffer, batch_size=500)
+                self.buffer = []
+            except Exception as e:
+                # bulk_create is atomic, so nothing was written: keep the newest
+                # rows for the next flush, but no more than METRICS_WRITE_BUFFER_MAX.
+                dropped = max(len(self.buffer) - settings.METRICS_WRITE_BUFFER_MAX, 0)
+                self.buffer = self.buffer[dropped:]
+                self.stderr.write(self.style.ERROR(
+                    f'Writing {len(self.buffer) + dropped} metric rows failed: {e}; '
+                    f'{dropped} dropped, {len(self.buffer)} kept for retry'
+                ))
+        self.last_write = time.monotonic()
+
+    def track_hot_keys(self):
+        """
+        Keep a hot-key worker on every polled server (cluster nodes rather
+        than the cluster) and store their windows every HOTKEYS_SNAPSHOT_INTERVAL.
+        """
+        instances = {state.instance.id: state.instance for state in self.states.values()
+                     if not state.instance.is_cluster}
+        for instance_id in set(self.hot_keys) - set(instances):
+            self.hot_keys.pop(instance_id).stop()
+        for instance_id, instance in instances.items():
+            if instance_id not in self.hot_keys:
+                self.hot_keys[instance_id] = start_tracking(instance)
+        if time.monotonic() - self.last_hot_keys < settings.HOTKEYS_SNAPSHOT_INTERVAL:
+            return
+        self.last_hot_keys = time.monotonic()
         try:
-            r = get_redis_connection()
-            info = r.info()
-            derived = calculate_derived_metrics(info)
-            RedisMetric.objects.create(
-                raw_info=info,
-                memory_used=info.get('used_memory'),
-                ops_per_sec=info.get('instantaneous_ops_per_sec'),
-                hit_rate=derived['hit_rate'],
-                rejected_connections=info.get('rejected_connections')
+            HotKeySnapshot.objects.bulk_create([
+                snapshot_row(instances[instance_id], worker.tracker) for instance_id, worker in self.hot_keys.items()
+            ])
+        except Exception as e:
+            self.stderr.write(self.style.ERROR(f'Hot key snapshot failed: {e}'))
+
+    def prune_due(self):
+        return time.monotonic() - self.last_prune >= settings.METRICS_PRUNE_INTERVAL
+
+    def sync_cluster_nodes(self, cluster):
+        """Register every node of ``cluster`` as a child instance; disable the ones that left."""
+        future = self.executor.submit(cluster_nodes, cluster.redis_url)
+        nodes = future.result(timeout=settings.METRICS_INSTANCE_TIMEOUT)
+        seen = set()
+        for host, port, role in nodes:
+            name = f"{cluster.name}-{host.replace('.', '-').replace(':', '-')}-{port}"[:64]
+            child, _ = RedisInstance.objects.update_or_create(
+                name=name, defaults={'parent': cluster, 'url': node_url(cluster.redis_url, host, port), 'enabled': True}
+            )
+            seen.add(child.id)
+        cluster.nodes.exclude(id__in=seen).update(enabled=False)
+
+    def discover_clusters(self, instances):
+        for instance in instances:
+            if not instance.is_cluster:
+                continue
+            last = self.last_discovery.get(instance.id)
+            if last is not None and time.monotonic() - last < settings.METRICS_CLUSTER_DISCOVERY_INTERVAL:
+                continue
+            self.last_discovery[instance.id] = time.monotonic()
+            try:
+                self.sync_cluster_nodes(instance)
+            except Exception as e:
+                self.stderr.write(self.style.ERROR(f'{instance.name}: node discovery failed: {e}'))
+
+    def enabled_instances(self):
+        return list(RedisInstance.objects.filter(enabled=True).exclude(parent__enabled=False))
+
+    def instance_states(self):
+        if not RedisInstance.objects.exists():
+            RedisInstance.get_default()
+        instances = self.enabled_instances()
+        if any(instance.is_cluster for instance in instances):
+            self.discover_clusters(instances)
+            instances = self.enabled_instances()
+        for instance in instances:
+            state = self.states.get(instance.id)
+            if state is None:
+                self.states[instance.id] = InstanceState(instance, self.force_raw_info)
+            else:
+                state.instance.url = instance.url  # pick up edits without losing writer state
+        for instance_id in set(self.states) - {instance.id for instance in instances}:
+            self.states.pop(instance_id).flush()
+        return list(self.states.values())
+
+    def collect(self):
+        """Poll every instance concurrently; return ``{state: info}`` for the ones that answered in time."""
+        futures = {}
+        for state in self.instance_states():
+            if state.instance.is_cluster:
+                continue  # sampled from its nodes, see cluster_samples()
+            if state.pending is not None and not state.pending.done():
+                self.stderr.write(self.style.WARNING(
+                    f'{state.instance.name}: previous INFO still running, skipping this tick'
+                ))
+                continue
+            state.started = []
+            state.pending = self.executor.submit(
+                fetch_info, state.instance.redis_url, settings.METRICS_COLLECTION_JITTER, state.diagnostics,
+                state.started
+            )
+            futures[state.pending] = state
+        done = self.wait_for(futures)
+        results = {}
+        for future in done:
+            state = futures[future]
+            state.pending = None
+            try:
+                results[state], state.raw_diagnostics = future.result()
+            except Exception as e:
+                self.stderr.write(self.style.ERROR(f'{state.instance.name}: {e}'))
+        return results
+
+    def wait_for(self, futures):
+        """
+        Wait for each INFO future until METRICS_INSTANCE_TIMEOUT after its
+        call began, so the jitter delay and the other instances don't count
+        against it. One still queued behind busy workers gives up (and is
+        cancelled) jitter + timeout after submission. Returns the done futures.
+        """
+        timeout = settings.METRICS_INSTANCE_TIMEOUT
+        queued_deadline = time.monotonic() + settings.METRICS_COLLECTION_JITTER + timeout
+        done, pending = set(), set(futures)
+        while pending:
+            now = time.monotonic()
+            deadlines = {}
+            for future in pending:
+                started = futures[future].started
+                deadline = started[0] + timeout if started else queued_deadline
+                if deadline > now or future.done():
+                    deadlines[future] = deadline
+                elif started:
+                    self.stderr.write(self.style.ERROR(f'{futures[future].instance.name}: timed out after {timeout}s'))
+                else:
+                    future.cancel()
+                    self.stderr.write(self.style.ERROR(
+                        f'{futures[future].instance.name}: INFO not started in time (all collector workers busy)'
+                    ))
+            if not deadlines:
+                break
+            finished, pending = wait(
+                deadlines, timeout=max(min(deadlines.values()) - now, 0), return_when=FIRST_COMPLETED
             )
-            # Prune
-            cutoff = timezone.now() - timedelta(days=retention_days)
-            RedisMetric.objects.filter(timestamp__lt=cutoff).delete()
+            done |= finished
+        return done
+
+    def cluster_samples(self, results):
+        """``{cluster state: aggregated INFO}`` from the node INFOs collected this tick."""
+        by_parent = {}
+        for state, info in results.items():
+            if state.instance.parent_id is not None:
+                by_parent.setdefault(state.instance.parent_id, []).append(info)
+        return {
+            state: aggregate_info(by_parent[instance_id])
+            for instance_id, state in self.states.items()
+            if state.instance.is_cluster and by_parent.get(instance_id)
+        }
+
+    def store_diagnostics(self, results):
+        slow, latency, stats = [], [], []
+        for state in results:
+            if state.raw_diagnostics is None:
+                continue
+            try:
+                rows = state.diagnostics.rows(state.raw_diagnostics)
+            except Exception as e:
+                self.stderr.write(self.style.ERROR(f'{state.instance.name}: diagnostics: {e}'))
+                continue
+            finally:
+                state.raw_diagnostics = None
+            slow += rows[0]
+            latency += rows[1]
+            stats += rows[2]
+        try:
+            save_rows(slow, latency, stats)
+        except Exception as e:
+            self.stderr.write(self.style.ERROR(f'Storing diagnostics failed: {e}'))
+
+    def collect_and_prune(self, retention_days, prune_now=False):
+        try:
+            messages = []
+            samples = []  # (instance, metric) for the alert rules
+            results = self.collect()
+            results.update(self.cluster_samples(results))
+            for state, info in results.items():
+                try:
+                    metric = state.sample(info)
+                    self.buffer.append(metric)
+                    samples.append((state.instance, metric))
+                    if settings.LIVE_PUBLISH and settings.LIVE_PUBSUB_URL:
+                        messages.append(sample_message(state.instance, metric, extract(info)))
+                    if settings.INFO_CACHE_FROM_COLLECTOR:
+                        # Lets API processes answer /api/metrics/ from this sample (needs INFO_CACHE_ALIAS)
+                        info_cache.set(info_key(state.instance), info,
+                                       ttl=settings.METRICS_COLLECTION_INTERVAL + settings.INFO_CACHE_TTL)
+                except Exception as e:
+                    self.stderr.write(self.style.ERROR(f'{state.instance.name}: {e}'))
+            self.store_diagnostics(results)
+            if self.alerts is not None:
+                try:
+                    self.alerts.evaluate(samples)
+                except Exception as e:
+                    self.stderr.write(self.style.ERROR(f'Alert evaluation failed: {e}'))
+            try:
+                publish_samples(messages)
+            except Exception as e:
+                self.stderr.write(self.style.ERROR(f'Live publish failed: {e}'))
+            if (len(self.buffer) >= settings.METRICS_WRITE_BATCH_SIZE
+                    or time.monotonic() - self.last_write >= settings.METRICS_WRITE_FLUSH_SECONDS):
+                self.write_metrics()
+            if prune_now or self.prune_due():
+                prune(retention_days=retention_days)
+                self.last_prune = time.monotonic()
             self.stdout.write(self.style.SUCCESS('Metrics collected and pruned successfully'))
         except Exception as e:
-            self.stderr.write(self.style.ERROR(f'Error: {str(e)}'))
\ No newline at end of file
+            self.stderr.write(self.style.ERROR(f'Error: {str(e)}'))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from redis_monitor.models import RedisInstance, MetricBlock, MetricRollup
+from redis_monitor.rollups import BLOCK_FIELDS, RollupWriter, TIERS, block_metric_values
+from redis_monitor.timeseries import bucket_floor, read_series
+from datetime import timedelta
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the 1m/10m/1h metric rollups from the stored samples (the MetricBlock columns, '
+        'which outlive the per-sample rows); older rollups are left as they are'
+    )
+
+    def handle(self, *args, **options):
+        samples = 0
+        widest = max(TIERS)
+        with transaction.atomic():
+            for instance in RedisInstance.objects.all():
+                first = MetricBlock.objects.filter(instance=instance).order_by('start').first()
+                if first is None:
+                    continue
+                # From the first bucket of every tier the blocks cover in full.
+                start = bucket_floor(first.start, widest)
+                if start < first.start:
+                    start += timedelta(seconds=widest)
+                MetricRollup.objects.filter(instance=instance, bucket__gte=start).delete()
+                series = read_series(instance, start, None, BLOCK_FIELDS)
+                writer = RollupWriter(instance)
+                for i, timestamp in enumerate(series['timestamp']):
+                    writer.add(timestamp, block_metric_values({field: series[field][i] for field in BLOCK_FIELDS}))
+                    samples += 1
+                writer.flush()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rollups from {samples} samples'))
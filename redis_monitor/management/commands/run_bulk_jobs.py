@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from redis_monitor.models import BulkJob
+from redis_monitor.bulkops import run_job
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        'Run pending bulk key jobs (delete/expire by pattern, NDJSON import). Needed when '
+        'BULK_JOBS_IN_PROCESS is off, or to resume jobs interrupted by a restart (--resume).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--job', type=int, help='Run only this job')
+        parser.add_argument('--resume', action='store_true',
+                            help="Also pick up 'running' jobs whose process died (no checkpoint for "
+                                 "BULK_JOB_LEASE_SECONDS plus the job's pacing)")
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new jobs')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        statuses = [BulkJob.STATUS_PENDING]
+        if options['resume']:
+            statuses.append(BulkJob.STATUS_RUNNING)
+        jobs = BulkJob.objects.select_related('instance').filter(status__in=statuses).order_by('started_at')
+        if options['job']:
+            jobs = jobs.filter(id=options['job'])
+            if not jobs.exists():
+                raise CommandError(f"No {' or '.join(statuses)} bulk job {options['job']}")
+        while True:
+            for job in jobs.all():
+                job = run_job(job, resume=options['resume'])
+                if job.status == BulkJob.STATUS_RUNNING:
+                    continue  # claimed elsewhere, or still alive
+                self.stdout.write(
+                    f'Bulk {job.operation} {job.id}: {job.status}, {job.scanned} scanned, '
+                    f'{job.affected} affected, {job.failed} failed'
+                )
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,53 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .instrumentation import begin_request, end_request, observe_request, server_timing
+
+
+class InstrumentationMiddleware:
+    """
+    Counts the Redis work done for each request (see instrumentation.py),
+    adds it as a ``Server-Timing`` header and records it in the ``/metrics``
+    histograms, labelled by the resolved view name.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not settings.REDIS_INSTRUMENTATION:
+            return self.get_response(request)
+        stats, token = begin_request()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            end_request(token)
+        return self.finish(request, response, time.perf_counter() - started, stats)
+
+    async def __acall__(self, request):
+        if not settings.REDIS_INSTRUMENTATION:
+            return await self.get_response(request)
+        stats, token = begin_request()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            end_request(token)
+        return self.finish(request, response, time.perf_counter() - started, stats)
+
+    def finish(self, request, response, seconds, stats):
+        match = request.resolver_match
+        endpoint = match.view_name if match else 'unmatched'
+        observe_request(endpoint, request.method, seconds, stats)
+        response['Server-Timing'] = server_timing(seconds, stats)
+        return response
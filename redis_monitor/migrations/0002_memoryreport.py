@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('redis_monitor', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemoryReport',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('started_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(null=True)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='running', max_length=16)),
+                ('delimiter', models.CharField(default=':', max_length=8)),
+                ('depth', models.PositiveSmallIntegerField(default=1)),
+                ('sample_rate', models.FloatField(default=1.0)),
+                ('top_n', models.PositiveIntegerField(default=50)),
+                ('cursor', models.CharField(default='0', max_length=32)),
+                ('keys_scanned', models.BigIntegerField(default=0)),
+                ('keys_sampled', models.BigIntegerField(default=0)),
+                ('state', models.JSONField(default=dict)),
+                ('error', models.TextField(blank=True)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+    ]
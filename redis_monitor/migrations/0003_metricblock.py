@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('redis_monitor', '0002_memoryreport'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricBlock',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('start', models.DateTimeField(db_index=True)),
+                ('end', models.DateTimeField(db_index=True)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('fields', models.JSONField(default=list)),
+                ('data', models.BinaryField()),
+            ],
+            options={
+                'ordering': ['start'],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('redis_monitor', '0003_metricblock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricRollup',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('tier', models.PositiveIntegerField()),
+                ('bucket', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('memory_used_min', models.FloatField(null=True)),
+                ('memory_used_max', models.FloatField(null=True)),
+                ('memory_used_avg', models.FloatField(null=True)),
+                ('memory_used_last', models.FloatField(null=True)),
+                ('ops_per_sec_min', models.FloatField(null=True)),
+                ('ops_per_sec_max', models.FloatField(null=True)),
+                ('ops_per_sec_avg', models.FloatField(null=True)),
+                ('ops_per_sec_last', models.FloatField(null=True)),
+                ('hit_rate_min', models.FloatField(null=True)),
+                ('hit_rate_max', models.FloatField(null=True)),
+                ('hit_rate_avg', models.FloatField(null=True)),
+                ('hit_rate_last', models.FloatField(null=True)),
+                ('rejected_connections_min', models.FloatField(null=True)),
+                ('rejected_connections_max', models.FloatField(null=True)),
+                ('rejected_connections_avg', models.FloatField(null=True)),
+                ('rejected_connections_last', models.FloatField(null=True)),
+            ],
+            options={
+                'ordering': ['bucket'],
+                'unique_together': {('tier', 'bucket')},
+            },
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def assign_default_instance(apps, schema_editor):
+    """Rows collected before instances existed belong to the default instance."""
+    RedisInstance = apps.get_model('redis_monitor', 'RedisInstance')
+    models_with_instance = ['RedisMetric', 'MetricBlock', 'MetricRollup', 'MemoryReport']
+    if not any(apps.get_model('redis_monitor', name).objects.exists() for name in models_with_instance):
+        return
+    default, _ = RedisInstance.objects.get_or_create(name='default')
+    for name in models_with_instance:
+        apps.get_model('redis_monitor', name).objects.filter(instance=None).update(instance=default)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('redis_monitor', '0004_metricrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RedisInstance',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.SlugField(max_length=64, unique=True)),
+                ('url', models.CharField(blank=True, max_length=512)),
+                ('enabled', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='metricrollup',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='memoryreport',
+            name='instance',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='memory_reports', to='redis_monitor.redisinstance'),
+        ),
+        migrations.AddField(
+            model_name='metricblock',
+            name='instance',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='metric_blocks', to='redis_monitor.redisinstance'),
+        ),
+        migrations.AddField(
+            model_name='metricrollup',
+            name='instance',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='redis_monitor.redisinstance'),
+        ),
+        migrations.AddField(
+            model_name='redismetric',
+            name='instance',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='metrics', to='redis_monitor.redisinstance'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='metricrollup',
+            unique_together={('instance', 'tier', 'bucket')},
+        ),
+        migrations.RunPython(assign_default_instance, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('redis_monitor', '0005_redisinstance'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='metricrollup',
+            name='bucket',
+            field=models.DateTimeField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='redismetric',
+            name='timestamp',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
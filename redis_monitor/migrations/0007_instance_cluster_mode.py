@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('redis_monitor', '0006_metric_sample_time'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='redisinstance',
+            name='mode',
+            field=models.CharField(choices=[('standalone', 'Standalone'), ('cluster', 'Cluster')], default='standalone', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='redisinstance',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='nodes', to='redis_monitor.redisinstance'),
+        ),
+        migrations.AddField(
+            model_name='redisinstance',
+            name='read_from_replicas',
+            field=models.BooleanField(default=False),
+        ),
+    ]
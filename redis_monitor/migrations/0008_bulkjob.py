@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('redis_monitor', '0007_instance_cluster_mode'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BulkJob',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('operation', models.CharField(choices=[('delete', 'Delete by pattern'), ('expire', 'Expire by pattern'), ('import', 'Import NDJSON')], max_length=16)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], db_index=True, default='pending', max_length=16)),
+                ('match', models.CharField(blank=True, max_length=512)),
+                ('ttl', models.IntegerField(null=True)),
+                ('rate', models.PositiveIntegerField(default=0)),
+                ('batch_size', models.PositiveIntegerField(default=500)),
+                ('payload', models.TextField(blank=True)),
+                ('total', models.BigIntegerField(null=True)),
+                ('cursor', models.CharField(default='0', max_length=1024)),
+                ('scanned', models.BigIntegerField(default=0)),
+                ('affected', models.BigIntegerField(default=0)),
+                ('failed', models.BigIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('started_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(null=True)),
+                ('instance', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='bulk_jobs', to='redis_monitor.redisinstance')),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+    ]
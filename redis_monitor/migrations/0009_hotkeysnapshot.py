@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:17
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('redis_monitor', '0008_bulkjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HotKeySnapshot',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('timestamp', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('window_seconds', models.FloatField()),
+                ('events', models.BigIntegerField(default=0)),
+                ('event_counts', models.JSONField(default=dict)),
+                ('keys', models.JSONField(default=list)),
+                ('prefixes', models.JSONField(default=list)),
+                ('hot_keys', models.JSONField(default=list)),
+                ('live', models.BooleanField(default=False)),
+                ('lfu', models.BooleanField(default=False)),
+                ('instance', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='hot_key_snapshots', to='redis_monitor.redisinstance')),
+            ],
+            options={
+                'ordering': ['-timestamp'],
+            },
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('redis_monitor', '0009_hotkeysnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CommandStat',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('timestamp', models.DateTimeField(db_index=True)),
+                ('interval_seconds', models.FloatField()),
+                ('command', models.CharField(db_index=True, max_length=64)),
+                ('calls', models.BigIntegerField()),
+                ('usec', models.BigIntegerField()),
+                ('failed_calls', models.BigIntegerField(default=0)),
+                ('rejected_calls', models.BigIntegerField(default=0)),
+                ('instance', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='command_stats', to='redis_monitor.redisinstance')),
+            ],
+            options={
+                'ordering': ['timestamp'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LatencyEvent',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('event', models.CharField(max_length=64)),
+                ('timestamp', models.DateTimeField(db_index=True)),
+                ('latency_ms', models.IntegerField()),
+                ('instance', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='latency_events', to='redis_monitor.redisinstance')),
+            ],
+            options={
+                'ordering': ['-timestamp'],
+                'unique_together': {('instance', 'event', 'timestamp')},
+            },
+        ),
+        migrations.CreateModel(
+            name='SlowLogEntry',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('entry_id', models.BigIntegerField()),
+                ('timestamp', models.DateTimeField(db_index=True)),
+                ('duration_us', models.BigIntegerField()),
+                ('command', models.CharField(db_index=True, max_length=64)),
+                ('command_line', models.CharField(max_length=1024)),
+                ('client_address', models.CharField(blank=True, max_length=64)),
+                ('client_name', models.CharField(blank=True, max_length=128)),
+                ('instance', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='slowlog', to='redis_monitor.redisinstance')),
+            ],
+            options={
+                'ordering': ['-timestamp', '-entry_id'],
+                'unique_together': {('instance', 'entry_id', 'timestamp')},
+            },
+        ),
+    ]
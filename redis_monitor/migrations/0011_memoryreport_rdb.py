@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('redis_monitor', '0010_diagnostics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='memoryreport',
+            name='key_types',
+            field=models.JSONField(default=dict),
+        ),
+        migrations.AddField(
+            model_name='memoryreport',
+            name='keys_path',
+            field=models.CharField(blank=True, max_length=1024),
+        ),
+        migrations.AddField(
+            model_name='memoryreport',
+            name='snapshot_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='memoryreport',
+            name='source',
+            field=models.CharField(choices=[('scan', 'Live SCAN'), ('rdb', 'RDB file')], default='scan', max_length=8),
+        ),
+        migrations.AddField(
+            model_name='memoryreport',
+            name='source_path',
+            field=models.CharField(blank=True, max_length=1024),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('redis_monitor', '0011_memoryreport_rdb'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertRule',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=128)),
+                ('metric', models.CharField(choices=[('memory_used', 'Memory used'), ('ops_per_sec', 'Ops/s'), ('hit_rate', 'Hit rate'), ('rejected_connections', 'Rejected connections')], max_length=32)),
+                ('kind', models.CharField(choices=[('threshold', 'Threshold'), ('rate', 'Rate of change'), ('zscore', 'Rolling z-score'), ('ewma', 'EWMA z-score')], default='threshold', max_length=16)),
+                ('direction', models.CharField(choices=[('above', 'Above'), ('below', 'Below')], default='above', max_length=8)),
+                ('threshold', models.FloatField()),
+                ('window', models.PositiveIntegerField(default=60)),
+                ('for_samples', models.PositiveIntegerField(default=1)),
+                ('webhook_url', models.URLField(blank=True, max_length=1024)),
+                ('enabled', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('instance', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='alert_rules', to='redis_monitor.redisinstance')),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Alert',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('state', models.CharField(choices=[('firing', 'Firing'), ('resolved', 'Resolved')], db_index=True, default='firing', max_length=16)),
+                ('started_at', models.DateTimeField(db_index=True)),
+                ('resolved_at', models.DateTimeField(null=True)),
+                ('value', models.FloatField()),
+                ('score', models.FloatField()),
+                ('peak_score', models.FloatField()),
+                ('message', models.CharField(blank=True, max_length=512)),
+                ('instance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alerts', to='redis_monitor.redisinstance')),
+                ('rule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alerts', to='redis_monitor.alertrule')),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:50
+
+from django.db import migrations, models
+from django.db.models import F
+
+METRICS = ['memory_used', 'ops_per_sec', 'hit_rate', 'rejected_connections']
+
+
+def count_existing(apps, schema_editor):
+    """Existing buckets counted every sample; that is the best weight there is for them."""
+    MetricRollup = apps.get_model('redis_monitor', 'MetricRollup')
+    for metric in METRICS:
+        MetricRollup.objects.filter(**{f'{metric}_avg__isnull': False}).update(**{f'{metric}_count': F('count')})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('redis_monitor', '0012_alerts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='metricrollup',
+            name='hit_rate_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='metricrollup',
+            name='memory_used_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='metricrollup',
+            name='ops_per_sec_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='metricrollup',
+            name='rejected_connections_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_existing, migrations.RunPython.noop),
+    ]
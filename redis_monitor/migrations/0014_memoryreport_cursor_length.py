@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('redis_monitor', '0013_rollup_metric_counts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='memoryreport',
+            name='cursor',
+            field=models.CharField(default='0', max_length=1024),
+        ),
+    ]
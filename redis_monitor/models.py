@@ -1,9 +1,57 @@
 from django.db import models
+from django.conf import settings
 from django.utils import timezone
 
+class RedisInstance(models.Model):
+    """
+    A monitored Redis server. Metrics and API calls are scoped to one; the
+    instance named ``default`` is created on demand and, while its ``url``
+    is blank, follows ``settings.REDIS_URL``.
+
+    A ``cluster`` instance is reached through any seed node in ``url``; the
+    collector registers each cluster node as a child instance (``parent``)
+    with its own history, and the cluster's samples aggregate the nodes'.
+    """
+    DEFAULT_NAME = 'default'
+    MODE_STANDALONE = 'standalone'
+    MODE_CLUSTER = 'cluster'
+    MODE_CHOICES = [
+        (MODE_STANDALONE, 'Standalone'),
+        (MODE_CLUSTER, 'Cluster'),
+    ]
+
+    id = models.AutoField(primary_key=True)
+    name = models.SlugField(max_length=64, unique=True)
+    url = models.CharField(max_length=512, blank=True)
+    mode = models.CharField(max_length=16, choices=MODE_CHOICES, default=MODE_STANDALONE)
+    read_from_replicas = models.BooleanField(default=False)  # cluster: send read-only browsing to replicas
+    parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.CASCADE, related_name='nodes')
+    enabled = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def redis_url(self):
+        return self.url or settings.REDIS_URL
+
+    @property
+    def is_cluster(self):
+        return self.mode == self.MODE_CLUSTER
+
+    @classmethod
+    def get_default(cls):
+        instance, _ = cls.objects.get_or_create(name=cls.DEFAULT_NAME)
+        return instance
+
 class RedisMetric(models.Model):
     id = models.AutoField(primary_key=True)
-    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
+    instance = models.ForeignKey(RedisInstance, null=True, on_delete=models.CASCADE, related_name='metrics')
+    timestamp = models.DateTimeField(default=timezone.now, db_index=True)  # sample time, not insert time
     raw_info = models.JSONField(default=dict)
     memory_used = models.FloatField(null=True)
     ops_per_sec = models.IntegerField(null=True)
@@ -14,4 +62,334 @@ class RedisMetric(models.Model):
         ordering = ['-timestamp']
 
     def __str__(self):
-        return f"Metric at {self.timestamp}"
\ No newline at end of file
+        return f"Metric at {self.timestamp}"
+
+class MemoryReport(models.Model):
+    """
+    A (possibly still running) keyspace memory analysis. ``cursor`` and the
+    analyzer ``state`` are checkpointed together, so an interrupted run can
+    be resumed with ``analyze_memory --resume``. RDB reports
+    (``analyze_rdb``) measure serialized sizes instead of MEMORY USAGE and
+    keep the key listing as NDJSON in ``keys_path``.
+    """
+    SOURCE_SCAN = 'scan'
+    SOURCE_RDB = 'rdb'
+    SOURCE_CHOICES = [
+        (SOURCE_SCAN, 'Live SCAN'),
+        (SOURCE_RDB, 'RDB file'),
+    ]
+
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    id = models.AutoField(primary_key=True)
+    instance = models.ForeignKey(RedisInstance, null=True, on_delete=models.CASCADE, related_name='memory_reports')
+    started_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_RUNNING)
+    delimiter = models.CharField(max_length=8, default=':')
+    depth = models.PositiveSmallIntegerField(default=1)
+    sample_rate = models.FloatField(default=1.0)
+    top_n = models.PositiveIntegerField(default=50)
+    cursor = models.CharField(max_length=1024, default='0')
+    keys_scanned = models.BigIntegerField(default=0)
+    keys_sampled = models.BigIntegerField(default=0)
+    state = models.JSONField(default=dict)
+    error = models.TextField(blank=True)
+    source = models.CharField(max_length=8, choices=SOURCE_CHOICES, default=SOURCE_SCAN)
+    source_path = models.CharField(max_length=1024, blank=True)
+    snapshot_at = models.DateTimeField(null=True)  # when the RDB was written
+    key_types = models.JSONField(default=dict)  # type -> {"keys", "bytes"} (RDB reports)
+    keys_path = models.CharField(max_length=1024, blank=True)
+
+    class Meta:
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"Memory report {self.id} ({self.status})"
+
+
+class MetricBlock(models.Model):
+    """
+    Numeric INFO samples for one METRICS_BLOCK_SECONDS bucket, packed
+    column-wise and compressed (see timeseries.py). ``fields`` lists the
+    registry fields stored in ``data``, in order.
+    """
+    id = models.AutoField(primary_key=True)
+    instance = models.ForeignKey(RedisInstance, null=True, on_delete=models.CASCADE, related_name='metric_blocks')
+    start = models.DateTimeField(db_index=True)
+    end = models.DateTimeField(db_index=True)
+    count = models.PositiveIntegerField(default=0)
+    fields = models.JSONField(default=list)
+    data = models.BinaryField()
+
+    class Meta:
+        ordering = ['start']
+
+    def __str__(self):
+        return f"Metric block {self.start} ({self.count} samples)"
+
+
+class MetricRollup(models.Model):
+    """
+    min/max/avg/last of the RedisMetric columns over one ``tier``-second
+    bucket, maintained incrementally by the collector (see rollups.py).
+    ``count`` is the samples in the bucket, ``<metric>_count`` the ones that
+    had that metric (the weight of its average).
+    """
+    id = models.AutoField(primary_key=True)
+    instance = models.ForeignKey(RedisInstance, null=True, on_delete=models.CASCADE, related_name='rollups')
+    tier = models.PositiveIntegerField()  # bucket width in seconds
+    bucket = models.DateTimeField(db_index=True)
+    count = models.PositiveIntegerField(default=0)
+    memory_used_min = models.FloatField(null=True)
+    memory_used_max = models.FloatField(null=True)
+    memory_used_avg = models.FloatField(null=True)
+    memory_used_last = models.FloatField(null=True)
+    memory_used_count = models.PositiveIntegerField(default=0)
+    ops_per_sec_min = models.FloatField(null=True)
+    ops_per_sec_max = models.FloatField(null=True)
+    ops_per_sec_avg = models.FloatField(null=True)
+    ops_per_sec_last = models.FloatField(null=True)
+    ops_per_sec_count = models.PositiveIntegerField(default=0)
+    hit_rate_min = models.FloatField(null=True)
+    hit_rate_max = models.FloatField(null=True)
+    hit_rate_avg = models.FloatField(null=True)
+    hit_rate_last = models.FloatField(null=True)
+    hit_rate_count = models.PositiveIntegerField(default=0)
+    rejected_connections_min = models.FloatField(null=True)
+    rejected_connections_max = models.FloatField(null=True)
+    rejected_connections_avg = models.FloatField(null=True)
+    rejected_connections_last = models.FloatField(null=True)
+    rejected_connections_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['bucket']
+        unique_together = [('instance', 'tier', 'bucket')]
+
+    def __str__(self):
+        return f"{self.tier}s rollup at {self.bucket}"
+
+
+class BulkJob(models.Model):
+    """
+    A background bulk operation on one instance's keys (see bulkops.py):
+    delete or expire every key matching ``match``, or import the NDJSON
+    rows in ``payload``. ``cursor`` (SCAN cursor, or NDJSON line reached)
+    and the counters are checkpointed, so progress can be polled and an
+    interrupted job resumed with ``run_bulk_jobs --resume``.
+    """
+    OP_DELETE = 'delete'
+    OP_EXPIRE = 'expire'
+    OP_IMPORT = 'import'
+    OPERATION_CHOICES = [
+        (OP_DELETE, 'Delete by pattern'),
+        (OP_EXPIRE, 'Expire by pattern'),
+        (OP_IMPORT, 'Import NDJSON'),
+    ]
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+        (STATUS_CANCELLED, 'Cancelled'),
+    ]
+
+    id = models.AutoField(primary_key=True)
+    instance = models.ForeignKey(RedisInstance, null=True, on_delete=models.CASCADE, related_name='bulk_jobs')
+    operation = models.CharField(max_length=16, choices=OPERATION_CHOICES)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True)
+    match = models.CharField(max_length=512, blank=True)
+    ttl = models.IntegerField(null=True)  # expire: seconds, or -1 to remove the TTL
+    rate = models.PositiveIntegerField(default=0)  # keys/second, 0 = unlimited
+    batch_size = models.PositiveIntegerField(default=500)
+    payload = models.TextField(blank=True)  # import: NDJSON rows, cleared once done
+    total = models.BigIntegerField(null=True)  # import: number of rows
+    cursor = models.CharField(max_length=1024, default='0')
+    scanned = models.BigIntegerField(default=0)
+    affected = models.BigIntegerField(default=0)
+    failed = models.BigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    started_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True)
+
+    class Meta:
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"Bulk {self.operation} {self.id} ({self.status})"
+
+
+class HotKeySnapshot(models.Model):
+    """
+    Most-mutated keys/prefixes (from keyevent notifications) and most-read
+    keys (``OBJECT FREQ`` under LFU) of one instance over one window, stored
+    by the collector next to its metric history (see hotkeys.py). ``keys``
+    and ``prefixes`` are ``[name, count, error]`` rows: the count may be
+    over by at most ``error``.
+    """
+    id = models.AutoField(primary_key=True)
+    instance = models.ForeignKey(RedisInstance, null=True, on_delete=models.CASCADE, related_name='hot_key_snapshots')
+    timestamp = models.DateTimeField(default=timezone.now, db_index=True)  # end of the window
+    window_seconds = models.FloatField()
+    events = models.BigIntegerField(default=0)
+    event_counts = models.JSONField(default=dict)  # keyevent type -> count, e.g. {"set": 120, "expired": 4}
+    keys = models.JSONField(default=list)
+    prefixes = models.JSONField(default=list)
+    hot_keys = models.JSONField(default=list)  # [key, freq]
+    live = models.BooleanField(default=False)  # notifications were subscribed
+    lfu = models.BooleanField(default=False)  # OBJECT FREQ was sampled
+
+    class Meta:
+        ordering = ['-timestamp']
+
+    def __str__(self):
+        return f"Hot keys at {self.timestamp}"
+
+
+class SlowLogEntry(models.Model):
+    """One ``SLOWLOG`` entry, stored once (see diagnostics.py)."""
+    id = models.AutoField(primary_key=True)
+    instance = models.ForeignKey(RedisInstance, null=True, on_delete=models.CASCADE, related_name='slowlog')
+    entry_id = models.BigIntegerField()  # the server's slowlog ID (restarts at 0 with the server)
+    timestamp = models.DateTimeField(db_index=True)
+    duration_us = models.BigIntegerField()
+    command = models.CharField(max_length=64, db_index=True)  # command name, upper-case
+    command_line = models.CharField(max_length=1024)  # as logged (Redis truncates long arguments)
+    client_address = models.CharField(max_length=64, blank=True)
+    client_name = models.CharField(max_length=128, blank=True)
+
+    class Meta:
+        ordering = ['-timestamp', '-entry_id']
+        unique_together = [('instance', 'entry_id', 'timestamp')]
+
+    def __str__(self):
+        return f"{self.command} {self.duration_us}us at {self.timestamp}"
+
+
+class LatencyEvent(models.Model):
+    """One latency-monitor spike (``LATENCY HISTORY``) of one event, e.g. ``command`` or ``fork``."""
+    id = models.AutoField(primary_key=True)
+    instance = models.ForeignKey(RedisInstance, null=True, on_delete=models.CASCADE, related_name='latency_events')
+    event = models.CharField(max_length=64)
+    timestamp = models.DateTimeField(db_index=True)
+    latency_ms = models.IntegerField()
+
+    class Meta:
+        ordering = ['-timestamp']
+        unique_together = [('instance', 'event', 'timestamp')]
+
+    def __str__(self):
+        return f"{self.event} {self.latency_ms}ms at {self.timestamp}"
+
+
+class CommandStat(models.Model):
+    """``INFO commandstats`` counters of one command over ``interval_seconds`` ending at ``timestamp``."""
+    id = models.AutoField(primary_key=True)
+    instance = models.ForeignKey(RedisInstance, null=True, on_delete=models.CASCADE, related_name='command_stats')
+    timestamp = models.DateTimeField(db_index=True)
+    interval_seconds = models.FloatField()
+    command = models.CharField(max_length=64, db_index=True)  # lower-case, e.g. get, config|set
+    calls = models.BigIntegerField()
+    usec = models.BigIntegerField()
+    failed_calls = models.BigIntegerField(default=0)
+    rejected_calls = models.BigIntegerField(default=0)
+
+    class Meta:
+        ordering = ['timestamp']
+
+    def __str__(self):
+        return f"{self.command}: {self.calls} calls at {self.timestamp}"
+
+
+class AlertRule(models.Model):
+    """
+    A condition on one sampled metric, evaluated by the collector on every
+    sample of ``instance`` (every instance when empty), see alerts.py:
+
+    - ``threshold``: the value itself;
+    - ``rate``: its change per second since the previous sample;
+    - ``zscore``: standard deviations from the mean of the last ``window`` samples;
+    - ``ewma``: standard deviations from an exponentially weighted mean and
+      variance (span ``window`` samples).
+
+    It fires once ``for_samples`` samples in a row are ``above``/``below``
+    ``threshold`` (z rules wait for ``window`` samples of baseline first).
+    """
+    METRIC_CHOICES = [
+        ('memory_used', 'Memory used'),
+        ('ops_per_sec', 'Ops/s'),
+        ('hit_rate', 'Hit rate'),
+        ('rejected_connections', 'Rejected connections'),
+    ]
+    KIND_CHOICES = [
+        ('threshold', 'Threshold'),
+        ('rate', 'Rate of change'),
+        ('zscore', 'Rolling z-score'),
+        ('ewma', 'EWMA z-score'),
+    ]
+    DIRECTION_CHOICES = [
+        ('above', 'Above'),
+        ('below', 'Below'),
+    ]
+
+    id = models.AutoField(primary_key=True)
+    name = models.CharField(max_length=128)
+    instance = models.ForeignKey(RedisInstance, null=True, blank=True, on_delete=models.CASCADE,
+                                 related_name='alert_rules')
+    metric = models.CharField(max_length=32, choices=METRIC_CHOICES)
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES, default='threshold')
+    direction = models.CharField(max_length=8, choices=DIRECTION_CHOICES, default='above')
+    threshold = models.FloatField()
+    window = models.PositiveIntegerField(default=60)  # samples, for zscore/ewma
+    for_samples = models.PositiveIntegerField(default=1)
+    webhook_url = models.URLField(max_length=1024, blank=True)  # default: ALERT_WEBHOOK_URL
+    enabled = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+class Alert(models.Model):
+    """One firing of a rule on one instance; resolved once the condition clears."""
+    STATE_FIRING = 'firing'
+    STATE_RESOLVED = 'resolved'
+    STATE_CHOICES = [
+        (STATE_FIRING, 'Firing'),
+        (STATE_RESOLVED, 'Resolved'),
+    ]
+
+    id = models.AutoField(primary_key=True)
+    rule = models.ForeignKey(AlertRule, on_delete=models.CASCADE, related_name='alerts')
+    instance = models.ForeignKey(RedisInstance, on_delete=models.CASCADE, related_name='alerts')
+    state = models.CharField(max_length=16, choices=STATE_CHOICES, default=STATE_FIRING, db_index=True)
+    started_at = models.DateTimeField(db_index=True)
+    resolved_at = models.DateTimeField(null=True)
+    value = models.FloatField()  # the metric when it fired
+    score = models.FloatField()  # what was compared with the threshold (value, rate or z)
+    peak_score = models.FloatField()  # furthest past the threshold while firing
+    message = models.CharField(max_length=512, blank=True)
+
+    class Meta:
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"{self.rule} on {self.instance} ({self.state})"
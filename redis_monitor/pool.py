@@ -0,0 +1,175 @@
+"""
+Process-wide registry of Redis connection pools.
+
+Every call to ``get_pool(url)`` for the same URL returns the same pool, so
+views and the collector share sockets instead of opening a new connection
+(and sending a PING) per request. Stale sockets are caught by redis-py's
+``health_check_interval`` and failed connects are retried with exponential
+backoff.
+
+``get_async_pool(url)`` is the ``redis.asyncio`` equivalent used by the
+async views. asyncio connections belong to one event loop, so those pools
+are kept per running loop.
+"""
+import asyncio
+import threading
+import weakref
+import time
+from queue import LifoQueue
+from urllib.parse import urlsplit, urlunsplit
+
+import redis
+import redis.asyncio as aioredis
+from redis.backoff import ExponentialBackoff
+from redis.retry import Retry
+from redis.asyncio.retry import Retry as AsyncRetry
+from django.conf import settings
+
+from .instrumentation import counting_connection_class
+
+
+class TimedQueue(LifoQueue):
+    """LifoQueue that remembers, per thread, how long the last ``get()`` blocked."""
+
+    def __init__(self, maxsize=0):
+        super().__init__(maxsize)
+        self.waits = threading.local()
+
+    def get(self, block=True, timeout=None):
+        start = time.perf_counter()
+        try:
+            return super().get(block, timeout)
+        finally:
+            self.waits.last = time.perf_counter() - start
+
+
+class StatsConnectionPool(redis.BlockingConnectionPool):
+    """
+    Blocking pool that keeps counters about how long callers wait for a
+    connection, so the pool can be sized under load. Only successful
+    checkouts are counted, and only the wait for a free slot is timed (not
+    connecting or health-checking the socket).
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('queue_class', TimedQueue)
+        super().__init__(*args, **kwargs)
+        # Lets instrumentation.py count the bytes each request reads.
+        self.connection_class = counting_connection_class(self.connection_class)
+        self._stats_lock = threading.Lock()
+        self.acquired = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.exhausted = 0
+
+    def get_connection(self, *args, **kwargs):
+        try:
+            connection = super().get_connection(*args, **kwargs)
+        except redis.ConnectionError as e:
+            if 'No connection available' in str(e):
+                with self._stats_lock:
+                    self.exhausted += 1
+            raise
+        waited = getattr(self.pool.waits, 'last', 0.0)
+        with self._stats_lock:
+            self.acquired += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+        return connection
+
+    def stats(self):
+        # ``pool`` is a LIFO queue of idle connections padded with None
+        # placeholders for connections that have not been created yet.
+        idle = sum(1 for conn in list(self.pool.queue) if conn is not None)
+        created = len(self._connections)
+        with self._stats_lock:
+            acquired = self.acquired
+            wait_total = self.wait_total
+            wait_max = self.wait_max
+            exhausted = self.exhausted
+        return {
+            'max_connections': self.max_connections,
+            'created': created,
+            'in_use': created - idle,
+            'idle': idle,
+            'acquired': acquired,
+            'exhausted': exhausted,
+            'wait_avg_ms': (wait_total / acquired * 1000) if acquired else 0.0,
+            'wait_max_ms': wait_max * 1000,
+        }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _pool_kwargs(retry_class):
+    retry = retry_class(
+        ExponentialBackoff(cap=settings.REDIS_RETRY_BACKOFF_CAP, base=settings.REDIS_RETRY_BACKOFF_BASE),
+        settings.REDIS_RETRY_ATTEMPTS,
+    )
+    return dict(
+        decode_responses=True,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        timeout=settings.REDIS_POOL_TIMEOUT,
+        health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+        socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        retry=retry,
+        retry_on_error=[redis.ConnectionError, redis.TimeoutError],
+    )
+
+
+def _build_pool(url):
+    return StatsConnectionPool.from_url(url, **_pool_kwargs(Retry))
+
+
+def get_pool(url=None):
+    """Return the shared pool for ``url`` (defaults to ``settings.REDIS_URL``)."""
+    url = url or settings.REDIS_URL
+    pool = _pools.get(url)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(url)
+            if pool is None:
+                pool = _pools[url] = _build_pool(url)
+    return pool
+
+
+_async_pools = weakref.WeakKeyDictionary()
+
+
+def get_async_pool(url=None):
+    """Return the shared ``redis.asyncio`` pool for ``url`` on the running loop."""
+    url = url or settings.REDIS_URL
+    pools = _async_pools.setdefault(asyncio.get_running_loop(), {})
+    pool = pools.get(url)
+    if pool is None:
+        pool = pools[url] = aioredis.BlockingConnectionPool.from_url(url, **_pool_kwargs(AsyncRetry))
+    return pool
+
+
+def redact_url(url):
+    """Strip the password from a Redis URL so it can be shown in the API."""
+    parts = urlsplit(url)
+    if parts.password is None:
+        return url
+    netloc = parts.netloc.rsplit('@', 1)[1]
+    if parts.username:
+        netloc = f"{parts.username}:***@{netloc}"
+    else:
+        netloc = f":***@{netloc}"
+    return urlunsplit(parts._replace(netloc=netloc))
+
+
+def pool_stats():
+    """Return stats for every pool created in this process, keyed by URL."""
+    return {redact_url(url): pool.stats() for url, pool in list(_pools.items())}
+
+
+def close_pools():
+    """Disconnect and forget every pool (used by tests and on shutdown)."""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.disconnect()
+        _pools.clear()
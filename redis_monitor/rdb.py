@@ -0,0 +1,487 @@
+"""
+Offline keyspace analysis from an RDB dump (``manage.py analyze_rdb``).
+
+The dump is memory-mapped and walked one record at a time, so the live
+server sees no load at all and memory use doesn't grow with the file.
+Values are skipped over, never built: element counts of collections saved
+as a single blob (ziplist, listpack, intset, zipmap) come from the blob
+header, and LZF-compressed blobs are only decompressed as far as that.
+
+Each key gets its type, TTL (relative to the dump's ``ctime``), size
+(STRLEN or element count, like ``/api/keys/inspect/``) and the number of
+bytes its record takes in the dump. The per-prefix breakdown uses those
+bytes: serialized sizes are smaller than ``MEMORY USAGE`` (no allocator or
+dict overhead, compressed strings), but rank prefixes and keys the same way.
+
+With several workers the parent only follows lengths through the file to
+cut it into chunks starting on record boundaries, and hands each chunk (and
+the DB selected at its start) to a worker process as soon as it is found.
+This module stays free of Django so workers start cheaply.
+"""
+import json
+import mmap
+from fnmatch import fnmatchcase
+import os
+import shutil
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from .analyzer import MemoryAnalyzer
+
+# Opcodes
+OP_SLOT_INFO = 0xF4
+OP_FUNCTION2 = 0xF5
+OP_MODULE_AUX = 0xF7
+OP_IDLE = 0xF8
+OP_FREQ = 0xF9
+OP_AUX = 0xFA
+OP_RESIZEDB = 0xFB
+OP_EXPIRETIME_MS = 0xFC
+OP_EXPIRETIME = 0xFD
+OP_SELECTDB = 0xFE
+OP_EOF = 0xFF
+
+# Value types
+STRING, LIST, SET, ZSET, HASH, ZSET_2, MODULE, MODULE_2 = 0, 1, 2, 3, 4, 5, 6, 7
+HASH_ZIPMAP, LIST_ZIPLIST, SET_INTSET, ZSET_ZIPLIST, HASH_ZIPLIST, LIST_QUICKLIST = 9, 10, 11, 12, 13, 14
+STREAM_LISTPACKS, HASH_LISTPACK, ZSET_LISTPACK, LIST_QUICKLIST_2 = 15, 16, 17, 18
+STREAM_LISTPACKS_2, SET_LISTPACK, STREAM_LISTPACKS_3 = 19, 20, 21
+
+TYPE_NAMES = {
+    STRING: 'string',
+    LIST: 'list', LIST_ZIPLIST: 'list', LIST_QUICKLIST: 'list', LIST_QUICKLIST_2: 'list',
+    SET: 'set', SET_INTSET: 'set', SET_LISTPACK: 'set',
+    ZSET: 'zset', ZSET_2: 'zset', ZSET_ZIPLIST: 'zset', ZSET_LISTPACK: 'zset',
+    HASH: 'hash', HASH_ZIPMAP: 'hash', HASH_ZIPLIST: 'hash', HASH_LISTPACK: 'hash',
+    STREAM_LISTPACKS: 'stream', STREAM_LISTPACKS_2: 'stream', STREAM_LISTPACKS_3: 'stream',
+    MODULE_2: 'module',
+}
+
+QUICKLIST_NODE_PLAIN = 1
+
+# One key: ``offset`` is where its record starts (expire/LFU/LRU prefixes included), ``nbytes`` its length.
+Entry = namedtuple('Entry', 'offset db key type expire_ms size nbytes')
+
+
+class RDBError(ValueError):
+    pass
+
+
+def lzf_decompress(data, limit):
+    """The first ``limit`` bytes LZF-decompressed from ``data``."""
+    out = bytearray()
+    i, n = 0, len(data)
+    while i < n and len(out) < limit:
+        ctrl = data[i]
+        i += 1
+        if ctrl < 32:
+            out += data[i:i + ctrl + 1]
+            i += ctrl + 1
+            continue
+        length = ctrl >> 5
+        if length == 7:
+            length += data[i]
+            i += 1
+        ref = len(out) - ((ctrl & 0x1F) << 8) - data[i] - 1
+        i += 1
+        length += 2
+        if ref < 0:
+            raise RDBError('Corrupt LZF data')
+        if ref + length <= len(out):
+            out += out[ref:ref + length]
+        else:  # the copy overlaps its own output
+            for j in range(length):
+                out.append(out[ref + j])
+    return bytes(out[:limit])
+
+
+class Reader:
+    """Cursor over the dump's bytes (an mmap)."""
+
+    def __init__(self, buf, pos=0):
+        self.buf = buf
+        self.pos = pos
+
+    def byte(self):
+        value = self.buf[self.pos]
+        self.pos += 1
+        return value
+
+    def read(self, n):
+        data = self.buf[self.pos:self.pos + n]
+        self.pos += n
+        return data
+
+    def uint(self, n):
+        return int.from_bytes(self.read(n), 'little')
+
+    def length_or_encoding(self):
+        """``(length, False)``, or ``(string encoding, True)`` for a specially encoded string."""
+        first = self.byte()
+        kind = first >> 6
+        if kind == 0:
+            return first & 0x3F, False
+        if kind == 1:
+            return ((first & 0x3F) << 8) | self.byte(), False
+        if first == 0x80:
+            return int.from_bytes(self.read(4), 'big'), False
+        if first == 0x81:
+            return int.from_bytes(self.read(8), 'big'), False
+        if kind == 3:
+            return first & 0x3F, True
+        raise RDBError(f'Bad length byte {first:#x} at {self.pos - 1}')
+
+    def length(self):
+        value, encoded = self.length_or_encoding()
+        if encoded:
+            raise RDBError(f'Expected a length at {self.pos - 1}')
+        return value
+
+    def _int_string(self, encoding):
+        if encoding > 2:
+            raise RDBError(f'Unknown string encoding {encoding} at {self.pos - 1}')
+        return str(int.from_bytes(self.read(1 << encoding), 'little', signed=True)).encode()
+
+    def string(self, limit=None):
+        """A string, or only its first ``limit`` bytes (the rest is skipped either way)."""
+        value, encoded = self.length_or_encoding()
+        if not encoded:
+            data = self.buf[self.pos:self.pos + (value if limit is None else min(value, limit))]
+            self.pos += value
+            return data
+        if value != 3:
+            return self._int_string(value)
+        compressed, size = self.length(), self.length()
+        start = self.pos
+        self.pos += compressed
+        if limit is None:
+            return lzf_decompress(self.buf[start:self.pos], size)
+        # LZF never takes more than ~1 + 1/32 input bytes per output byte
+        end = min(self.pos, start + limit + limit // 16 + 16)
+        return lzf_decompress(self.buf[start:end], min(size, limit))
+
+    def skip_string(self):
+        """Skip a string; returns its length (as STRLEN would report it)."""
+        value, encoded = self.length_or_encoding()
+        if not encoded:
+            self.pos += value
+            return value
+        if value != 3:
+            return len(self._int_string(value))
+        compressed, size = self.length(), self.length()
+        self.pos += compressed
+        return size
+
+
+def _count(raw, per_entry=1):
+    """Element count from a 16-bit header field; None when saturated (too many to store)."""
+    count = int.from_bytes(raw, 'little')
+    return None if count == 0xFFFF else count // per_entry
+
+
+def _blob_count(r, value_type):
+    """Skip a single-blob collection; its element count from the header (None if unknown)."""
+    if value_type == HASH_ZIPMAP:
+        head = r.string(1)
+        return head[0] if head and head[0] < 254 else None
+    if value_type == SET_INTSET:
+        return int.from_bytes(r.string(8)[4:8], 'little')
+    if value_type in (LIST_ZIPLIST, ZSET_ZIPLIST, HASH_ZIPLIST):
+        return _count(r.string(10)[8:10], 1 if value_type == LIST_ZIPLIST else 2)
+    return _count(r.string(6)[4:6], 1 if value_type == SET_LISTPACK else 2)  # listpacks
+
+
+def _sum(counts):
+    return None if None in counts else sum(counts)
+
+
+def _skip_module_opcodes(r):
+    while True:
+        opcode = r.length()
+        if opcode == 0:  # EOF
+            return
+        if opcode in (1, 2):  # signed/unsigned int
+            r.length()
+        elif opcode == 3:  # float
+            r.pos += 4
+        elif opcode == 4:  # double
+            r.pos += 8
+        elif opcode == 5:  # string
+            r.skip_string()
+        else:
+            raise RDBError(f'Unknown module opcode {opcode} at {r.pos}')
+
+
+def _skip_stream(r, value_type):
+    """Skip a stream; returns its length (XLEN)."""
+    for _ in range(r.length()):
+        r.skip_string()  # master entry ID
+        r.skip_string()  # listpack of entries
+    length = r.length()
+    r.length(), r.length()  # last ID
+    if value_type >= STREAM_LISTPACKS_2:
+        r.length(), r.length()  # first ID
+        r.length(), r.length()  # max deleted ID
+        r.length()  # entries added
+    for _ in range(r.length()):  # consumer groups
+        r.skip_string()
+        r.length(), r.length()  # last delivered ID
+        if value_type >= STREAM_LISTPACKS_2:
+            r.length()  # entries read
+        for _ in range(r.length()):  # pending entries
+            r.pos += 16 + 8  # ID, delivery time
+            r.length()  # delivery count
+        for _ in range(r.length()):  # consumers
+            r.skip_string()
+            r.pos += 8 if value_type < STREAM_LISTPACKS_3 else 16  # seen (and active) time
+            pending = r.length()
+            r.pos += 16 * pending  # pending IDs
+    return length
+
+
+def skip_value(r, value_type):
+    """Skip one value; returns its size (STRLEN or element count, None if the dump doesn't say)."""
+    if value_type == STRING:
+        return r.skip_string()
+    if value_type in (LIST, SET, HASH, ZSET, ZSET_2):
+        count = r.length()
+        for _ in range(count):
+            r.skip_string()
+            if value_type == HASH:
+                r.skip_string()
+            elif value_type == ZSET_2:
+                r.pos += 8  # binary double score
+            elif value_type == ZSET:
+                width = r.byte()  # score as text; 253-255 are NaN/+inf/-inf
+                if width < 253:
+                    r.pos += width
+        return count
+    if value_type in (HASH_ZIPMAP, LIST_ZIPLIST, SET_INTSET, ZSET_ZIPLIST, HASH_ZIPLIST,
+                      HASH_LISTPACK, ZSET_LISTPACK, SET_LISTPACK):
+        return _blob_count(r, value_type)
+    if value_type == LIST_QUICKLIST:
+        return _sum([_blob_count(r, LIST_ZIPLIST) for _ in range(r.length())])
+    if value_type == LIST_QUICKLIST_2:
+        counts = []
+        for _ in range(r.length()):
+            if r.length() == QUICKLIST_NODE_PLAIN:
+                r.skip_string()
+                counts.append(1)
+            else:
+                counts.append(_blob_count(r, SET_LISTPACK))
+        return _sum(counts)
+    if value_type in (STREAM_LISTPACKS, STREAM_LISTPACKS_2, STREAM_LISTPACKS_3):
+        return _skip_stream(r, value_type)
+    if value_type == MODULE_2:
+        r.length()  # module ID
+        _skip_module_opcodes(r)
+        return None
+    raise RDBError(f'Unsupported value type {value_type} at {r.pos - 1}')
+
+
+def read_header(buf):
+    """``(RDB version, {aux field: value}, offset of the first record after them)``."""
+    if buf[:5] != b'REDIS':
+        raise RDBError('Not an RDB file')
+    version = int(buf[5:9])
+    r = Reader(buf, 9)
+    aux = {}
+    while r.pos < len(buf) and buf[r.pos] == OP_AUX:
+        r.pos += 1
+        name = r.string().decode('utf-8', 'replace')
+        aux[name] = r.string().decode('utf-8', 'replace')
+    return version, aux, r.pos
+
+
+def iter_entries(buf, start, end, db=0, keys=True):
+    """
+    Yield an ``Entry`` for every key whose record starts in ``[start, end)``;
+    ``db`` is the DB selected at ``start``. Without ``keys`` names aren't
+    read (``key`` is None), which is all chunking needs.
+    """
+    r = Reader(buf, start)
+    expire_ms = offset = None
+    while r.pos < end:
+        if offset is None:
+            offset = r.pos
+        op = r.byte()
+        if op == OP_EOF:
+            return
+        if op == OP_EXPIRETIME_MS:
+            expire_ms = r.uint(8)
+        elif op == OP_EXPIRETIME:
+            expire_ms = r.uint(4) * 1000
+        elif op == OP_FREQ:
+            r.pos += 1
+        elif op == OP_IDLE:
+            r.length()
+        elif op >= OP_SLOT_INFO:
+            if op == OP_SELECTDB:
+                db = r.length()
+            elif op == OP_RESIZEDB:
+                r.length(), r.length()
+            elif op == OP_SLOT_INFO:
+                r.length(), r.length(), r.length()
+            elif op == OP_AUX:
+                r.skip_string(), r.skip_string()
+            elif op == OP_MODULE_AUX:
+                r.length(), r.length(), r.length()  # module ID, "when" opcode, "when"
+                _skip_module_opcodes(r)
+            elif op == OP_FUNCTION2:
+                r.skip_string()
+            else:
+                raise RDBError(f'Unsupported opcode {op:#x} at {r.pos - 1}')
+            offset = None
+        else:
+            if keys:
+                key = r.string()
+            else:
+                key = None
+                r.skip_string()
+            size = skip_value(r, op)
+            yield Entry(offset, db, key, TYPE_NAMES[op], expire_ms, size, r.pos - offset)
+            expire_ms = offset = None
+    if end >= len(buf):
+        raise RDBError('Truncated RDB file (no EOF marker)')
+
+
+def plan_chunks(buf, start, chunk_bytes):
+    """``(start, end, db)`` byte ranges of about ``chunk_bytes`` each, cut at record boundaries."""
+    chunk_start, chunk_db = start, 0
+    for entry in iter_entries(buf, start, len(buf), keys=False):
+        if entry.offset - chunk_start >= chunk_bytes:
+            yield chunk_start, entry.offset, chunk_db
+            chunk_start, chunk_db = entry.offset, entry.db
+    yield chunk_start, len(buf), chunk_db
+
+
+_maps = {}
+
+
+def open_dump(path):
+    """The dump at ``path``, memory-mapped (once per process)."""
+    if path not in _maps:
+        with open(path, 'rb') as f:
+            _maps[path] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return _maps[path]
+
+
+def analyze_chunk(path, start, end, db, options, keys_out=None):
+    """
+    Analyze the keys whose records start in ``[start, end)`` of the dump at
+    ``path``; returns the analyzer state and totals. With ``keys_out`` the
+    key listing is written there as NDJSON.
+    """
+    analyzer = MemoryAnalyzer(delimiter=options['delimiter'], depth=options['depth'],
+                              top_n=options['top_n'], max_prefixes=options['max_prefixes'])
+    totals = {'keys': 0, 'expiring': 0, 'expired': 0, 'bytes': 0, 'types': {}}
+    out = open(keys_out, 'w') if keys_out else None
+    try:
+        for entry in iter_entries(open_dump(path), start, end, db):
+            if options['db'] is not None and entry.db != options['db']:
+                continue
+            ttl = -1
+            if entry.expire_ms is not None:
+                remaining = entry.expire_ms - options['now_ms']
+                if remaining <= 0:  # Redis drops these when it loads the dump
+                    totals['expired'] += 1
+                    continue
+                ttl = remaining // 1000  # ctime is whole seconds: rounding up could exceed the TTL set
+                totals['expiring'] += 1
+            name = entry.key.decode('utf-8', 'backslashreplace')
+            analyzer.add_keys([name])
+            analyzer.add_sample(name, entry.nbytes)
+            totals['keys'] += 1
+            totals['bytes'] += entry.nbytes
+            by_type = totals['types'].setdefault(entry.type, {'keys': 0, 'bytes': 0})
+            by_type['keys'] += 1
+            by_type['bytes'] += entry.nbytes
+            if out is not None:
+                out.write(json.dumps({'name': name, 'db': entry.db, 'type': entry.type, 'ttl': ttl,
+                                      'size': entry.size, 'bytes': entry.nbytes}) + '\n')
+    finally:
+        if out is not None:
+            out.close()
+    return {'state': analyzer.state(), 'totals': totals}
+
+
+def _add_totals(totals, more):
+    for field in ('keys', 'expiring', 'expired', 'bytes'):
+        totals[field] += more[field]
+    for key_type, counts in more['types'].items():
+        by_type = totals['types'].setdefault(key_type, {'keys': 0, 'bytes': 0})
+        by_type['keys'] += counts['keys']
+        by_type['bytes'] += counts['bytes']
+
+
+def analyze_file(path, analyzer, db=None, workers=1, chunk_bytes=64 << 20, keys_out=None, progress=None):
+    """
+    Analyze the dump at ``path`` into ``analyzer`` (``db`` None for every
+    DB); returns ``(header, totals)``. ``progress(totals)`` is called as
+    chunks finish. The key listing goes to ``keys_out``, in dump order.
+    """
+    buf = open_dump(path)
+    version, aux, start = read_header(buf)
+    ctime = int(aux['ctime']) if aux.get('ctime', '').isdigit() else int(os.path.getmtime(path))
+    options = {
+        'delimiter': analyzer.delimiter, 'depth': analyzer.depth, 'top_n': analyzer.top_n,
+        'max_prefixes': analyzer.max_prefixes, 'db': db, 'now_ms': ctime * 1000,
+    }
+    header = {'version': version, 'ctime': ctime, 'redis_version': aux.get('redis-ver', ''),
+              'file_bytes': len(buf)}
+    totals = {'keys': 0, 'expiring': 0, 'expired': 0, 'bytes': 0, 'types': {}}
+    started = time.monotonic()
+    parts = []
+
+    def done(result):
+        analyzer.merge(result['state'])
+        _add_totals(totals, result['totals'])
+        if progress is not None:
+            progress(totals)
+
+    try:
+        if workers <= 1:
+            parts.append(keys_out)
+            done(analyze_chunk(path, start, len(buf), 0, options, keys_out))
+        else:
+            with ProcessPoolExecutor(workers) as pool:
+                futures = []
+                for i, (chunk_start, chunk_end, chunk_db) in enumerate(plan_chunks(buf, start, chunk_bytes)):
+                    part = f'{keys_out}.{i}' if keys_out else None
+                    parts.append(part)
+                    futures.append(pool.submit(analyze_chunk, path, chunk_start, chunk_end, chunk_db, options, part))
+                for future in futures:
+                    done(future.result())
+            if keys_out:
+                with open(keys_out, 'wb') as out:
+                    for part in parts:
+                        with open(part, 'rb') as f:
+                            shutil.copyfileobj(f, out)
+    finally:
+        if workers > 1:
+            for part in parts:
+                if part and os.path.exists(part):
+                    os.remove(part)
+    header['seconds'] = round(time.monotonic() - started, 3)
+    header['chunks'] = len(parts)
+    return header, totals
+
+
+def read_listing(path, cursor=0, count=100, match=None, key_type=None):
+    """
+    One page of an NDJSON key listing: ``(rows, next cursor)``, the cursor
+    being a byte offset ("0" once the end is reached, like SCAN). ``count``
+    bounds the lines read, so a page may hold fewer matches.
+    """
+    rows = []
+    with open(path, 'rb') as f:
+        f.seek(cursor)
+        for _ in range(count):
+            line = f.readline()
+            if not line:
+                return rows, '0'
+            row = json.loads(line)
+            if (match is None or fnmatchcase(row['name'], match)) and key_type in (None, row['type']):
+                rows.append(row)
+        return rows, str(f.tell()) if f.peek(1) else '0'
@@ -0,0 +1,44 @@
+import time
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from .instrumentation import record_serialize
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the stdlib encoder
+    orjson = None
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """``JSONRenderer`` that reports its render time to the request's Server-Timing."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        started = time.perf_counter()
+        try:
+            return super().render(data, accepted_media_type, renderer_context)
+        finally:
+            record_serialize(time.perf_counter() - started)
+
+
+class FastJSONRenderer(TimedJSONRenderer):
+    """
+    ``TimedJSONRenderer`` that encodes with orjson when it is installed,
+    several times faster than ``json`` on big INFO dicts and history pages.
+    Output matches DRF's compact JSON: datetimes as ISO 8601 with ``Z``,
+    and anything orjson doesn't know (Decimal, lazy strings, ...) goes
+    through DRF's encoder. Pretty-printing (``; indent=``) and the
+    browsable API keep the stdlib path.
+    """
+    _default = JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        started = time.perf_counter()
+        try:
+            return orjson.dumps(data, default=self._default,
+                                option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+        finally:
+            record_serialize(time.perf_counter() - started)
@@ -0,0 +1,56 @@
+"""
+History retention.
+
+Pruning runs on its own schedule (``METRICS_PRUNE_INTERVAL``) rather than
+every collector tick, and each table is trimmed with a single
+``DELETE ... WHERE <time column> < cutoff`` on an indexed column: no rows
+are loaded and no signals fire, so the cost is one index range scan no
+matter how much history or how many instances there are.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import (
+    RedisMetric, MetricBlock, MetricRollup, HotKeySnapshot, SlowLogEntry, LatencyEvent, CommandStat
+)
+
+
+def delete_before(model, field, cutoff):
+    """Delete ``model`` rows whose ``field`` is older than ``cutoff``; return the row count."""
+    quote = connection.ops.quote_name
+    column = model._meta.get_field(field).column
+    value = model._meta.get_field(field).get_db_prep_value(cutoff, connection)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote(model._meta.db_table)} WHERE {quote(column)} < %s', [value]
+        )
+        return cursor.rowcount
+
+
+def row_cutoff(now=None):
+    """Per-sample RedisMetric rows older than this are pruned (INFO snapshots excepted)."""
+    return (now or timezone.now()) - timedelta(days=settings.METRICS_ROW_RETENTION_DAYS)
+
+
+def prune(now=None, retention_days=None):
+    """Apply the raw-sample and rollup retention windows; return ``{table: rows deleted}``."""
+    now = now or timezone.now()
+    retention_days = settings.METRICS_RETENTION_DAYS if retention_days is None else retention_days
+    cutoff = now - timedelta(days=retention_days)
+    rollup_cutoff = now - timedelta(days=settings.METRICS_ROLLUP_RETENTION_DAYS)
+    # The blocks hold every sample's fields; rows are only kept for recent
+    # history, except the ones carrying a full INFO snapshot. Nothing
+    # references RedisMetric, so delete() is a single DELETE too.
+    rows, _ = RedisMetric.objects.filter(timestamp__lt=max(row_cutoff(now), cutoff), raw_info={}).delete()
+    return {
+        'metrics': rows + delete_before(RedisMetric, 'timestamp', cutoff),
+        'blocks': delete_before(MetricBlock, 'end', cutoff),
+        'rollups': delete_before(MetricRollup, 'bucket', rollup_cutoff),
+        'hot_keys': delete_before(HotKeySnapshot, 'timestamp', cutoff),
+        'slowlog': delete_before(SlowLogEntry, 'timestamp', cutoff),
+        'latency': delete_before(LatencyEvent, 'timestamp', cutoff),
+        'commandstats': delete_before(CommandStat, 'timestamp', cutoff),
+    }
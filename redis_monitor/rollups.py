@@ -0,0 +1,184 @@
+"""
+Downsampled metric history.
+
+The collector feeds every sample to ``RollupWriter``, which keeps one open
+``MetricRollup`` row per tier (1 minute, 10 minutes, 1 hour) and updates its
+min/max/avg/last in memory, so the rollups cost no extra queries per tick
+beyond the periodic flush. ``history_points()`` picks the finest data that
+still fits in the caller's ``max_points`` over a range; ``HistoryRows``
+pages through every sample, reading the ones whose rows were pruned back
+from the MetricBlock store.
+"""
+import math
+
+from django.conf import settings
+
+from .models import RedisMetric, MetricRollup
+from .retention import row_cutoff
+from .timeseries import BlockSamples, bucket_floor, from_ms, to_ms
+from .utils import calculate_derived_metrics
+
+TIERS = {60: '1m', 600: '10m', 3600: '1h'}
+METRICS = ['memory_used', 'ops_per_sec', 'hit_rate', 'rejected_connections']
+AGGREGATES = ('avg', 'min', 'max', 'last')
+# Registry fields the METRICS are computed from (see block_metric_values)
+BLOCK_FIELDS = ['used_memory', 'instantaneous_ops_per_sec', 'keyspace_hits', 'keyspace_misses', 'rejected_connections']
+
+
+def add_sample(row, values):
+    """Fold one sample (``{metric: value}``) into a rollup row."""
+    row.count += 1
+    for metric in METRICS:
+        value = values.get(metric)
+        if value is None:
+            continue
+        current_min = getattr(row, f'{metric}_min')
+        current_max = getattr(row, f'{metric}_max')
+        current_avg = getattr(row, f'{metric}_avg')
+        count = getattr(row, f'{metric}_count') + 1  # samples that had this metric
+        setattr(row, f'{metric}_count', count)
+        setattr(row, f'{metric}_min', value if current_min is None else min(current_min, value))
+        setattr(row, f'{metric}_max', value if current_max is None else max(current_max, value))
+        setattr(row, f'{metric}_avg', value if current_avg is None else current_avg + (value - current_avg) / count)
+        setattr(row, f'{metric}_last', value)
+
+
+class RollupWriter:
+    """Keeps the current bucket of every tier in memory; ``flush()`` saves them."""
+
+    def __init__(self, instance=None, tiers=None):
+        self.instance = instance
+        self.tiers = tiers or sorted(TIERS)
+        self.open = {}
+        self.dirty = set()
+
+    def add(self, when, values):
+        for tier in self.tiers:
+            start = bucket_floor(when, tier)
+            row = self.open.get(tier)
+            if row is None or row.bucket != start:
+                if tier in self.dirty:
+                    row.save()
+                    self.dirty.discard(tier)
+                row = MetricRollup.objects.filter(instance=self.instance, tier=tier, bucket=start).first()
+                if row is None:
+                    row = MetricRollup(instance=self.instance, tier=tier, bucket=start)
+                self.open[tier] = row
+            add_sample(row, values)
+            self.dirty.add(tier)
+
+    def flush(self):
+        for tier in self.dirty:
+            self.open[tier].save()
+        self.dirty.clear()
+
+
+def metric_values(metric):
+    return {name: getattr(metric, name) for name in METRICS}
+
+
+def block_metric_values(values):
+    """The METRICS of one sample read back from the blocks (``{BLOCK_FIELDS field: value}``)."""
+    memory = values['used_memory']
+    return {
+        'memory_used': float(memory) if memory is not None else None,
+        'ops_per_sec': values['instantaneous_ops_per_sec'],
+        'hit_rate': calculate_derived_metrics({'keyspace_hits': values['keyspace_hits'] or 0,
+                                               'keyspace_misses': values['keyspace_misses'] or 0})['hit_rate'],
+        'rejected_connections': values['rejected_connections'],
+    }
+
+
+def pick_tier(start, end, max_points):
+    """Return None for raw samples, or the rollup tier (seconds) to serve ``[start, end]`` with."""
+    per_point = (end - start).total_seconds() / max(max_points, 1)
+    if per_point <= settings.METRICS_COLLECTION_INTERVAL:
+        return None
+    for tier in sorted(TIERS):
+        if tier >= per_point:
+            return tier
+    return max(TIERS)
+
+
+def _merge(rows, agg):
+    """Collapse consecutive rollup rows into one point."""
+    point = {'timestamp': rows[0].bucket}
+    for metric in METRICS:
+        values = [(getattr(row, f'{metric}_count'), getattr(row, f'{metric}_{agg}')) for row in rows]
+        values = [(count, value) for count, value in values if value is not None]
+        total = sum(count for count, _ in values) or 1
+        if not values:
+            point[metric] = None
+        elif agg == 'min':
+            point[metric] = min(value for _, value in values)
+        elif agg == 'max':
+            point[metric] = max(value for _, value in values)
+        elif agg == 'last':
+            point[metric] = values[-1][1]
+        else:
+            point[metric] = sum(count * value for count, value in values) / total
+    return point
+
+
+def history_points(instance, start, end, max_points, agg='avg'):
+    """
+    Return ``(tier_label, points)`` with at most ``max_points`` of
+    ``instance``'s points for ``[start, end]``: raw samples when they fit,
+    otherwise the finest rollup tier that does (adjacent buckets are merged
+    if even 1h is too fine). If there turn out to be more raw samples than
+    the interval suggested, the 1m tier is used rather than cutting the
+    range short.
+    """
+    tier = pick_tier(start, end, max_points)
+    if tier is None and start < row_cutoff():
+        tier = min(TIERS)  # per-sample rows are pruned sooner than the rollups
+    if tier is None:
+        rows = RedisMetric.objects.filter(
+            instance=instance, timestamp__gte=start, timestamp__lte=end
+        ).order_by('timestamp')
+        points = list(rows.values('timestamp', *METRICS)[:max_points + 1])
+        if len(points) <= max_points:
+            return 'raw', points
+        tier = min(TIERS)
+    rows = list(MetricRollup.objects.filter(
+        instance=instance, tier=tier, bucket__gte=bucket_floor(start, tier), bucket__lte=end
+    ))
+    step = max(1, math.ceil(len(rows) / max(max_points, 1)))
+    return TIERS[tier], [_merge(rows[i:i + step], agg) for i in range(0, len(rows), step)]
+
+
+class HistoryRows:
+    """
+    ``values_list(*fields)`` tuples of the RedisMetric ``rows`` queryset
+    (newest first) for ``[start, end]``, continued past ``row_cutoff()``
+    with the samples kept in the MetricBlock store, so pagination reaches
+    back over the full METRICS_RETENTION_DAYS although the rows are pruned
+    sooner.
+    """
+
+    def __init__(self, instance, rows, fields, start=None, end=None):
+        cutoff = from_ms(to_ms(row_cutoff()))  # whole ms, like the block timestamps
+        self.fields = fields
+        self.recent = rows.filter(timestamp__gte=cutoff).values_list(*fields)
+        self.recent_count = self.recent.count()
+        self.older = []
+        if start is None or start < cutoff:
+            older_end = cutoff if end is None else min(cutoff, from_ms(to_ms(end) + 1))
+            self.older = BlockSamples(instance, start, older_end, BLOCK_FIELDS)
+
+    def _row(self, timestamp, values):
+        values = {'timestamp': timestamp, **block_metric_values(values)}
+        return tuple(values[field] for field in self.fields)
+
+    def __len__(self):
+        return self.recent_count + len(self.older)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        low, high, _ = index.indices(len(self))
+        items = list(self.recent[low:min(high, self.recent_count)]) if low < self.recent_count else []
+        if high > self.recent_count:
+            older = self.older[max(low - self.recent_count, 0):high - self.recent_count]
+            items += [self._row(timestamp, values) for timestamp, values in older]
+        return items
@@ -1,5 +1,21 @@
 from rest_framework import serializers
-from .models import RedisMetric
+from .models import (
+    RedisInstance, RedisMetric, MemoryReport, BulkJob, HotKeySnapshot, SlowLogEntry, LatencyEvent, AlertRule,
+    Alert
+)
+from .pool import redact_url
+from .analyzer import MemoryAnalyzer
+
+class RedisInstanceSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RedisInstance
+        fields = ['id', 'name', 'url', 'mode', 'read_from_replicas', 'parent', 'enabled', 'created_at']
+        read_only_fields = ['parent']
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data['url'] = redact_url(instance.redis_url)
+        return data
 
 class RedisMetricSerializer(serializers.ModelSerializer):
     class Meta:
@@ -14,12 +30,85 @@ class ValueSerializer(serializers.Serializer):
     key = serializers.CharField()
     type = serializers.CharField()
     ttl = serializers.IntegerField()
-    value = serializers.Field()  # Can be str, dict, list, etc.
-
-class MetricsSerializer(serializers.Serializer):
-    info = serializers.DictField()
-    derived = serializers.DictField()
+    encoding = serializers.CharField()  # OBJECT ENCODING, e.g. listpack, hashtable
+    size = serializers.IntegerField()  # STRLEN/HLEN/SCARD/ZCARD/LLEN/XLEN
+    value = serializers.JSONField()  # Can be str, dict, list, etc.
+    next_cursor = serializers.CharField()  # "0" once the last page has been returned
 
 class StatusSerializer(serializers.Serializer):
     redis_reachable = serializers.BooleanField()
-    last_metric = serializers.DateTimeField(allow_null=True)
\ No newline at end of file
+    last_metric = serializers.DateTimeField(allow_null=True)
+
+class MemoryReportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MemoryReport
+        fields = [
+            'id', 'status', 'source', 'source_path', 'snapshot_at', 'started_at', 'updated_at', 'finished_at',
+            'delimiter', 'depth', 'sample_rate', 'keys_scanned', 'keys_sampled', 'error'
+        ]
+
+class MemoryReportDetailSerializer(MemoryReportSerializer):
+    summary = serializers.SerializerMethodField()
+
+    class Meta(MemoryReportSerializer.Meta):
+        fields = MemoryReportSerializer.Meta.fields + ['key_types', 'summary']
+
+    def get_summary(self, obj):
+        return MemoryAnalyzer(delimiter=obj.delimiter, depth=obj.depth, state=obj.state).summary()
+
+class BulkJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BulkJob
+        fields = [
+            'id', 'operation', 'status', 'match', 'ttl', 'rate', 'batch_size', 'total', 'scanned',
+            'affected', 'failed', 'error', 'started_at', 'updated_at', 'finished_at'
+        ]
+
+class HotKeySnapshotSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = HotKeySnapshot
+        fields = [
+            'id', 'instance', 'timestamp', 'window_seconds', 'events', 'event_counts', 'keys',
+            'prefixes', 'hot_keys', 'live', 'lfu'
+        ]
+
+class SlowLogEntrySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SlowLogEntry
+        fields = [
+            'instance', 'entry_id', 'timestamp', 'duration_us', 'command', 'command_line',
+            'client_address', 'client_name'
+        ]
+
+class LatencyEventSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = LatencyEvent
+        fields = ['instance', 'event', 'timestamp', 'latency_ms']
+
+class AlertRuleSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AlertRule
+        fields = [
+            'id', 'name', 'instance', 'metric', 'kind', 'direction', 'threshold', 'window', 'for_samples',
+            'webhook_url', 'enabled', 'created_at', 'updated_at'
+        ]
+
+    def validate(self, attrs):
+        kind = attrs.get('kind', getattr(self.instance, 'kind', 'threshold'))
+        window = attrs.get('window', getattr(self.instance, 'window', 60))
+        if kind in ('zscore', 'ewma') and window < 2:
+            raise serializers.ValidationError({'window': 'z-score rules need a window of at least 2 samples'})
+        if attrs.get('for_samples', 1) < 1:
+            raise serializers.ValidationError({'for_samples': 'Must be at least 1'})
+        return attrs
+
+class AlertSerializer(serializers.ModelSerializer):
+    rule_name = serializers.CharField(source='rule.name', read_only=True)
+    metric = serializers.CharField(source='rule.metric', read_only=True)
+
+    class Meta:
+        model = Alert
+        fields = [
+            'id', 'rule', 'rule_name', 'instance', 'metric', 'state', 'started_at', 'resolved_at', 'value',
+            'score', 'peak_score', 'message'
+        ]
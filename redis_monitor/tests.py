@@ -1,18 +1,24 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 from rest_framework.test import APITestCase, APIRequestFactory
 from rest_framework import status
 from django.core.management import call_command
 from django.conf import settings
-from .models import RedisMetric
-from .views import KeyViewSet, ValueViewSet, MetricViewSet, StatusViewSet
+from .models import RedisInstance, RedisMetric
+from .infocache import info_cache
+from .views import KeyViewSet, ValueViewSet, CurrentMetricViewSet, StatusViewSet
 import redis
 from datetime import timedelta
+import json
+import os
+import importlib.util
+import unittest
 from django.utils import timezone
 
 class RedisMonitorTests(APITestCase):
     def setUp(self):
         self.redis = redis.from_url(settings.REDIS_URL, decode_responses=True)
         self.redis.flushdb()  # Clear for tests
+        info_cache.clear()
         self.redis.set('test_string', 'value')
         self.redis.hset('test_hash', mapping={'field': 'val'})
         self.redis.lpush('test_list', 'item1', 'item2')
@@ -26,6 +32,9 @@ class RedisMonitorTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('keys', response.data)
         self.assertIn('next_cursor', response.data)
+        self.assertEqual(response.data['count'], 10)
+        capped = self.client.get('/api/keys/?count=1000000').data['count']
+        self.assertLessEqual(capped, settings.SCAN_COUNT_MAX)
 
     def test_values_endpoint_types_strings_hashes_lists_sets_zsets(self):
         for key, typ in [
@@ -61,4 +70,703 @@ class RedisMonitorTests(APITestCase):
         settings.REDIS_URL = 'redis://invalid:9999'  # Invalid
         response = self.client.get('/api/metrics/')
         self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
-        settings.REDIS_URL = original_url  # Restore
\ No newline at end of file
+        settings.REDIS_URL = original_url  # Restore
+
+    def test_connection_pool_is_shared_and_reports_stats(self):
+        from .utils import get_redis_connection
+        self.assertIs(get_redis_connection().connection_pool, get_redis_connection().connection_pool)
+        self.client.get('/api/keys/?cursor=0&count=10')
+        response = self.client.get('/api/status/pools/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        stats = response.data['pools'][settings.REDIS_URL]
+        self.assertGreaterEqual(stats['acquired'], 1)
+        self.assertEqual(stats['in_use'], 0)
+        from .pool import StatsConnectionPool
+        dead = StatsConnectionPool.from_url('redis://127.0.0.1:1', socket_connect_timeout=0.1)
+        with self.assertRaises(redis.ConnectionError):
+            dead.get_connection()
+        self.assertEqual(dead.stats()['acquired'], 0)  # failed checkouts aren't counted
+
+    def test_async_endpoints_match_sync_shape(self):
+        response = self.client.get('/api/async/keys/?cursor=0&count=10')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.json()), {'keys', 'next_cursor'})
+        response = self.client.get('/api/async/values/test_hash/')
+        self.assertEqual(response.json()['value'], {'field': 'val'})
+        response = self.client.get('/api/async/metrics/')
+        self.assertIn('hit_rate', response.json()['derived'])
+
+    def test_key_index_substring_prefix_and_glob_search(self):
+        from .keyindex import KeyIndex, search_pattern
+        index = KeyIndex()
+        index.begin_rebuild()
+        index.add_built(['user:1:session', 'user:2:profile', 'order:1', 'a*b'])
+        index.finish_rebuild(live=True)
+        self.assertEqual(index.search(search_pattern('session'), 10), ['user:1:session'])
+        self.assertEqual(index.search(search_pattern('user:', 'prefix'), 10), ['user:1:session', 'user:2:profile'])
+        self.assertEqual(index.search(search_pattern('*:[12]', 'glob'), 10), ['order:1'])
+        self.assertEqual(index.search(search_pattern('a*b'), 10), ['a*b'])
+        index.on_event({'channel': '__keyevent@0__:del', 'data': 'order:1'})
+        index.on_event({'channel': '__keyevent@0__:set', 'data': 'order:2'})
+        self.assertEqual(index.search(search_pattern('order', 'prefix'), 10), ['order:2'])
+        self.assertEqual(index.freshness()['stale_seconds'], 0.0)
+        for i in range(12000):
+            index.add(f'tmp:{i}')
+        index.compact()  # the worker thread folds the changes into new front-coded blocks
+        self.assertEqual((index._data.base.count, len(index._data.added)), (12004, 0))
+        for i in range(11000):
+            index.remove(f'tmp:{i}')
+        self.assertEqual(len(index._data.deleted), 11000)
+        index.compact()
+        self.assertEqual((index._data.base.count, len(index), len(index._data.deleted)), (1004, 1004, 0))
+        self.assertEqual(index.search(search_pattern('tmp:11999', 'prefix'), 10), ['tmp:11999'])
+        self.assertEqual(index.search(search_pattern('tmp:1', 'prefix'), 3), ['tmp:11000', 'tmp:11001', 'tmp:11002'])
+        index.begin_rebuild()
+        index.remove('order:2')  # deleted while the rebuild scans...
+        index.add_built(['order:2', 'order:3'])  # ...and then seen in a stale SCAN reply
+        index.finish_rebuild(live=True)
+        self.assertEqual(index.search(search_pattern('order', 'prefix'), 10), ['order:3'])
+        index.clear()  # FLUSHDB
+        self.assertEqual((len(index), index.search('*', 10)), (0, []))
+
+    def test_key_tree_pages_children_and_bounds_nodes(self):
+        from .keytree import KeyTree
+        tree = KeyTree(max_children=3)
+        for i in range(5):
+            tree.add(f'user:{i}:session', size=100)
+        tree.add('order:1', size=50)
+        tree.add('plain')
+        stats, children, cursor = tree.page('')
+        self.assertEqual(stats['keys'], 7)
+        self.assertEqual([(row['name'], row['keys']) for row in children], [('order', 1), ('user', 5)])
+        self.assertIsNone(cursor)
+        _, first, cursor = tree.page('user', count=2)
+        self.assertEqual([row['name'] for row in first], ['(other)', '0'])
+        _, rest, cursor = tree.page('user', cursor=cursor, count=2)
+        self.assertEqual([(row['name'], row['match']) for row in rest], [('1', 'user:1:*'), ('2', 'user:2:*')])
+        self.assertIsNone(cursor)
+        self.assertEqual(first[0]['keys'], 2)  # user:3 and user:4 past max_children
+        self.assertEqual(tree.page('user')[0]['bytes'], 500)
+        self.assertIsNone(tree.page('nope'))
+
+    def test_key_tree_endpoint(self):
+        import time
+        for i in range(10):
+            self.redis.set(f'tree:{i % 2}:{i}', 'x')
+        with self.settings(KEY_TREE_SAMPLE_RATE=1, KEY_TREE_REFRESH_INTERVAL=0):
+            deadline = time.monotonic() + 10
+            while True:
+                response = self.client.get('/api/keys/tree/?prefix=tree')
+                if response.status_code == 200 and response.data['keys'] == 10 or time.monotonic() > deadline:
+                    break
+                time.sleep(0.05)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([(row['name'], row['keys']) for row in response.data['children']], [('0', 5), ('1', 5)])
+        self.assertGreater(response.data['bytes'], 0)
+        response = self.client.get('/api/keys/tree/?prefix=tree&count=-5')
+        self.assertEqual(([row['name'] for row in response.data['children']], response.data['next_cursor']), (['0'], '0'))
+        response = self.client.get('/api/keys/tree/?delimiter=x')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get('/api/keys/tree/?count=abc').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_walkers_are_listed_and_cancellable(self):
+        from .walker import KeyspaceWalker
+        walker = KeyspaceWalker(self.redis, count=2, rate=0, label='test walk')
+        batches = walker.batches()
+        next(batches)
+        listed = self.client.get('/api/keys/walkers/').data
+        self.assertIn(('test walk', walker.scanned), [(row['label'], row['scanned']) for row in listed])
+        response = self.client.post(f'/api/keys/walkers/{walker.id}/cancel/')
+        self.assertTrue(response.data['cancelled'])
+        self.assertEqual(list(batches), [])
+        self.assertFalse(walker.done)
+        self.assertEqual(self.client.post(f'/api/keys/walkers/{walker.id}/cancel/').status_code, 404)
+
+    def test_scan_governor_backs_off_on_latency_spikes(self):
+        from .walker import ScanGovernor
+        threshold = self.redis.config_get('latency-monitor-threshold')['latency-monitor-threshold']
+        self.redis.execute_command('LATENCY', 'RESET')
+        self.redis.config_set('latency-monitor-threshold', 5)
+        try:
+            with self.settings(SCAN_LOAD_CHECK_INTERVAL=0, SCAN_BUSY_LATENCY_MS=5):
+                governor = ScanGovernor()
+                governor.check(self.redis)
+                self.assertEqual((governor.share, governor.busy), (1.0, ''))
+                try:
+                    self.redis.execute_command('DEBUG', 'SLEEP', 0.02)
+                except redis.ResponseError:
+                    self.skipTest('DEBUG is disabled on this server')
+                count = governor.count
+                governor.check(self.redis)
+                self.assertEqual(governor.share, 0.5)
+                self.assertIn('command latency', governor.busy)
+                self.assertEqual(governor.count, count // 2)
+                governor.check(self.redis)  # the same spike isn't counted twice
+                self.assertEqual(governor.share, 0.6)
+        finally:
+            self.redis.config_set('latency-monitor-threshold', threshold)
+
+    def test_keys_export_streams_ndjson(self):
+        response = self.client.get('/api/keys/export/?match=test_*&count=2&memory=1&rate=0')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual({row['name'] for row in rows}, {
+            'test_string', 'test_hash', 'test_list', 'test_set', 'test_zset', 'test_stream'
+        })
+        self.assertTrue(all(row['memory'] > 0 for row in rows))
+        for query in ('count=abc', 'count=0', 'rate=-1'):
+            self.assertEqual(self.client.get(f'/api/keys/export/?{query}').status_code, 400)
+
+    def test_values_are_paged_with_total_size(self):
+        self.redis.sadd('big_set', *range(250))
+        self.redis.rpush('big_list', *range(250))
+        for i in range(5):
+            self.redis.xadd('big_stream', {'i': i})
+        for key, size in [('big_set', 250), ('big_list', 250)]:
+            seen, cursor = [], '0'
+            while True:
+                data = self.client.get(f'/api/values/{key}/?cursor={cursor}&count=100').data
+                self.assertEqual(data['size'], size)
+                seen.extend(data['value'])
+                cursor = data['next_cursor']
+                if cursor == '0':
+                    break
+            self.assertEqual(sorted(map(int, seen)), list(range(250)))
+        first = self.client.get('/api/values/big_stream/?count=3').data
+        self.assertEqual(len(first['value']), 3)
+        rest = self.client.get(f"/api/values/big_stream/?count=3&cursor={first['next_cursor']}").data
+        self.assertEqual(len(rest['value']), 2)
+        self.assertEqual(rest['next_cursor'], '0')
+        with self.settings(KEY_VALUE_MAX_COUNT=50):
+            capped = self.client.get('/api/values/big_list/?count=10000000').data
+        self.assertEqual((len(capped['value']), capped['next_cursor']), (50, '50'))
+        for url in ('/api/values/big_list/?count=abc', '/api/keys/big_list/?count=abc',
+                    '/api/async/values/big_list/?count=abc', '/api/async/keys/?count=abc',
+                    '/api/async/keys/?count=0', '/api/values/big_list/?cursor=5-1', '/api/keys/big_set/?cursor=5-1',
+                    '/api/async/values/big_list/?cursor=5-1'):
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_analyze_memory_stores_prefix_report(self):
+        for i in range(20):
+            self.redis.set(f'user:{i}', 'x' * 100)
+        call_command('analyze_memory', rate=0)
+        response = self.client.get('/api/memory/reports/latest/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        summary = response.data['summary']
+        user = next(row for row in summary['prefixes'] if row['prefix'] == 'user')
+        self.assertEqual(user['keys'], 20)
+        self.assertEqual(user['bytes_ci95'], 0)  # full scan, exact
+        self.assertEqual(len(summary['top_keys']), 26)
+
+    def test_analyze_rdb_offline_report_and_key_listing(self):
+        import tempfile
+        for i in range(30):
+            self.redis.set(f'user:{i}', 'x' * 100, ex=3600 if i % 2 else None)
+        self.redis.save()
+        config = self.redis.config_get('dir')
+        path = os.path.join(config['dir'], self.redis.config_get('dbfilename')['dbfilename'])
+        if not os.path.exists(path):
+            self.skipTest('Redis dump file is not on this machine')
+        db = self.redis.connection_pool.connection_kwargs.get('db', 0)
+        with tempfile.TemporaryDirectory() as tmp:
+            keys_out = os.path.join(tmp, 'keys.ndjson')
+            # chunk-mb 0: a chunk per key, to exercise the split and merge
+            call_command('analyze_rdb', path, db=db, workers=2, chunk_mb=0, keys_out=keys_out)
+            report = self.client.get('/api/memory/reports/latest/').data
+            self.assertEqual(report['source'], 'rdb')
+            self.assertEqual(report['keys_scanned'], self.redis.dbsize())
+            self.assertEqual(report['key_types']['stream']['keys'], 1)
+            user = next(row for row in report['summary']['prefixes'] if row['prefix'] == 'user')
+            self.assertEqual(user['keys'], 30)
+
+            listing = self.client.get(f"/api/memory/reports/{report['id']}/keys/?match=user:*&count=1000").data
+            self.assertEqual(listing['next_cursor'], '0')
+            self.assertEqual(len(listing['keys']), 30)
+            row = next(row for row in listing['keys'] if row['name'] == 'user:1')
+            self.assertEqual((row['type'], row['size']), ('string', 100))
+            self.assertTrue(0 < row['ttl'] <= 3600)
+
+    def test_memory_analyzer_sampling_estimate(self):
+        from .analyzer import MemoryAnalyzer
+        analyzer = MemoryAnalyzer(sample_rate=0.5)
+        keys = [f'session:{i}' for i in range(1000)]
+        sample = analyzer.add_keys(keys)
+        for key in sample:
+            analyzer.add_sample(key, 100 + int(key.split(':')[1]) % 10)
+        row = analyzer.summary()['prefixes'][0]
+        self.assertEqual(row['keys'], 1000)
+        self.assertLess(abs(row['bytes'] - 104500), row['bytes_ci95'] * 2)
+
+    def test_collector_stores_columnar_series_and_raw_info_on_change(self):
+        call_command('collect_metrics')
+        call_command('collect_metrics')
+        self.assertEqual(RedisMetric.objects.exclude(raw_info={}).count(), 1)
+        response = self.client.get('/api/metrics/history/series/?fields=used_memory,keyspace_hits,total_keys')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['timestamp']), 2)
+        self.assertEqual(response.data['total_keys'], [6, 6])
+        response = self.client.get('/api/metrics/history/series/?fields=nope')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_history_max_points_uses_rollup_tiers(self):
+        from .rollups import RollupWriter
+        from .timeseries import bucket_floor
+        writer = RollupWriter(RedisInstance.get_default())
+        end = timezone.now()
+        start = bucket_floor(end - timedelta(days=7), 3600)
+        for i in range(7 * 24 * 2):  # one sample every 30 minutes for a week
+            writer.add(start + timedelta(minutes=30 * i), {'memory_used': float(i), 'ops_per_sec': 1,
+                                                         'hit_rate': None if i % 2 else 0.5,
+                                                         'rejected_connections': i})
+        writer.flush()
+        params = f'start={start.isoformat()}&end={end.isoformat()}'.replace('+', '%2B')
+        response = self.client.get(f'/api/metrics/history/?{params}&max_points=200')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['tier'], '1h')
+        self.assertLessEqual(len(response.data['results']), 200)
+        self.assertEqual(response.data['results'][0]['hit_rate'], 0.5)  # averaged over the samples that had it
+        response = self.client.get(f'/api/metrics/history/?{params}&max_points=200&agg=max')
+        self.assertEqual(response.data['results'][0]['memory_used'], 1.0)
+        # More raw samples than the collection interval implies: rollups, not a truncated range.
+        recent = timezone.now() - timedelta(seconds=20)
+        RedisMetric.objects.bulk_create([RedisMetric(instance=RedisInstance.get_default(),
+                                                     timestamp=recent + timedelta(seconds=i)) for i in range(20)])
+        params = f'start={recent.isoformat()}&end={(recent + timedelta(seconds=30)).isoformat()}'.replace('+', '%2B')
+        response = self.client.get(f'/api/metrics/history/?{params}&max_points=10')
+        self.assertEqual(response.data['tier'], '1m')
+
+    def test_collector_polls_every_instance_and_api_is_scoped(self):
+        RedisInstance.get_default()
+        RedisInstance.objects.create(name='replica', url=settings.REDIS_URL)
+        RedisInstance.objects.create(name='down', url='redis://127.0.0.1:1/0')
+        call_command('collect_metrics')
+        self.assertEqual(RedisMetric.objects.filter(instance__name='default').count(), 1)
+        self.assertEqual(RedisMetric.objects.filter(instance__name='replica').count(), 1)
+        self.assertFalse(RedisMetric.objects.filter(instance__name='down').exists())
+        response = self.client.get('/api/metrics/history/series/?instance=replica&fields=total_keys')
+        self.assertEqual(response.data['total_keys'], [6])
+        response = self.client.get('/api/keys/total/?instance=unknown')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_prune_deletes_only_rows_past_retention(self):
+        from .models import MetricRollup
+        from .retention import prune
+        instance = RedisInstance.get_default()
+        old = timezone.now() - timedelta(days=settings.METRICS_RETENTION_DAYS + 1)
+        recent = timezone.now() - timedelta(days=settings.METRICS_ROW_RETENTION_DAYS, hours=1)
+        RedisMetric.objects.bulk_create([
+            RedisMetric(instance=instance, timestamp=old),
+            RedisMetric(instance=instance, timestamp=recent),
+            RedisMetric(instance=instance, timestamp=recent, raw_info={'redis_version': '6.2'}),
+            RedisMetric(instance=instance, timestamp=timezone.now()),
+        ])
+        MetricRollup.objects.create(instance=instance, tier=60, bucket=old)
+        deleted = prune()
+        self.assertEqual(deleted['metrics'], 2)
+        self.assertEqual(deleted['rollups'], 0)  # still inside the rollup retention
+        self.assertEqual(RedisMetric.objects.count(), 2)  # the INFO snapshot stays for METRICS_RETENTION_DAYS
+
+    def test_history_pages_reach_past_the_row_retention(self):
+        from .retention import prune
+        from .timeseries import BlockWriter
+        instance = RedisInstance.get_default()
+        now = timezone.now()
+        stamps = [now - timedelta(days=3, minutes=150 - i) for i in range(150)]  # rows pruned, blocks kept
+        stamps += [now - timedelta(minutes=30 - i) for i in range(30)]
+        writer = BlockWriter(instance)
+        for i, when in enumerate(stamps):
+            writer.add(when, {'used_memory': i, 'keyspace_hits': 3, 'keyspace_misses': 1})
+        writer.flush()
+        RedisMetric.objects.bulk_create([
+            RedisMetric(instance=instance, timestamp=when, memory_used=i, hit_rate=0.75)
+            for i, when in enumerate(stamps)
+        ])
+        prune()
+        self.assertEqual(RedisMetric.objects.count(), 30)
+        params = {'start': (now - timedelta(days=4)).isoformat()}
+        first = self.client.get('/api/metrics/history/', params).data
+        second = self.client.get('/api/metrics/history/', {**params, 'page': 2}).data
+        self.assertEqual(first['count'], 180)
+        rows = first['results'] + second['results']
+        self.assertEqual([row['memory_used'] for row in rows], [float(i) for i in range(179, -1, -1)])
+        self.assertEqual({row['hit_rate'] for row in rows}, {0.75})
+        self.assertEqual(rows[-1]['timestamp'].replace(microsecond=0), stamps[0].replace(microsecond=0))
+
+    def test_info_cache_coalesces_concurrent_misses(self):
+        import threading
+        import time
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'used_memory': 1}
+
+        threads = [threading.Thread(target=info_cache.get_or_call, args=('info:test', fetch)) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(info_cache.get_or_call('info:test', fetch), {'used_memory': 1})
+        self.client.get('/api/metrics/')
+        self.client.get('/api/metrics/')
+        stats = self.client.get('/api/status/cache/').data['cache']
+        self.assertEqual((stats['misses'], stats['coalesced'], stats['hits']), (2, 4, 2))
+
+        import asyncio
+
+        async def afetch():
+            calls.append(1)
+            await asyncio.sleep(0.2)
+            return {'used_memory': 2}
+
+        async def concurrent_misses():
+            return await asyncio.gather(*[info_cache.aget_or_call('info:async', afetch) for _ in range(5)])
+
+        self.assertEqual(asyncio.run(concurrent_misses()), [{'used_memory': 2}] * 5)
+        self.assertEqual(len(calls), 2)
+
+    def test_live_broadcaster_fans_out_and_drops_slow_consumers(self):
+        import asyncio
+        from .live import DROPPED, Broadcaster
+        instance = RedisInstance.get_default()
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(settings.LIVE_CHANNEL)
+        call_command('collect_metrics')  # no LIVE_PUBSUB_URL: nothing is published to the monitored server
+        message = None
+        for _ in range(3):  # the first reads consume the subscribe confirmation
+            message = message or pubsub.get_message(timeout=0.2)
+        self.assertIsNone(message)
+        self.assertEqual(self.client.get('/api/async/metrics/live/').status_code, 501)
+        with self.settings(LIVE_PUBSUB_URL=settings.REDIS_URL):
+            call_command('collect_metrics')
+        for _ in range(5):
+            message = message or pubsub.get_message(timeout=0.2)
+        pubsub.close()
+        self.assertEqual(json.loads(message['data'])['name'], 'default')
+
+        async def scenario():
+            broadcaster = Broadcaster(settings.REDIS_URL)
+            broadcaster.run = lambda: asyncio.sleep(0)  # fan_out is driven by hand below
+            fast = broadcaster.subscribe(instance.id)
+            slow = broadcaster.subscribe(instance.id)
+            other = broadcaster.subscribe(instance.id + 1)
+            for _ in range(settings.LIVE_QUEUE_SIZE + 1):
+                broadcaster.fan_out(message['data'])
+                await fast.queue.get()
+            self.assertEqual(slow.queue.get_nowait(), DROPPED)
+            self.assertTrue(other.queue.empty())
+            self.assertEqual(broadcaster.stats()['dropped'], 1)
+
+        asyncio.run(scenario())
+
+    def test_requests_report_redis_work_in_server_timing_and_metrics(self):
+        response = self.client.get('/api/keys/?count=100')
+        timing = response['Server-Timing']
+        self.assertIn('redis;dur=', timing)
+        self.assertIn('2 round trips', timing)  # SCAN + one pipeline
+        self.assertIn('serialize;dur=', timing)
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('redilens_request_redis_commands_count{endpoint="keys-list"}', body)
+        self.assertIn('redilens_redis_command_duration_seconds_bucket{command="SCAN",le="+Inf"}', body)
+
+    @unittest.skipUnless(os.environ.get('REDIS_CLUSTER_URL'), 'set REDIS_CLUSTER_URL to a local test cluster')
+    def test_cluster_instance_scans_all_shards_and_collects_per_node(self):
+        from .cluster import get_cluster_connection
+        url = os.environ['REDIS_CLUSTER_URL']
+        cluster = get_cluster_connection(url)
+        cluster.flushall(target_nodes=cluster.PRIMARIES)
+        for i in range(300):
+            cluster.set(f'ck:{i}', i)
+        RedisInstance.objects.create(name='cl', url=url, mode=RedisInstance.MODE_CLUSTER, read_from_replicas=True)
+        self.assertEqual(self.client.get('/api/keys/total/?instance=cl').data['total_keys'], 300)
+        seen, cursor = [], '0'
+        while True:
+            data = self.client.get(f'/api/keys/?instance=cl&count=50&cursor={cursor}').data
+            seen += [row['name'] for row in data['keys']]
+            cursor = data['next_cursor']
+            if cursor == '0':
+                break
+        self.assertEqual(len(set(seen)), 300)
+        self.assertEqual(self.client.get('/api/keys/?instance=cl&cursor=bogus').status_code, 400)
+        # analyze_memory checkpoints the composite cursor and resumes the walk from it
+        from .models import MemoryReport
+        from .utils import get_instance_connection
+        cursor, keys = get_instance_connection(RedisInstance.objects.get(name='cl')).scan(cursor=0, count=20)
+        self.assertGreater(len(cursor), 32)
+        self.assertLessEqual(len(cursor), MemoryReport._meta.get_field('cursor').max_length)
+        report = MemoryReport.objects.create(instance=RedisInstance.objects.get(name='cl'), cursor=cursor,
+                                             keys_scanned=len(keys))
+        call_command('analyze_memory', instance='cl', resume=str(report.id), rate=0)
+        report.refresh_from_db()
+        self.assertEqual((report.status, report.keys_scanned), (MemoryReport.STATUS_DONE, 300))
+        self.assertEqual(report.state['prefixes']['ck'][0], 300 - len(keys))  # only the keys after the checkpoint
+        self.assertEqual(self.client.get('/api/values/ck:7/?instance=cl').data['value'], '7')
+        call_command('collect_metrics')
+        nodes = RedisInstance.objects.filter(parent__name='cl')
+        self.assertGreaterEqual(nodes.count(), 3)
+        self.assertEqual(RedisMetric.objects.filter(instance__in=nodes).count(), nodes.count())
+        series = self.client.get('/api/metrics/history/series/?instance=cl&fields=total_keys').data
+        self.assertEqual(series['total_keys'], [300])  # replicas' copies are not counted twice
+
+    def test_bulk_inspect_returns_metadata_in_one_round_trip(self):
+        self.redis.script_flush()  # first call has to load the script
+        response = self.client.post('/api/keys/inspect/', {'keys': ['test_hash', 'test_zset', 'missing']},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = response.data['keys']
+        self.assertEqual([row['type'] for row in rows], ['hash', 'zset', 'none'])
+        self.assertEqual((rows[0]['size'], rows[0]['ttl']), (1, -1))
+        self.assertIn('encoding', rows[1])
+        self.assertNotIn('value', rows[0])
+        response = self.client.get('/api/keys/test_zset/?count=1')
+        self.assertIn('1 round trips', response['Server-Timing'])  # script already loaded above
+        self.assertEqual(response.data['value'], [('score1', 1.0)])
+
+    def test_bulk_jobs_import_expire_and_delete_by_pattern(self):
+        rows = [
+            {'name': 'imp:s', 'type': 'string', 'value': 'v', 'ttl': 100},
+            {'name': 'imp:l', 'type': 'list', 'value': ['a', 'b']},
+            {'name': 'imp:z', 'type': 'zset', 'value': [['m', 2]]},
+            {'name': 'imp:x', 'type': 'stream', 'value': [['2-0', {'f': 'b'}], ['1-0', {'f': 'a'}]]},
+        ]
+        ndjson = '\n'.join(json.dumps(row) for row in rows)
+        bad = self.client.post('/api/keys/bulk/import/', ndjson + '\n{"name": "x", "type": "set", "value": []}',
+                               content_type='application/x-ndjson')
+        self.assertEqual(bad.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('Line 5', bad.data['detail'])
+        job = self.client.post('/api/keys/bulk/import/?rate=0&batch_size=3', ndjson,
+                               content_type='application/x-ndjson').data
+        self.assertEqual((job['status'], job['total']), ('pending', 4))
+        call_command('run_bulk_jobs')
+        self.assertEqual(self.redis.lrange('imp:l', 0, -1), ['a', 'b'])
+        self.assertEqual(self.redis.xlen('imp:x'), 2)
+        self.assertGreater(self.redis.ttl('imp:s'), 0)
+        self.client.post('/api/keys/bulk/', {'operation': 'expire', 'match': 'imp:*', 'ttl': 500}, format='json')
+        job = self.client.post('/api/keys/bulk/', {'operation': 'delete', 'match': 'test_*', 'rate': 0},
+                               format='json').data
+        call_command('run_bulk_jobs')
+        self.assertEqual(self.redis.ttl('imp:z'), 500)
+        self.assertEqual(sorted(self.redis.keys()), ['imp:l', 'imp:s', 'imp:x', 'imp:z'])
+        job = self.client.get(f"/api/keys/bulk/{job['id']}/").data
+        self.assertEqual((job['status'], job['affected']), ('done', 6))
+
+    def test_bulk_job_is_claimed_once_and_resumed_only_when_stale(self):
+        from .bulkops import claim
+        from .models import BulkJob
+        job = BulkJob.objects.create(instance=RedisInstance.get_default(), operation=BulkJob.OP_DELETE,
+                                     match='nothing:*')
+        self.assertTrue(claim(job))
+        self.assertFalse(claim(job))
+        self.assertFalse(claim(job, resume=True))  # checkpointed just now
+        BulkJob.objects.filter(id=job.id).update(updated_at=timezone.now() - timedelta(hours=1))
+        self.assertTrue(claim(job, resume=True))
+        self.assertFalse(claim(job, resume=True))
+
+    def test_hot_key_tracker_counts_notifications_and_snapshots(self):
+        from .hotkeys import SpaceSaving, HotKeyTracker, HotKeyWorker, snapshot_row
+        counter = SpaceSaving(capacity=10)
+        for i in range(1000):
+            counter.add('hot')
+            counter.add(f'cold:{i}')
+        top = counter.top(1)[0]
+        self.assertEqual(top[0], 'hot')
+        self.assertLessEqual(top[1] - top[2], 1000)  # count - error never overstates
+        self.assertEqual(len(counter.counts), 10)
+
+        original = self.redis.config_get('notify-keyspace-events')
+        original.update(self.redis.config_get('maxmemory-policy'))
+        self.redis.config_set('notify-keyspace-events', 'EA')
+        self.redis.config_set('maxmemory-policy', 'allkeys-lfu')
+        try:
+            with self.settings(HOTKEYS_FREQ_INTERVAL=0.05):
+                worker = HotKeyWorker(settings.REDIS_URL, HotKeyTracker())
+                worker.start()
+                for _ in range(50):
+                    if worker.tracker.live:
+                        break
+                    worker.stopped.wait(0.05)
+                for i in range(20):
+                    self.redis.set('session:1', i)
+                    self.redis.hset(f'user:{i}', 'f', i)
+                    self.redis.get('test_string')
+                worker.stopped.wait(0.5)
+                worker.stop()
+        finally:
+            for name, value in original.items():
+                self.redis.config_set(name, value)
+        snapshot = snapshot_row(RedisInstance.get_default(), worker.tracker)
+        snapshot.save()
+        self.assertEqual(snapshot.keys[0][:2], ['session:1', 20])
+        self.assertEqual(sorted(row[:2] for row in snapshot.prefixes), [['session', 20], ['user', 20]])
+        self.assertEqual(snapshot.event_counts['hset'], 20)
+        self.assertTrue(snapshot.lfu)
+        self.assertIn('test_string', [key for key, _ in snapshot.hot_keys])
+        data = self.client.get('/api/keys/hot/latest/').data['results']
+        self.assertEqual(data[0]['events'], 40)
+
+    def test_collector_stores_slowlog_latency_and_commandstat_deltas(self):
+        from .diagnostics import Diagnostics, save_rows
+        from .models import SlowLogEntry, LatencyEvent, CommandStat
+        self.redis.slowlog_reset()
+        self.redis.execute_command('LATENCY', 'RESET')
+        original = self.redis.config_get('slowlog-log-slower-than')
+        original.update(self.redis.config_get('latency-monitor-threshold'))
+        self.redis.config_set('slowlog-log-slower-than', 0)
+        self.redis.config_set('latency-monitor-threshold', 10)
+        try:
+            self.redis.execute_command('DEBUG', 'SLEEP', 0.02)
+            call_command('collect_metrics')
+            call_command('collect_metrics')  # the same slowlog entries again
+        finally:
+            for name, value in original.items():
+                self.redis.config_set(name, value)
+        entries = SlowLogEntry.objects.filter(command='DEBUG')
+        self.assertEqual(entries.count(), 1)
+        self.assertEqual(LatencyEvent.objects.filter(event='command').count(), 1)
+        top = self.client.get('/api/diagnostics/slowlog/top/').data['results']
+        self.assertEqual(top[0]['command'], 'DEBUG')
+        self.assertEqual(self.client.get('/api/diagnostics/slowlog/top/?limit=0').status_code, 400)
+        self.assertEqual(self.client.get('/api/diagnostics/slowlog/top/?limit=abc').status_code, 400)
+
+        with self.settings(METRICS_COMMANDSTATS_INTERVAL=0):
+            diagnostics = Diagnostics(RedisInstance.get_default())
+            save_rows(*diagnostics.rows(diagnostics.fetch(self.redis)[1]))
+            for i in range(7):
+                self.redis.append('counter', 'x')
+            save_rows(*diagnostics.rows(diagnostics.fetch(self.redis)[1]))
+        self.assertEqual(CommandStat.objects.get(command='append').calls, 7)
+        rows = self.client.get('/api/diagnostics/commands/').data['results']
+        self.assertEqual({row['command']: row['calls'] for row in rows}['append'], 7)
+        series = self.client.get('/api/diagnostics/commands/series/?commands=append').data['series']
+        self.assertEqual(len(series['append']['calls_per_sec']), 1)
+
+    def test_alert_rules_fire_resolve_and_notify_webhook(self):
+        import threading
+        from http.server import BaseHTTPRequestHandler, HTTPServer
+        from .alerts import AlertEngine
+        from .models import AlertRule, Alert
+        received = []
+
+        class Receiver(BaseHTTPRequestHandler):
+            def do_POST(self):
+                received.append(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+                self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(('127.0.0.1', 0), Receiver)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        instance = RedisInstance.get_default()
+        response = self.client.post('/api/alerts/rules/', {
+            'name': 'memory', 'metric': 'memory_used', 'threshold': 1000, 'for_samples': 2,
+            'webhook_url': f'http://127.0.0.1:{server.server_port}/hook',
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        AlertRule.objects.create(name='ops spike', metric='ops_per_sec', kind='zscore', threshold=3, window=10)
+        engine = AlertEngine()
+        start = timezone.now()
+        try:
+            for i, (memory, ops) in enumerate([(500, 10), (1500, 11), (1600, 10), (1700, 9), (800, 10),
+                                               (900, 11), (700, 10), (600, 9), (500, 10), (500, 11), (500, 90)]):
+                metric = RedisMetric(instance=instance, timestamp=start + timedelta(seconds=i),
+                                     memory_used=memory, ops_per_sec=ops)
+                engine.evaluate([(instance, metric)])
+        finally:
+            engine.close()
+            server.shutdown()
+        memory = Alert.objects.get(rule__name='memory')
+        self.assertEqual(memory.state, Alert.STATE_RESOLVED)
+        self.assertEqual((memory.value, memory.peak_score), (1600, 1700))
+        self.assertEqual(memory.resolved_at, start + timedelta(seconds=4))
+        spike = Alert.objects.get(rule__name='ops spike')
+        self.assertEqual(spike.state, Alert.STATE_FIRING)
+        self.assertGreater(spike.score, 3)
+        self.assertEqual([[alert['state'] for alert in body['alerts']] for body in received], [['firing'], ['resolved']])
+        firing = self.client.get('/api/alerts/?state=firing').data['results']
+        self.assertEqual([alert['rule_name'] for alert in firing], ['ops spike'])
+
+    def test_rolling_and_ewma_stats_match_direct_computation(self):
+        import statistics
+        from .alerts import EWStats, RollingStats
+        values = [float(v * v % 17) for v in range(50)]
+        rolling, ewma = RollingStats(10), EWStats(10)
+        for value in values:
+            rolling.add(value)
+            ewma.add(value)
+        self.assertAlmostEqual(rolling.mean, statistics.mean(values[-10:]))
+        self.assertAlmostEqual(rolling.std(), statistics.stdev(values[-10:]))
+        mean = values[0]
+        for value in values[1:]:
+            mean += 2 / 11 * (value - mean)
+        self.assertAlmostEqual(ewma.mean, mean)
+
+    def test_history_fast_path_matches_serializer_and_columns_shape(self):
+        from rest_framework.renderers import JSONRenderer
+        from .renderers import FastJSONRenderer
+        from .serializers import RedisMetricSerializer
+        call_command('collect_metrics')
+        call_command('collect_metrics')
+        rows = RedisMetricSerializer(RedisMetric.objects.all(), many=True).data
+        response = self.client.get('/api/metrics/history/')
+        self.assertEqual(json.loads(response.content)['results'], json.loads(JSONRenderer().render(rows)))
+        columns = self.client.get('/api/metrics/history/?shape=columns').json()['results']
+        self.assertEqual(columns['timestamp'], [row['timestamp'] for row in json.loads(response.content)['results']])
+        self.assertEqual(len(columns['memory_used']), 2)
+        data = {'at': timezone.now(), 'info': {'db0': {'keys': 1}, 'ratio': 1.5}}
+        self.assertEqual(json.loads(FastJSONRenderer().render(data)), json.loads(JSONRenderer().render(data)))
+
+    @unittest.skipUnless(importlib.util.find_spec('numpy'), 'numpy is not installed')
+    def test_analytics_rates_percentiles_and_correlation_from_blocks(self):
+        from .timeseries import BlockWriter, FIELD_NAMES
+        instance = RedisInstance.get_default()
+        start = timezone.now().replace(microsecond=0) - timedelta(hours=2)
+        writer = BlockWriter(instance, block_seconds=600)
+        for i in range(2400):  # 2h of 3s samples over 12 blocks, a restart at 1000
+            values = dict.fromkeys(FIELD_NAMES)
+            commands = 10 * (i if i < 1000 else i - 1000)
+            values.update(used_memory=1000 + i, total_commands_processed=commands, keyspace_hits=3 * i,
+                          keyspace_misses=i, connected_clients=None if i % 5 else i,
+                          mem_fragmentation_ratio=1 + i / 2400)
+            writer.add(start + timedelta(seconds=3 * i), values)
+        writer.flush()
+        url = (f'/api/metrics/history/analytics/?start={start.isoformat()}&points=12&percentiles=50,100'
+               '&series=used_memory,rate:total_commands_processed,hit_rate,connected_clients,mem_fragmentation_ratio')
+        for _ in range(2):  # decoded, then from the block cache
+            data = self.client.get(url.replace('+', '%2B')).json()
+            self.assertEqual(data['samples'], 2400)
+            series = data['series']
+            self.assertEqual((series['used_memory']['min'], series['used_memory']['last']), (1000, 3399))
+            self.assertEqual(series['used_memory']['percentiles'], {'p50': 2199.5, 'p100': 3399})
+            rate = series['rate:total_commands_processed']
+            self.assertEqual((rate['count'], rate['min'], rate['max']), (2398, 10 / 3, 10 / 3))
+            self.assertAlmostEqual(series['hit_rate']['mean'], 0.75)
+            self.assertEqual((series['connected_clients']['count'], series['connected_clients']['max']), (480, 2395))
+            self.assertAlmostEqual(series['mem_fragmentation_ratio']['last'], 1 + 2399 / 2400)
+            self.assertAlmostEqual(data['correlation']['matrix'][0][4], 1)
+            self.assertEqual(len(data['points']['used_memory']), 12)
+        self.assertEqual(self.client.get('/api/metrics/history/analytics/?series=nope').status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+
+class BenchCommandTests(TransactionTestCase):
+    # The benchmarks serve requests from worker threads, which need committed rows.
+    def test_bench_commands_smoke(self):
+        import io
+        import tempfile
+        out = io.StringIO()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bench.json')
+            call_command('bench_api', endpoints=['keys', 'metrics'], concurrency=[2], requests=4,
+                         json_path=path, stdout=out)
+            call_command('bench_api', endpoints=['keys'], concurrency=[2], requests=4, compare=path,
+                         stdout=out)
+            with open(path) as f:
+                results = json.load(f)['results']
+        self.assertEqual([(row['endpoint'], row['errors']) for row in results], [('keys', 0), ('metrics', 0)])
+        call_command('bench_async', endpoint='keys', concurrency=[2], requests=4, stdout=out)
+        self.assertIn('req/s', out.getvalue())
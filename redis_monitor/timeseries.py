@@ -0,0 +1,420 @@
+"""
+Compact column-wise storage for numeric INFO fields.
+
+``FIELDS`` is the registry of INFO fields kept for every sample. Samples are
+grouped into ``MetricBlock`` rows of ``METRICS_BLOCK_SECONDS`` each and packed
+column by column:
+
+- timestamps (ms) as zigzag varints of the delta-of-delta, so a steady
+  collection interval costs ~1 byte per sample;
+- integer fields as zigzag varints of the delta from the previous sample;
+- float fields Gorilla-style: the XOR with the previous value's bit pattern,
+  written as a header byte plus only its non-zero middle bytes (an
+  unchanged value is a single zero byte);
+
+and the whole block is zlib-compressed. A column holding missing values is
+prefixed with a presence bitmap.
+
+The full INFO dict is no longer stored with every sample; see
+``snapshot_due()``.
+"""
+import struct
+import zlib
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+
+# (INFO field, type). Counters are cumulative since server start; the rest are gauges.
+FIELDS = [
+    ('uptime_in_seconds', int),
+    ('connected_clients', int),
+    ('blocked_clients', int),
+    ('used_memory', int),
+    ('used_memory_rss', int),
+    ('used_memory_peak', int),
+    ('used_memory_lua', int),
+    ('mem_fragmentation_ratio', float),
+    ('maxmemory', int),
+    ('total_connections_received', int),
+    ('total_commands_processed', int),
+    ('instantaneous_ops_per_sec', int),
+    ('total_net_input_bytes', int),
+    ('total_net_output_bytes', int),
+    ('instantaneous_input_kbps', float),
+    ('instantaneous_output_kbps', float),
+    ('rejected_connections', int),
+    ('expired_keys', int),
+    ('evicted_keys', int),
+    ('keyspace_hits', int),
+    ('keyspace_misses', int),
+    ('pubsub_channels', int),
+    ('pubsub_patterns', int),
+    ('latest_fork_usec', int),
+    ('connected_slaves', int),
+    ('used_cpu_sys', float),
+    ('used_cpu_user', float),
+    ('total_keys', int),  # summed over the db0..dbN keyspace sections
+]
+FIELD_TYPES = dict(FIELDS)
+FIELD_NAMES = [name for name, _ in FIELDS]
+
+# A change in any of these means a restart, failover or reconfiguration, so
+# the full INFO is worth keeping.
+SNAPSHOT_TRIGGER_FIELDS = (
+    'run_id', 'redis_version', 'role', 'maxmemory', 'maxmemory_policy', 'config_file', 'tcp_port',
+)
+
+INT, FLOAT = 0, 1
+HAS_NULLS = 0x80
+
+
+def extract(info):
+    """Return ``{field: value or None}`` for every registry field."""
+    values = {}
+    for name, kind in FIELDS:
+        value = info.get(name)
+        values[name] = kind(value) if isinstance(value, (int, float)) else None
+    values['total_keys'] = sum(
+        section.get('keys', 0) for key, section in info.items()
+        if key.startswith('db') and isinstance(section, dict)
+    )
+    return values
+
+
+def snapshot_key(info):
+    return {name: info.get(name) for name in SNAPSHOT_TRIGGER_FIELDS}
+
+
+def snapshot_due(info, last_snapshot, last_snapshot_at, now):
+    """
+    Whether to store the full INFO with this sample: when there is no earlier
+    snapshot, the server's identity/config changed, or the last one is older
+    than ``METRICS_RAW_INFO_INTERVAL`` seconds (0 disables the periodic copy).
+    ``METRICS_RAW_INFO = 'always'`` restores the old one-per-sample behaviour.
+    """
+    if settings.METRICS_RAW_INFO == 'always' or last_snapshot is None:
+        return True
+    if snapshot_key(info) != snapshot_key(last_snapshot):
+        return True
+    interval = settings.METRICS_RAW_INFO_INTERVAL
+    return bool(interval) and (now - last_snapshot_at).total_seconds() >= interval
+
+
+# --- varint / zigzag primitives ---------------------------------------------
+
+def _zigzag(n):
+    return n << 1 if n >= 0 else ((-n) << 1) - 1
+
+
+def _unzigzag(z):
+    return z >> 1 if not z & 1 else -((z + 1) >> 1)
+
+
+def _write_varint(out, n):
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(buf, pos):
+    result = shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _float_bits(value):
+    return struct.unpack('>Q', struct.pack('>d', value))[0]
+
+
+def _bits_float(bits):
+    return struct.unpack('>d', struct.pack('>Q', bits))[0]
+
+
+# --- columns -------------------------------------------------------------------
+
+def encode_timestamps(out, stamps):
+    prev = prev_delta = 0
+    for stamp in stamps:
+        delta = stamp - prev
+        _write_varint(out, _zigzag(delta - prev_delta))
+        prev, prev_delta = stamp, delta
+
+
+def decode_timestamps(buf, pos, count):
+    stamps = []
+    prev = prev_delta = 0
+    for _ in range(count):
+        z, pos = _read_varint(buf, pos)
+        prev_delta += _unzigzag(z)
+        prev += prev_delta
+        stamps.append(prev)
+    return stamps, pos
+
+
+def _encode_ints(out, values):
+    prev = 0
+    for value in values:
+        _write_varint(out, _zigzag(value - prev))
+        prev = value
+
+
+def _decode_ints(buf, pos, count):
+    values = []
+    prev = 0
+    for _ in range(count):
+        z, pos = _read_varint(buf, pos)
+        prev += _unzigzag(z)
+        values.append(prev)
+    return values, pos
+
+
+def _encode_floats(out, values):
+    prev = 0
+    for value in values:
+        bits = _float_bits(value)
+        xor = bits ^ prev
+        prev = bits
+        if xor == 0:
+            out.append(0)
+            continue
+        raw = xor.to_bytes(8, 'big')
+        leading = len(raw) - len(raw.lstrip(b'\0'))
+        trailing = len(raw) - len(raw.rstrip(b'\0'))
+        out.append(0x80 | (leading << 3) | trailing)
+        out += raw[leading:8 - trailing]
+
+
+def _decode_floats(buf, pos, count):
+    values = []
+    prev = 0
+    for _ in range(count):
+        header = buf[pos]
+        pos += 1
+        if header:
+            leading, trailing = (header >> 3) & 0x07, header & 0x07
+            size = 8 - leading - trailing
+            xor = int.from_bytes(buf[pos:pos + size], 'big') << (8 * trailing)
+            pos += size
+            prev ^= xor
+        values.append(_bits_float(prev))
+    return values, pos
+
+
+def encode_column(out, kind, values):
+    present = [value for value in values if value is not None]
+    tag = INT if kind is int else FLOAT
+    if len(present) != len(values):
+        out.append(tag | HAS_NULLS)
+        bitmap = bytearray((len(values) + 7) // 8)
+        for i, value in enumerate(values):
+            if value is not None:
+                bitmap[i // 8] |= 1 << (i % 8)
+        out += bitmap
+    else:
+        out.append(tag)
+    if tag == INT:
+        _encode_ints(out, present)
+    else:
+        _encode_floats(out, present)
+
+
+def decode_column(buf, pos, count):
+    tag = buf[pos]
+    pos += 1
+    present_mask = None
+    if tag & HAS_NULLS:
+        size = (count + 7) // 8
+        present_mask = buf[pos:pos + size]
+        pos += size
+        present = sum(bin(byte).count('1') for byte in present_mask)
+    else:
+        present = count
+    decoder = _decode_ints if tag & ~HAS_NULLS == INT else _decode_floats
+    values, pos = decoder(buf, pos, present)
+    if present_mask is None:
+        return values, pos
+    it = iter(values)
+    return [next(it) if present_mask[i // 8] >> (i % 8) & 1 else None for i in range(count)], pos
+
+
+def encode_block(stamps, columns, fields):
+    """Pack ``stamps`` (epoch ms) and ``columns[field]`` lists into compressed bytes."""
+    out = bytearray()
+    _write_varint(out, len(stamps))
+    encode_timestamps(out, stamps)
+    for field in fields:
+        column = bytearray()
+        encode_column(column, FIELD_TYPES.get(field, float), columns[field])
+        _write_varint(out, len(column))  # lets readers skip columns they don't need
+        out += column
+    return zlib.compress(bytes(out))
+
+
+def decode_block(data, fields, wanted=None):
+    """
+    Inverse of ``encode_block``: return ``(stamps, {field: values})`` for the
+    ``wanted`` fields (default: all of ``fields``).
+    """
+    buf = zlib.decompress(bytes(data))
+    count, pos = _read_varint(buf, 0)
+    stamps, pos = decode_timestamps(buf, pos, count)
+    wanted = set(fields if wanted is None else wanted)
+    columns = {}
+    for field in fields:
+        size, pos = _read_varint(buf, pos)
+        if field in wanted:
+            columns[field], _ = decode_column(buf, pos, count)
+        pos += size
+    return stamps, columns
+
+
+def to_ms(dt):
+    return int(dt.timestamp() * 1000)
+
+
+def from_ms(ms):
+    return datetime.fromtimestamp(ms / 1000, tz=dt_timezone.utc)
+
+
+def bucket_floor(when, seconds):
+    """Start of the ``seconds``-wide UTC bucket containing ``when``."""
+    epoch = int(when.timestamp())
+    return from_ms((epoch - epoch % seconds) * 1000)
+
+
+# --- reading and writing blocks ----------------------------------------------
+
+class BlockWriter:
+    """
+    Appends samples to the ``MetricBlock`` of their time bucket. The open
+    block is kept in memory and written when its bucket ends or when
+    ``flush()`` is called; reopening a bucket (e.g. after a restart, or in
+    one-shot cron mode) extends the stored block instead of starting over.
+    """
+
+    def __init__(self, instance=None, block_seconds=None):
+        self.instance = instance
+        self.block_seconds = block_seconds or settings.METRICS_BLOCK_SECONDS
+        self.block = None
+        self.dirty = False
+
+    def add(self, when, values):
+        start = bucket_floor(when, self.block_seconds)
+        if self.block is None or self.block.start != start:
+            self.flush()
+            self._open(start)
+        self.stamps.append(to_ms(when))
+        for field in FIELD_NAMES:
+            self.columns[field].append(values.get(field))
+        self.dirty = True
+
+    def _open(self, start):
+        from .models import MetricBlock
+        self.block = MetricBlock.objects.filter(instance=self.instance, start=start).first()
+        self.stamps, self.columns = [], {field: [] for field in FIELD_NAMES}
+        if self.block is None:
+            self.block = MetricBlock(instance=self.instance, start=start, fields=FIELD_NAMES)
+            return
+        stamps, columns = decode_block(self.block.data, self.block.fields)
+        self.stamps = stamps
+        for field in FIELD_NAMES:
+            self.columns[field] = columns.get(field, [None] * len(stamps))
+
+    def flush(self):
+        if not self.dirty:
+            return
+        self.block.fields = FIELD_NAMES
+        self.block.count = len(self.stamps)
+        self.block.end = from_ms(self.stamps[-1])
+        self.block.data = encode_block(self.stamps, self.columns, FIELD_NAMES)
+        self.block.save()
+        self.dirty = False
+
+
+def read_series(instance, start=None, end=None, fields=None):
+    """
+    Return ``{"timestamp": [...], field: [...], ...}`` for ``instance``'s
+    samples in ``[start, end]``, decoded from the blocks overlapping that range.
+    """
+    from .models import MetricBlock
+    fields = fields or FIELD_NAMES
+    blocks = MetricBlock.objects.filter(instance=instance).order_by('start')
+    if start:
+        blocks = blocks.filter(end__gte=start)
+    if end:
+        blocks = blocks.filter(start__lte=end)
+    start_ms = to_ms(start) if start else None
+    end_ms = to_ms(end) if end else None
+    series = {'timestamp': []}
+    series.update({field: [] for field in fields})
+    for block_fields, data in blocks.values_list('fields', 'data').iterator():
+        stamps, columns = decode_block(data, block_fields, fields)
+        for i, stamp in enumerate(stamps):
+            if (start_ms is not None and stamp < start_ms) or (end_ms is not None and stamp > end_ms):
+                continue
+            series['timestamp'].append(from_ms(stamp))
+            for field in fields:
+                column = columns.get(field)
+                series[field].append(column[i] if column is not None else None)
+    return series
+
+
+class BlockSamples:
+    """
+    ``instance``'s samples in ``[start, end)`` newest first, as a sequence
+    a paginator can use without decoding every block: ``len()`` comes from
+    the blocks' stored ``count`` (only blocks cut by ``start``/``end`` are
+    decoded) and a slice decodes just the blocks it touches. Items are
+    ``(timestamp, {field: value})`` for the wanted ``fields``.
+    """
+
+    def __init__(self, instance, start, end, fields):
+        from .models import MetricBlock
+        self.fields = fields
+        self.start_ms = to_ms(start) if start else None
+        self.end_ms = to_ms(end)
+        self.decoded = {}  # block id -> its samples in range, newest first
+        blocks = MetricBlock.objects.filter(instance=instance, start__lt=end).order_by('-start')
+        if start:
+            blocks = blocks.filter(end__gte=start)
+        self.blocks = []  # (block id, samples in range), newest first
+        for block_id, block_start, block_end, count in blocks.values_list('id', 'start', 'end', 'count'):
+            if (self.start_ms is None or to_ms(block_start) >= self.start_ms) and to_ms(block_end) < self.end_ms:
+                self.blocks.append((block_id, count))
+            else:
+                self.blocks.append((block_id, len(self._samples(block_id))))
+        self.total = sum(count for _, count in self.blocks)
+
+    def _samples(self, block_id):
+        from .models import MetricBlock
+        if block_id not in self.decoded:
+            fields, data = MetricBlock.objects.values_list('fields', 'data').get(id=block_id)
+            stamps, columns = decode_block(data, fields, self.fields)
+            self.decoded[block_id] = [
+                (from_ms(stamp), {field: columns[field][i] if field in columns else None for field in self.fields})
+                for i, stamp in reversed(list(enumerate(stamps)))
+                if (self.start_ms is None or stamp >= self.start_ms) and stamp < self.end_ms
+            ]
+        return self.decoded[block_id]
+
+    def __len__(self):
+        return self.total
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        low, high, _ = index.indices(self.total)
+        items, offset = [], 0
+        for block_id, count in self.blocks:
+            if offset >= high:
+                break
+            if offset + count > low:
+                items += self._samples(block_id)[max(low - offset, 0):high - offset]
+            offset += count
+        return items
@@ -1,14 +1,34 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import KeyViewSet, ValueViewSet, StatusViewSet, HistoryMetricViewSet, CurrentMetricViewSet
+from .views import (
+    KeyViewSet, ValueViewSet, StatusViewSet, HistoryMetricViewSet, CurrentMetricViewSet,
+    MemoryReportViewSet, RedisInstanceViewSet, BulkJobViewSet, HotKeySnapshotViewSet,
+    SlowLogViewSet, LatencyEventViewSet, CommandStatViewSet, KeyWalkerViewSet,
+    AlertRuleViewSet, AlertViewSet
+)
+from . import async_views
 
 router = DefaultRouter()
+router.register(r'instances', RedisInstanceViewSet, basename='instances')
 router.register(r'metrics/history', HistoryMetricViewSet, basename='metrics-history')
 router.register(r'metrics', CurrentMetricViewSet, basename='metrics')
+router.register(r'keys/bulk', BulkJobViewSet, basename='bulk-jobs')  # before keys/<name>
+router.register(r'keys/hot', HotKeySnapshotViewSet, basename='hot-keys')
+router.register(r'keys/walkers', KeyWalkerViewSet, basename='key-walkers')
 router.register(r'keys', KeyViewSet, basename='keys')
 router.register(r'values', ValueViewSet, basename='values')
 router.register(r'status', StatusViewSet, basename='status')
+router.register(r'memory/reports', MemoryReportViewSet, basename='memory-reports')
+router.register(r'diagnostics/slowlog', SlowLogViewSet, basename='slowlog')
+router.register(r'diagnostics/latency', LatencyEventViewSet, basename='latency-events')
+router.register(r'diagnostics/commands', CommandStatViewSet, basename='command-stats')
+router.register(r'alerts/rules', AlertRuleViewSet, basename='alert-rules')  # before alerts/<id>
+router.register(r'alerts', AlertViewSet, basename='alerts')
 
 urlpatterns = [
+    path('async/keys/', async_views.keys, name='async-keys'),
+    path('async/values/<path:key>/', async_views.value, name='async-values'),
+    path('async/metrics/', async_views.current_metrics, name='async-metrics'),
+    path('async/metrics/live/', async_views.live_metrics, name='async-metrics-live'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
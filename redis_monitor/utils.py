@@ -1,20 +1,210 @@
+import json
+import time
 import redis
-from django.conf import settings
-from django.core.exceptions import ImproperlyConfigured
-from rest_framework.exceptions import APIException
+import redis.asyncio as aioredis
+from redis.client import Pipeline
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import APIException, NotFound
 from rest_framework import status
+from .pool import get_pool, get_async_pool
+from .instrumentation import record_command
+from .walker import KeyspaceWalker
 
-def get_redis_connection():
+
+class RedisUnavailable(APIException, redis.ConnectionError):
+    """Raised when Redis can't be reached; rendered by DRF as a 503."""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Redis unreachable'
+
+
+def redis_unavailable(error):
+    return RedisUnavailable(detail={"detail": "Redis unreachable", "error": str(error)})
+
+
+class RedisPipeline(Pipeline):
+    def execute(self, raise_on_error=True):
+        commands = len(self.command_stack)
+        started = time.perf_counter()
+        try:
+            return super().execute(raise_on_error)
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            raise redis_unavailable(e)
+        finally:
+            if commands:
+                record_command('PIPELINE', time.perf_counter() - started, commands)
+
+
+class RedisClient(redis.Redis):
+    """
+    Redis client bound to a shared pool. Connection failures surface as
+    ``RedisUnavailable`` the first time a command is sent, so no PING is
+    needed up front.
+    """
+    def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return super().execute_command(*args, **options)
+        except RedisUnavailable:
+            raise
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            raise redis_unavailable(e)
+        finally:
+            record_command(args[0], time.perf_counter() - started)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return RedisPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+def resolve_instance(request):
+    """
+    The RedisInstance a request is about: ``?instance=<name or id>``, or the
+    default instance when the parameter is absent.
+    """
+    from .models import RedisInstance
+    ref = request.GET.get('instance')
+    if not ref:
+        return RedisInstance.get_default()
+    lookup = {'id': int(ref)} if ref.isdigit() else {'name': ref}
+    try:
+        return RedisInstance.objects.get(**lookup)
+    except RedisInstance.DoesNotExist:
+        raise NotFound({"detail": f"Unknown Redis instance '{ref}'"})
+
+
+def get_redis_connection(url=None):
+    return RedisClient(connection_pool=get_pool(url))
+
+
+def get_instance_connection(instance):
+    """Client for a RedisInstance: slot-routing ``RedisClusterClient`` for clusters, else ``RedisClient``."""
+    if instance.is_cluster:
+        from .cluster import get_cluster_connection
+        return get_cluster_connection(instance.redis_url, instance.read_from_replicas)
+    return get_redis_connection(instance.redis_url)
+
+
+def get_async_redis_connection(url=None):
+    """asyncio client on the shared per-loop pool; must be called inside a running loop."""
+    return aioredis.Redis(connection_pool=get_async_pool(url))
+
+
+def _str(value):
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def key_rows(keys, results, fields=("type", "ttl")):
+    """
+    Shape SCAN keys plus the pipelined replies queued for each of them (one
+    per field, in order) into ``{"name", "type", "ttl", ...}`` rows.
+    """
+    stride = len(fields)
+    rows = []
+    for i, key in enumerate(keys):
+        row = {"name": _str(key)}
+        for j, field in enumerate(fields):
+            row[field] = _str(results[i*stride + j])
+        rows.append(row)
+    return rows
+
+
+def shape_rows(fields, rows, columns=False):
+    """
+    ``values_list()`` rows as ``[{field: value}, ...]``, or with ``columns``
+    as one list per field, ``{field: [...]}``: no repeated keys, so much
+    smaller and faster to encode for long series.
+    """
+    rows = list(rows)
+    if columns:
+        return {field: [row[i] for row in rows] for i, field in enumerate(fields)}
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def throttle(started, done, rate):
+    """Sleep just long enough to keep ``done`` operations since ``started`` (monotonic) at or below ``rate``/s."""
+    if rate:
+        ahead = done / rate - (time.monotonic() - started)
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+def stream_keyspace(r, match=None, count=500, memory=False, rate=0):
+    """
+    Walk the whole keyspace with SCAN and yield one NDJSON chunk per batch:
+    ``{"name", "type", "ttl"[, "memory"]}`` rows, with TYPE/TTL (and
+    ``MEMORY USAGE``) pipelined per batch. Only one batch is held at a time.
+    ``rate`` caps keys visited per second (0 = unlimited while the server
+    is calm; see walker.py) so a full export doesn't saturate the server.
+    If the client goes away the server stops iterating the generator, and
+    the walk stops with it.
+    """
+    fields = ("type", "ttl", "memory") if memory else ("type", "ttl")
+    walker = KeyspaceWalker(r, match=match, count=count, rate=rate, label='key export')
+    for keys in walker.batches():
+        if keys:
+            pipe = r.pipeline(transaction=False)
+            for key in keys:
+                pipe.type(key)
+                pipe.ttl(key)
+                if memory:
+                    pipe.memory_usage(key)
+            rows = key_rows(keys, pipe.execute(), fields)
+            yield "".join(json.dumps(row) + "\n" for row in rows if row["type"] != "none")
+
+
+def value_page(key_type, cursor, count, size, reply):
+    """
+    Return ``(value, next_cursor)`` from one page of a key's value (see
+    keyinspect.py); "0" means done. Every page costs O(count) no matter how
+    big the collection is: HSCAN/SSCAN cursors for hashes and sets, index
+    windows for lists and sorted sets (which keeps zsets in score order),
+    and an entry-ID cursor for streams, newest first.
+    """
+    cursor = cursor or '0'
+    if key_type in ('hash', 'set'):
+        next_cursor, items = reply
+        return items, str(next_cursor)
+    if key_type in ('zset', 'list'):
+        end = int(cursor) + count
+        return reply, str(end) if end < size else '0'
+    if key_type == 'stream':
+        if len(reply) > count:
+            return reply[:count], reply[count][0]
+        return reply, '0'
+    return reply, '0'
+
+
+def parse_time_param(value):
+    """Parse an ISO-8601 query parameter into an aware datetime (None if absent)."""
+    if not value:
+        return None
+    # A literal '+' in an unencoded query string arrives as a space.
+    parsed = parse_datetime(value.replace(' ', '+'))
+    if parsed is None:
+        raise ValueError(f"Invalid datetime '{value}'")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def int_param(params, name, default, minimum=None, maximum=None):
+    """
+    ``params[name]`` as an int (``default`` if absent), capped at
+    ``maximum``; ValueError if it isn't a number or is below ``minimum``.
+    """
+    value = params.get(name, default)
     try:
-        r = redis.from_url(settings.REDIS_URL, decode_responses=True)
-        r.ping()  # Test connection
-        return r
-    except redis.ConnectionError as e:
-        raise APIException(detail={"detail": "Redis unreachable", "error": str(e)}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{name}' must be an integer, got '{value}'")
+    if minimum is not None and number < minimum:
+        raise ValueError(f"'{name}' must be >= {minimum}")
+    return number if maximum is None else min(number, maximum)
+
 
 def calculate_derived_metrics(info):
     hits = info.get('keyspace_hits', 0)
     misses = info.get('keyspace_misses', 0)
     total = hits + misses
     hit_rate = hits / total if total > 0 else 0.0
-    return {'hit_rate': hit_rate}
\ No newline at end of file
+    return {'hit_rate': hit_rate}
@@ -1,48 +1,189 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.exceptions import NotFound, APIException
+from rest_framework.exceptions import NotFound, APIException, ValidationError
 from django.utils import timezone
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.db.models import Avg, Count, Max, Sum
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import RedisMetric
+from .models import (
+    RedisInstance, RedisMetric, MemoryReport, BulkJob, HotKeySnapshot, SlowLogEntry, LatencyEvent, CommandStat,
+    AlertRule, Alert
+)
 from .serializers import (
-    RedisMetricSerializer, KeysSerializer, ValueSerializer,
-    MetricsSerializer, StatusSerializer
+    RedisMetricSerializer, ValueSerializer,
+    StatusSerializer, MemoryReportSerializer, MemoryReportDetailSerializer,
+    RedisInstanceSerializer, BulkJobSerializer, HotKeySnapshotSerializer, SlowLogEntrySerializer,
+    LatencyEventSerializer, AlertRuleSerializer, AlertSerializer
+)
+from .utils import (
+    calculate_derived_metrics, key_rows, stream_keyspace,
+    parse_time_param, int_param, resolve_instance, get_instance_connection, shape_rows
 )
-from .utils import get_redis_connection, calculate_derived_metrics
-import json
+from .pool import pool_stats
+from .keyinspect import inspect_key, inspect_keys, page_count
+from .bulkops import check_value, parse_ttl, queue_write, start_job, validate_import
+from .infocache import info_cache, info_key, dbsize_key
+from .instrumentation import render_metrics
+from .keyindex import get_key_index, search_pattern
+from .keytree import get_key_tree
+from .walker import KeyspaceWalker, get_walker, running_walkers
+from .timeseries import FIELD_NAMES, read_series
+from .rollups import AGGREGATES, HistoryRows, history_points
+from .rdb import read_listing
+from . import analytics as metric_analytics
+from datetime import timedelta
+
+class InstanceScopedMixin:
+    """
+    Resolves ``?instance=<name or id>`` (default: the default instance)
+    before the handler runs, so an unknown instance is a 404 everywhere.
+    """
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.redis_instance = resolve_instance(request)
+
+    def redis(self):
+        return get_instance_connection(self.redis_instance)
 
-class HistoryMetricViewSet(viewsets.ModelViewSet):
+    def key_index(self):
+        # The index follows a single server's keyspace; cluster searches always SCAN.
+        if self.redis_instance.is_cluster:
+            return None
+        return get_key_index(self.redis_instance.redis_url)
+
+class RedisInstanceViewSet(viewsets.ModelViewSet):
+    """
+    Registered Redis instances. Every other endpoint takes ?instance=<name or id>
+    and falls back to the "default" instance (settings.REDIS_URL) without it.
+    """
+    queryset = RedisInstance.objects.all()
+    serializer_class = RedisInstanceSerializer
+
+class HistoryMetricViewSet(InstanceScopedMixin, viewsets.ModelViewSet):
     queryset = RedisMetric.objects.all()
     serializer_class = RedisMetricSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['timestamp']
 
     def get_queryset(self):
-        queryset = super().get_queryset()
-        start = self.request.query_params.get('start')
-        end = self.request.query_params.get('end')
+        queryset = super().get_queryset().filter(instance=self.redis_instance)
+        try:
+            start = parse_time_param(self.request.query_params.get('start'))
+            end = parse_time_param(self.request.query_params.get('end'))
+        except ValueError as e:
+            raise ValidationError({"detail": str(e)})
+        self.time_range = (start, end)
         if start:
             queryset = queryset.filter(timestamp__gte=start)
         if end:
             queryset = queryset.filter(timestamp__lte=end)
         return queryset
 
-class CurrentMetricViewSet(viewsets.ViewSet):
+    def list(self, request, *args, **kwargs):
+        """
+        Raw samples, paginated; samples older than METRICS_ROW_RETENTION_DAYS
+        (whose rows are pruned) are read from the MetricBlock store, except
+        for an exact ?timestamp= lookup. With ?max_points=N the response is instead at
+        most N points for start..end, from raw samples or the finest rollup
+        tier (1m/10m/1h) that fits; ?agg=avg|min|max|last picks the rollup value.
+        ?shape=columns returns "results" as {"timestamp": [...], "memory_used": [...], ...}.
+        Rows are read with values_list() and shaped directly, not through the serializer.
+        """
+        columns = request.query_params.get('shape') == 'columns'
+        if 'max_points' not in request.query_params:
+            fields = RedisMetricSerializer.Meta.fields
+            queryset = self.filter_queryset(self.get_queryset())
+            if 'timestamp' in request.query_params:
+                queryset = queryset.values_list(*fields)
+            else:
+                queryset = HistoryRows(self.redis_instance, queryset, fields, *self.time_range)
+            page = self.paginate_queryset(queryset)
+            rows = shape_rows(fields, queryset if page is None else page, columns)
+            return Response(rows) if page is None else self.get_paginated_response(rows)
+        agg = request.query_params.get('agg', 'avg')
+        if agg not in AGGREGATES:
+            return Response({"detail": f"agg must be one of {', '.join(AGGREGATES)}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            max_points = int(request.query_params['max_points'])
+            end = parse_time_param(request.query_params.get('end')) or timezone.now()
+            start = parse_time_param(request.query_params.get('start')) or end - timedelta(days=settings.METRICS_RETENTION_DAYS)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        tier, points = history_points(self.redis_instance, start, end, max_points, agg)
+        if columns:
+            fields = list(points[0]) if points else ['timestamp']
+            points = shape_rows(fields, [[point[field] for field in fields] for point in points], columns)
+        return Response({"tier": tier, "agg": agg, "results": points})
+
+    @action(detail=False, methods=['get'])
+    def series(self, request):
+        """
+        Any registry INFO field over time from the columnar store, as
+        {"timestamp": [...], "<field>": [...]}.
+        Example: /api/metrics/history/series/?fields=used_memory,keyspace_hits&start=...&end=...
+        """
+        fields = [f for f in request.query_params.get('fields', '').split(',') if f] or FIELD_NAMES
+        unknown = sorted(set(fields) - set(FIELD_NAMES))
+        if unknown:
+            return Response(
+                {"detail": f"Unknown fields: {', '.join(unknown)}", "fields": FIELD_NAMES},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            start = parse_time_param(request.query_params.get('start'))
+            end = parse_time_param(request.query_params.get('end'))
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(read_series(self.redis_instance, start, end, fields))
+
+    @action(detail=False, methods=['get'])
+    def analytics(self, request):
+        """
+        Statistics computed server-side over ?start=&end= (default: the last
+        day) for ?series=used_memory,rate:total_commands_processed,hit_rate
+        (any registry field, "rate:<counter>" per second, or hit_rate):
+        count/min/max/mean/std/last and ?percentiles= (default 50,90,99) per
+        series, their correlation, and ?points= (default 300, 0 for none)
+        bucket means, after a ?smooth=<seconds> moving average if given.
+        A week of samples takes about 0.3 s on a first read and 80-110 ms
+        once its blocks are cached (see analytics.py).
+        """
+        if metric_analytics.np is None:
+            return Response({"detail": "Analytics need numpy installed"}, status=status.HTTP_501_NOT_IMPLEMENTED)
+        params = request.query_params
+        names = [s for s in params.get('series', 'used_memory,rate:total_commands_processed,hit_rate').split(',') if s]
+        try:
+            for name in names:
+                metric_analytics.base_fields(name)
+            percentiles = [float(p) for p in params.get('percentiles', '50,90,99').split(',') if p]
+            if any(not 0 <= p <= 100 for p in percentiles):
+                raise ValueError('percentiles must be between 0 and 100')
+            smooth = float(params.get('smooth', 0))
+            points = min(int(params.get('points', 300)), 10000)
+            end = parse_time_param(params.get('end')) or timezone.now()
+            start = parse_time_param(params.get('start')) or end - timedelta(days=1)
+        except ValueError as e:
+            return Response({"detail": str(e), "fields": FIELD_NAMES}, status=status.HTTP_400_BAD_REQUEST)
+        if not names or start >= end:
+            return Response({"detail": "Need at least one series and start before end"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        result = metric_analytics.analyze(self.redis_instance, start, end, names, percentiles, smooth, max(points, 0))
+        return Response({"start": start, "end": end, **result})
+
+class CurrentMetricViewSet(InstanceScopedMixin, viewsets.ViewSet):
     def list(self, request):
         try:
-            r = get_redis_connection()
-            info = r.info()
+            info = info_cache.get_or_call(info_key(self.redis_instance), lambda: self.redis().info())
             derived = calculate_derived_metrics(info)
-            data = {'info': info, 'derived': derived}
-            serializer = MetricsSerializer(data)
-            return Response(serializer.data)
+            return Response({'info': info, 'derived': derived})
         except APIException as e:
             return Response(e.detail, status=e.status_code)
         except Exception as e:
             return Response({"detail": "Error fetching metrics", "error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-class KeyViewSet(viewsets.ViewSet):
+class KeyViewSet(InstanceScopedMixin, viewsets.ViewSet):
     """
     search for keys like:
     http://localhost:8000/api/keys/search/?q=[key-name]
@@ -51,8 +192,7 @@ class KeyViewSet(viewsets.ViewSet):
     def total(self, request):
         """Return total number of keys in Redis"""
         try:
-            r = get_redis_connection()
-            total_keys = r.dbsize()
+            total_keys = info_cache.get_or_call(dbsize_key(self.redis_instance), lambda: self.redis().dbsize())
             return Response({"total_keys": total_keys})
         except Exception as e:
             return Response(
@@ -62,88 +202,157 @@ class KeyViewSet(viewsets.ViewSet):
             
     @action(detail=False, methods=['get'])
     def search(self, request):
-        """Search keys by partial match and return type + ttl"""
+        """
+        Search keys and return type + ttl.
+        mode=substring (default), prefix or glob. Served from the key index
+        when KEY_INDEX_ENABLED and the index is built, otherwise by SCAN MATCH
+        (through a load-aware KeyspaceWalker, see walker.py).
+        """
         query = request.query_params.get('q', None)
-        limit = int(request.query_params.get('count', 100))
 
         if not query:
             return Response(
                 {"detail": "Missing query parameter 'q'"},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        try:
+            limit = int(request.query_params.get('count', 100))
+            pattern = search_pattern(query, request.query_params.get('mode', 'substring'))
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            r = get_redis_connection()
-            cursor = 0
-            matched_keys = []
+            r = self.redis()
+            index = self.key_index()
+
+            if index is not None and index.ready:
+                matched_keys = index.search(pattern, limit)
+            else:
+                matched_keys = []
 
-            # Keep scanning until done or enough matches
-            while True:
-                cursor, keys = r.scan(cursor=cursor, match=f"*{query}*", count=limit)
-                matched_keys.extend(keys)
-                if cursor == 0 or len(matched_keys) >= limit:
-                    break
+                # Keep scanning until done or enough matches
+                walker = KeyspaceWalker(r, match=pattern, rate=0, label='key search',
+                                        instance=self.redis_instance.name)
+                for keys in walker.batches():
+                    matched_keys.extend(keys)
+                    if len(matched_keys) >= limit:
+                        break
 
             # Enrich keys with type + ttl
+            matched_keys = matched_keys[:limit]
             pipe = r.pipeline()
             for key in matched_keys:
-                k = key.decode("utf-8") if isinstance(key, bytes) else key
-                pipe.type(k)
-                pipe.ttl(k)
-            results = pipe.execute()
-
-            key_info = []
-            for i, key in enumerate(matched_keys[:limit]):
-                key_str = key.decode("utf-8") if isinstance(key, bytes) else key
-                ktype = results[i*2].decode("utf-8") if isinstance(results[i*2], bytes) else results[i*2]
-                ttl = results[i*2 + 1]
-                key_info.append({
-                    "name": key_str,
-                    "type": ktype,
-                    "ttl": ttl
-                })
-
-            return Response({"keys": key_info})
+                pipe.type(key)
+                pipe.ttl(key)
+            # The index can briefly lag behind deletes; drop keys that are gone.
+            key_info = [row for row in key_rows(matched_keys, pipe.execute()) if row["type"] != "none"]
+
+            data = {"keys": key_info}
+            if index is not None:
+                data["index"] = index.freshness()
+            return Response(data)
         except Exception as e:
             return Response(
                 {"detail": "Error searching keys", "error": str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
             
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream every key (optionally filtered by ?match=) as NDJSON rows of
+        name/type/ttl, plus memory with ?memory=1. ?count= sets the SCAN
+        batch size and ?rate= caps keys/second (0 = unlimited).
+        Example: GET /api/keys/export/?match=user:*&memory=1&rate=5000
+        """
+        match = request.query_params.get('match') or None
+        memory = request.query_params.get('memory', '').lower() in ('1', 'true', 'yes')
+        try:
+            count = int_param(request.query_params, 'count', 500, minimum=1)
+            rate = int_param(request.query_params, 'rate', settings.KEY_EXPORT_DEFAULT_RATE, minimum=0)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        r = self.redis()
+        response = StreamingHttpResponse(
+            stream_keyspace(r, match=match, count=count, memory=memory, rate=rate),
+            content_type='application/x-ndjson',
+        )
+        response['Content-Disposition'] = 'attachment; filename="keys.ndjson"'
+        return response
+
+    @action(detail=False, methods=['get'])
+    def index(self, request):
+        """Status and freshness of the key-name search index"""
+        index = self.key_index()
+        if index is None:
+            return Response({"detail": "Key index is disabled (KEY_INDEX_ENABLED)"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(index.freshness())
+
+    @action(detail=False, methods=['get'])
+    def tree(self, request):
+        """
+        Browse keys by namespace: the child prefixes of ?prefix= (default:
+        the top level) split on ?delimiter= (default ":"), each with its key
+        count and estimated memory, from a sampled background SCAN.
+        Children come in name order, ?count= at a time; pass next_cursor
+        as ?cursor= for the next page (null when done). A child's "match"
+        lists its keys with /api/keys/search/?mode=glob&q=<match>.
+        """
+        delimiter = request.query_params.get('delimiter', ':')
+        if delimiter not in settings.KEY_TREE_DELIMITERS:
+            return Response(
+                {"detail": f"delimiter must be one of {' '.join(settings.KEY_TREE_DELIMITERS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        prefix = request.query_params.get('prefix', '')
+        try:
+            # A node never has more than KEY_TREE_MAX_CHILDREN children (the rest are "(other)").
+            count = max(int_param(request.query_params, 'count', 100, maximum=settings.KEY_TREE_MAX_CHILDREN), 1)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        tree = get_key_tree(self.redis_instance, delimiter)
+        page = tree.page(prefix, request.query_params.get('cursor') or None, count)
+        if page is None:
+            return Response(
+                {"detail": f"No keys under '{prefix}'", "tree": tree.freshness()},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        stats, children, next_cursor = page
+        return Response({
+            "prefix": prefix, "delimiter": delimiter, **stats,
+            "children": children, "next_cursor": next_cursor, "tree": tree.freshness(),
+        })
+
     def list(self, request):
+        """
+        One SCAN page from ?cursor=. ?count= is an upper bound: the walker's
+        governor lowers it to the COUNT it currently allows on this server
+        (see walker.py), and the response's "count" is the one actually used.
+        """
         cursor = request.query_params.get('cursor', '0')
-        count = int(request.query_params.get('count', 100))
         try:
-            r = get_redis_connection()
-            next_cursor, keys = r.scan(cursor=cursor, count=count)
-
-            key_info = []
+            count = int(request.query_params.get('count', 100))
+            r = self.redis()
+            walker = KeyspaceWalker(r, count=count, cursor=cursor)
+            keys = walker.step()
+            next_cursor = walker.cursor
 
             # Use pipeline to reduce round-trips (faster)
             pipe = r.pipeline()
             for key in keys:
-                k = key.decode("utf-8") if isinstance(key, bytes) else key
-                pipe.type(k)
-                pipe.ttl(k)
-
-            results = pipe.execute()
-
-            for i, key in enumerate(keys):
-                key_str = key.decode("utf-8") if isinstance(key, bytes) else key
-                ktype = results[i*2].decode("utf-8") if isinstance(results[i*2], bytes) else results[i*2]
-                ttl = results[i*2 + 1]  # already int (-1 no expiry, -2 no key)
-
-                key_info.append({
-                    "name": key_str,
-                    "type": ktype,
-                    "ttl": ttl
-                })
+                pipe.type(key)
+                pipe.ttl(key)  # -1 no expiry, -2 no key
+            key_info = key_rows(keys, pipe.execute())
 
             data = {
                 "keys": key_info,
-                "next_cursor": str(next_cursor)
+                "next_cursor": str(next_cursor),
+                "count": walker.last_count,
             }
             return Response(data)
+        except ValueError as e:
+            # A malformed ?count= or cluster ?cursor= (see cluster.decode_cursor).
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except APIException as e:
             return Response(e.detail, status=e.status_code)
         except Exception as e:
@@ -155,39 +364,38 @@ class KeyViewSet(viewsets.ViewSet):
     
     def create(self, request):
         """
-        Create a new Redis key.
+        Create a new Redis key (collections are added to if it exists).
         Body:
         {
           "name": "user:123",
-          "type": "string" | "hash",
-          "value": "some_value" OR { "field": "val" },
+          "type": "string" | "hash" | "list" | "set" | "zset" | "stream",
+          "value": "some_value" OR { "field": "val" } OR [...],
           "ttl": 60   # optional, in seconds
         }
+        The write and its TTL go out in one round trip.
         """
         try:
-            r = get_redis_connection()
+            r = self.redis()
             name = request.data.get("name")
             key_type = request.data.get("type", "string")
             value = request.data.get("value")
-            ttl = request.data.get("ttl", None)
 
             if not name or value is None:
                 return Response({"detail": "Both 'name' and 'value' are required"}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                check_value(key_type, value)
+                ttl = parse_ttl(request.data.get("ttl", None))
+            except ValueError as e:
+                return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-            if key_type == "string":
-                r.set(name, value)
-            elif key_type == "hash":
-                if not isinstance(value, dict):
-                    return Response({"detail": "'value' must be a JSON object for hash type"}, status=status.HTTP_400_BAD_REQUEST)
-                r.hset(name, mapping=value)
-            else:
-                return Response({"detail": f"Unsupported type '{key_type}'"}, status=status.HTTP_400_BAD_REQUEST)
-
-            if ttl is not None:
-                r.expire(name, int(ttl))
+            pipe = r.pipeline()
+            queue_write(pipe, name, key_type, value, ttl)
+            pipe.execute()
 
             return Response({"detail": "Key created successfully"}, status=status.HTTP_201_CREATED)
 
+        except APIException as e:
+            return Response(e.detail, status=e.status_code)
         except Exception as e:
             return Response({"detail": "Error creating key", "error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
@@ -197,7 +405,7 @@ class KeyViewSet(viewsets.ViewSet):
         Example: DELETE /api/keys/user:123
         """
         try:
-            r = get_redis_connection()
+            r = self.redis()
             deleted = r.delete(pk)
             if deleted == 0:
                 return Response({"detail": f"Key '{pk}' not found"}, status=status.HTTP_404_NOT_FOUND)
@@ -209,84 +417,431 @@ class KeyViewSet(viewsets.ViewSet):
         """
         Get the value of a Redis key.
         - For string keys: return the string value
-        - For hash keys: return the entire hash as a dictionary
+        - For collections: return one page (?cursor=, ?count=) plus the total size
+        Type, TTL, encoding, size and the page come back in one round trip.
         Example: GET /api/keys/user:123
         """
+        cursor = request.query_params.get('cursor', '0')
         try:
-            r = get_redis_connection()
-
-            if not r.exists(pk):
+            count = page_count(request.query_params.get('count'))
+            row = inspect_key(self.redis(), pk, cursor, count)
+            if row is None:
                 return Response({"detail": f"Key '{pk}' not found"}, status=404)
+            return Response(row)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except APIException as e:
+            return Response(e.detail, status=e.status_code)
+        except Exception as e:
+            return Response({"detail": "Error retrieving key", "error": str(e)}, status=500)
 
-            key_type = r.type(pk).decode("utf-8") if isinstance(r.type(pk), bytes) else r.type(pk)
-            ttl = r.ttl(pk)
-
-            if key_type == "string":
-                value = r.get(pk)
-                if isinstance(value, bytes):
-                    value = value.decode("utf-8")
-            elif key_type == "hash":
-                value = r.hgetall(pk)
-                # decode bytes to str
-                value = {k.decode("utf-8"): v.decode("utf-8") for k, v in value.items()}
-            else:
-                value = f"<unsupported key type: {key_type}>"
+    @action(detail=False, methods=['post'])
+    def inspect(self, request):
+        """
+        Type, TTL, encoding and size of many keys in one round trip, for table views.
+        Body: {"keys": [...], "count": 0}; count > 0 also returns that many items of each value.
+        Missing keys come back with type "none".
+        """
+        keys = request.data.get('keys')
+        if not isinstance(keys, list) or not all(isinstance(key, str) for key in keys):
+            return Response({"detail": "'keys' must be a list of key names"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(keys) > settings.KEY_INSPECT_MAX_KEYS:
+            return Response({"detail": f"At most {settings.KEY_INSPECT_MAX_KEYS} keys per request"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            count = page_count(request.data.get('count'), default=0)
+            rows = inspect_keys(self.redis(), keys, '0', count)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except APIException as e:
+            return Response(e.detail, status=e.status_code)
+        except Exception as e:
+            return Response({"detail": "Error inspecting keys", "error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response({"keys": [row or {"name": key, "type": "none"} for key, row in zip(keys, rows)]})
 
-            return Response({
-                "name": pk,
-                "type": key_type,
-                "ttl": ttl,
-                "value": value
-            })
 
-        except Exception as e:
-            return Response({"detail": "Error retrieving key", "error": str(e)}, status=500)
-             
-            
-class ValueViewSet(viewsets.ViewSet):
+class ValueViewSet(InstanceScopedMixin, viewsets.ViewSet):
     def retrieve(self, request, pk=None):
+        """
+        One page of a key's value plus its total size.
+        ?cursor= (from the previous page's next_cursor) and ?count= (default 100).
+        """
         if not pk:
             raise NotFound({"detail": "Key not provided"})
+        cursor = request.query_params.get('cursor', '0')
         try:
-            r = get_redis_connection()
-            key_type = r.type(pk)
-            if key_type == 'none':
+            try:
+                count = page_count(request.query_params.get('count'))
+                row = inspect_key(self.redis(), pk, cursor, count)
+            except ValueError as e:
+                return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            if row is None:
                 raise NotFound({"detail": "Key not found"})
-            ttl = r.ttl(pk)
-            value = None
-            if key_type == 'string':
-                value = r.get(pk)
-            elif key_type == 'hash':
-                value = r.hgetall(pk)
-            elif key_type == 'list':
-                value = r.lrange(pk, 0, 99)  # Truncate to first 100
-            elif key_type == 'set':
-                value = list(r.smembers(pk))[:100]  # Truncate to first 100
-            elif key_type == 'zset':
-                value = r.zrange(pk, 0, 99, withscores=True)  # Truncate to first 100
-            elif key_type == 'stream':
-                value = r.xrevrange(pk, '+', '-', count=100)  # Last 100 entries
-            else:
-                raise APIException({"detail": f"Unsupported type: {key_type}"}, status=status.HTTP_400_BAD_REQUEST)
-            data = {'key': pk, 'type': key_type, 'ttl': ttl, 'value': value}
-            serializer = ValueSerializer(data)
+            row['key'] = row.pop('name')
+            serializer = ValueSerializer(row)
             return Response(serializer.data)
         except APIException as e:
             return Response(e.detail, status=e.status_code)
         except Exception as e:
             return Response({"detail": "Error fetching value", "error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-class StatusViewSet(viewsets.ViewSet):
+class StatusViewSet(InstanceScopedMixin, viewsets.ViewSet):
     def list(self, request):
         reachable = True
         last_metric = None
         try:
-            get_redis_connection()
-            latest = RedisMetric.objects.first()
+            self.redis().ping()
+            latest = RedisMetric.objects.filter(instance=self.redis_instance).first()
             if latest:
                 last_metric = latest.timestamp
         except APIException:
             reachable = False
         data = {'redis_reachable': reachable, 'last_metric': last_metric}
         serializer = StatusSerializer(data)
-        return Response(serializer.data)
\ No newline at end of file
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def pools(self, request):
+        """Connection pool stats (created/in-use/idle connections, wait times) per Redis URL"""
+        return Response({"pools": pool_stats()})
+
+    @action(detail=False, methods=['get'])
+    def cache(self, request):
+        """Hit/miss/coalesced counters of the INFO/DBSIZE response cache"""
+        return Response({"cache": info_cache.stats()})
+
+class MemoryReportViewSet(InstanceScopedMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Stored keyspace memory reports produced by `manage.py analyze_memory`
+    (live SCAN) or `manage.py analyze_rdb` (offline, from a dump).
+    Detail and latest views include per-prefix totals and the biggest keys.
+    GET /api/memory/reports/<id>/keys/?cursor=&count=&match=&type=
+      pages through an RDB report's key listing (name, db, type, ttl, size, bytes)
+    """
+    queryset = MemoryReport.objects.all()
+
+    def get_queryset(self):
+        return super().get_queryset().filter(instance=self.redis_instance)
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return MemoryReportSerializer
+        return MemoryReportDetailSerializer
+
+    @action(detail=False, methods=['get'])
+    def latest(self, request):
+        """Most recent finished report"""
+        report = self.get_queryset().filter(status=MemoryReport.STATUS_DONE).first()
+        if report is None:
+            raise NotFound({"detail": "No finished memory report yet"})
+        return Response(MemoryReportDetailSerializer(report).data)
+
+    @action(detail=True, methods=['get'])
+    def keys(self, request, pk=None):
+        """One page of the key listing an RDB report was run with (--keys-out)"""
+        report = self.get_object()
+        if not report.keys_path or report.status != MemoryReport.STATUS_DONE:
+            raise NotFound({"detail": "This report has no key listing"})
+        try:
+            cursor = int(request.query_params.get('cursor', 0))
+            count = min(int(request.query_params.get('count', 100)), 10000)
+        except ValueError:
+            raise ValidationError({"detail": "'cursor' and 'count' must be integers"})
+        try:
+            rows, next_cursor = read_listing(
+                report.keys_path, cursor, count, request.query_params.get('match'),
+                request.query_params.get('type'),
+            )
+        except FileNotFoundError:
+            raise NotFound({"detail": "The key listing file is gone"})
+        except (ValueError, OSError):  # a cursor that isn't a line start
+            raise ValidationError({"detail": "Invalid cursor"})
+        return Response({"keys": rows, "next_cursor": next_cursor})
+
+
+class KeyWalkerViewSet(viewsets.ViewSet):
+    """
+    SCAN walks running in this server process (searches, exports, the key
+    index and tree, bulk jobs run in-process), with their progress and the
+    load-aware pacing applied to them (see walker.py).
+    POST /api/keys/walkers/<id>/cancel/ stops one after its current batch.
+    """
+    def list(self, request):
+        return Response([walker.progress() for walker in running_walkers()])
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        walker = get_walker(int(pk)) if pk.isdigit() else None
+        if walker is None:
+            raise NotFound({"detail": "No such running walker"})
+        walker.cancel()
+        return Response(walker.progress())
+
+
+class BulkJobViewSet(InstanceScopedMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Background bulk operations on keys, run in batched pipelines at a capped
+    rate (see bulkops.py). Poll a job for progress (scanned/affected/failed).
+    POST /api/keys/bulk/ {"operation": "delete" | "expire", "match": "session:*",
+                          "ttl": 3600, "rate": 5000, "batch_size": 500}
+      (expire with "ttl": -1 removes the TTL)
+    POST /api/keys/bulk/import/?rate=&batch_size= with an NDJSON body of
+      {"name", "type", "value"[, "ttl"]} rows (each replaces its key)
+    POST /api/keys/bulk/<id>/cancel/
+    """
+    queryset = BulkJob.objects.all()
+    serializer_class = BulkJobSerializer
+
+    def get_queryset(self):
+        return super().get_queryset().filter(instance=self.redis_instance)
+
+    def pacing(self, params):
+        rate = int(params.get('rate', settings.BULK_JOB_DEFAULT_RATE))
+        batch_size = int(params.get('batch_size', settings.BULK_JOB_BATCH_SIZE))
+        if rate < 0 or batch_size < 1:
+            raise ValueError("'rate' must be >= 0 and 'batch_size' >= 1")
+        return rate, batch_size
+
+    def start(self, **fields):
+        job = BulkJob.objects.create(instance=self.redis_instance, **fields)
+        start_job(job)
+        return Response(BulkJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    def create(self, request):
+        operation = request.data.get('operation')
+        match = request.data.get('match')
+        if operation not in (BulkJob.OP_DELETE, BulkJob.OP_EXPIRE):
+            return Response({"detail": "'operation' must be 'delete' or 'expire' (use import/ to import)"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(match, str) or not match:
+            return Response({"detail": "'match' is required (use '*' for every key)"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            rate, batch_size = self.pacing(request.data)
+            ttl = None
+            if operation == BulkJob.OP_EXPIRE:
+                ttl = parse_ttl(request.data.get('ttl'))
+                ttl = -1 if ttl is None else ttl
+        except (TypeError, ValueError) as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return self.start(operation=operation, match=match, ttl=ttl, rate=rate, batch_size=batch_size)
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_keys(self, request):
+        payload = request.read(settings.BULK_IMPORT_MAX_BYTES + 1)
+        if len(payload) > settings.BULK_IMPORT_MAX_BYTES:
+            return Response({"detail": f"Import is larger than {settings.BULK_IMPORT_MAX_BYTES} bytes"},
+                            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        try:
+            payload = payload.decode('utf-8')
+            total = validate_import(payload)
+            rate, batch_size = self.pacing(request.query_params)
+        except (UnicodeDecodeError, ValueError) as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if not total:
+            return Response({"detail": "No rows to import"}, status=status.HTTP_400_BAD_REQUEST)
+        return self.start(operation=BulkJob.OP_IMPORT, payload=payload, total=total, rate=rate, batch_size=batch_size)
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        """Stop a pending or running job at its next checkpoint; work already done stays done."""
+        job = self.get_object()
+        BulkJob.objects.filter(id=job.id, status__in=[BulkJob.STATUS_PENDING, BulkJob.STATUS_RUNNING]).update(
+            status=BulkJob.STATUS_CANCELLED, finished_at=timezone.now())
+        job.refresh_from_db()
+        return Response(BulkJobSerializer(job).data)
+
+
+class PerServerHistoryViewSet(InstanceScopedMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Rows the collector stores per server, bounded by ?start=&end=. A
+    cluster's rows are its nodes' (see each row's "instance").
+    """
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.redis_instance.is_cluster:
+            queryset = queryset.filter(instance__parent=self.redis_instance)
+        else:
+            queryset = queryset.filter(instance=self.redis_instance)
+        try:
+            start = parse_time_param(self.request.query_params.get('start'))
+            end = parse_time_param(self.request.query_params.get('end'))
+        except ValueError as e:
+            raise ValidationError({"detail": str(e)})
+        if start:
+            queryset = queryset.filter(timestamp__gte=start)
+        if end:
+            queryset = queryset.filter(timestamp__lte=end)
+        return queryset
+
+
+class HotKeySnapshotViewSet(PerServerHistoryViewSet):
+    """
+    Most-mutated keys and prefixes (keyspace notifications) and most-read keys
+    (OBJECT FREQ under LFU) per HOTKEYS_SNAPSHOT_INTERVAL window, stored by
+    `collect_metrics --loop` with HOTKEYS_ENABLED. ?start=&end= bound the list.
+    """
+    queryset = HotKeySnapshot.objects.all()
+    serializer_class = HotKeySnapshotSerializer
+
+    @action(detail=False, methods=['get'])
+    def latest(self, request):
+        """The most recent window of each server (one for a standalone instance, one per cluster node)"""
+        latest = {}
+        for snapshot in self.get_queryset()[:500]:
+            latest.setdefault(snapshot.instance_id, snapshot)
+        if not latest:
+            raise NotFound({"detail": "No hot key snapshot yet (is HOTKEYS_ENABLED set for the collector?)"})
+        return Response({"results": HotKeySnapshotSerializer(latest.values(), many=True).data})
+
+
+
+class SlowLogViewSet(PerServerHistoryViewSet):
+    """
+    SLOWLOG entries gathered by the collector, newest first; ?command=GET filters.
+    /top/ ranks commands by total slow time over ?start=&end=.
+    """
+    queryset = SlowLogEntry.objects.all()
+    serializer_class = SlowLogEntrySerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        command = self.request.query_params.get('command')
+        if command:
+            queryset = queryset.filter(command=command.upper())
+        return queryset
+
+    @action(detail=False, methods=['get'])
+    def top(self, request):
+        """
+        Per command: slow calls, total/avg/max duration (us) and when it was last slow,
+        for the top ?limit= commands (default 20, at most 1000) by total duration.
+        """
+        try:
+            limit = int_param(request.query_params, 'limit', 20, minimum=1, maximum=1000)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        rows = (self.get_queryset().order_by().values('command')
+                .annotate(count=Count('id'), total_us=Sum('duration_us'), avg_us=Avg('duration_us'),
+                          max_us=Max('duration_us'), last_seen=Max('timestamp'))
+                .order_by('-total_us')[:limit])
+        return Response({"results": list(rows)})
+
+
+class LatencyEventViewSet(PerServerHistoryViewSet):
+    """Latency-monitor spikes (LATENCY HISTORY) gathered by the collector; ?event=command filters."""
+    queryset = LatencyEvent.objects.all()
+    serializer_class = LatencyEventSerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        event = self.request.query_params.get('event')
+        if event:
+            queryset = queryset.filter(event=event)
+        return queryset
+
+
+class CommandStatViewSet(InstanceScopedMixin, viewsets.ViewSet):
+    """
+    Per-command call counts and time from INFO commandstats deltas
+    (every METRICS_COMMANDSTATS_INTERVAL), summed over a cluster's nodes.
+    """
+    def get_queryset(self, params):
+        if self.redis_instance.is_cluster:
+            queryset = CommandStat.objects.filter(instance__parent=self.redis_instance)
+        else:
+            queryset = CommandStat.objects.filter(instance=self.redis_instance)
+        end = parse_time_param(params.get('end')) or timezone.now()
+        start = parse_time_param(params.get('start')) or end - timedelta(hours=1)
+        return queryset.filter(timestamp__gte=start, timestamp__lte=end), start, end
+
+    def list(self, request):
+        """
+        Commands ranked by total time over ?start=&end= (default: the last hour),
+        with calls/s, usec per call and failed/rejected calls.
+        """
+        try:
+            queryset, start, end = self.get_queryset(request.query_params)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        seconds = max((end - start).total_seconds(), 1)
+        rows = (queryset.order_by().values('command')
+                .annotate(calls=Sum('calls'), usec=Sum('usec'), failed_calls=Sum('failed_calls'),
+                          rejected_calls=Sum('rejected_calls'))
+                .order_by('-usec'))
+        for row in rows:
+            row['calls_per_sec'] = row['calls'] / seconds
+            row['usec_per_call'] = row['usec'] / row['calls'] if row['calls'] else None
+        return Response({"start": start, "end": end, "results": list(rows)})
+
+    @action(detail=False, methods=['get'])
+    def series(self, request):
+        """
+        Calls/s and usec per call over time for ?commands=get,set (lower-case),
+        in at most ?max_points= (default 500) buckets of ?start=&end=.
+        """
+        commands = [c.lower() for c in request.query_params.get('commands', '').split(',') if c]
+        if not commands:
+            return Response({"detail": "'commands' is required, e.g. ?commands=get,set"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            queryset, start, end = self.get_queryset(request.query_params)
+            max_points = int(request.query_params.get('max_points', 500))
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        bucket = max((end - start).total_seconds() / max(max_points, 1), settings.METRICS_COMMANDSTATS_INTERVAL)
+        sums = {}  # command -> bucket index -> [calls, usec]
+        rows = queryset.filter(command__in=commands).values_list('command', 'timestamp', 'calls', 'usec')
+        for command, timestamp, calls, usec in rows.iterator():
+            index = int((timestamp - start).total_seconds() // bucket)
+            totals = sums.setdefault(command, {}).setdefault(index, [0, 0])
+            totals[0] += calls
+            totals[1] += usec
+        series = {}
+        for command in commands:
+            points = sorted(sums.get(command, {}).items())
+            series[command] = {
+                "timestamp": [start + timedelta(seconds=index * bucket) for index, _ in points],
+                "calls_per_sec": [calls / bucket for _, (calls, _) in points],
+                "usec_per_call": [usec / calls for _, (calls, usec) in points],
+            }
+        return Response({"bucket_seconds": bucket, "series": series})
+
+
+class AlertRuleViewSet(viewsets.ModelViewSet):
+    """
+    Alert rules, evaluated by `collect_metrics` on every sample (edits are
+    picked up within ALERT_RULES_REFRESH_SECONDS). kind is threshold, rate
+    (change per second), zscore (rolling window) or ewma; see alerts.py.
+    """
+    queryset = AlertRule.objects.all()
+    serializer_class = AlertRuleSerializer
+
+
+class AlertViewSet(viewsets.ReadOnlyModelViewSet):
+    """Alerts raised by the rules, newest first; ?state=firing lists the open ones."""
+    queryset = Alert.objects.select_related('rule')
+    serializer_class = AlertSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['state', 'rule', 'instance']
+
+
+def prometheus_metrics(request):
+    """
+    Prometheus scrape endpoint: per-endpoint request/Redis histograms, plus
+    connection pool and INFO cache gauges for this process.
+    """
+    lines = [
+        '# HELP redilens_pool_connections Redis pool connections by state.',
+        '# TYPE redilens_pool_connections gauge',
+    ]
+    for url, stats in pool_stats().items():
+        for state in ('in_use', 'idle'):
+            lines.append(f'redilens_pool_connections{{pool="{url}",state="{state}"}} {stats[state]}')
+    cache = info_cache.stats()
+    lines += [
+        '# HELP redilens_info_cache_lookups_total INFO/DBSIZE cache lookups by result.',
+        '# TYPE redilens_info_cache_lookups_total counter',
+    ]
+    for result in ('hits', 'shared_hits', 'misses', 'coalesced'):
+        lines.append(f'redilens_info_cache_lookups_total{{result="{result}"}} {cache[result]}')
+    return HttpResponse(render_metrics(lines), content_type='text/plain; version=0.0.4; charset=utf-8')
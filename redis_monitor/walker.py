@@ -0,0 +1,239 @@
+"""
+Load-aware keyspace walking: every SCAN loop (key list and search, export,
+memory reports, bulk jobs, the key index and tree, hot-key sampling) runs
+through a ``KeyspaceWalker``.
+
+Walkers on the same server share a ``ScanGovernor``, which sets:
+
+- the SCAN ``COUNT``: sized from the measured time per key so one call
+  takes about ``SCAN_TARGET_MS`` on the server (a caller's count is only
+  an upper bound), and halved when the server is busy;
+- a 0-1 ``share`` of each walker's rate (keys visited per second): halved
+  whenever the server looks busy, and recovering by a tenth per calm check
+  (AIMD). Walkers without a rate of their own are held to
+  ``SCAN_RATE * share`` while the share is below 1.
+
+"Busy" is checked at most every ``SCAN_LOAD_CHECK_INTERVAL`` seconds:
+``instantaneous_ops_per_sec`` at or above ``SCAN_BUSY_OPS``, a new
+``LATENCY LATEST`` spike of ``SCAN_BUSY_LATENCY_MS`` or more, or the
+walkers' own SCAN calls running at over four times their target (on top
+of the round trip).
+
+Running walks are listed, with their progress, at ``/api/keys/walkers/``
+and can be cancelled there (per process, like the key index).
+"""
+import itertools
+import threading
+import time
+import weakref
+
+from django.conf import settings
+from django.utils import timezone
+
+_SLOW = 4  # SCAN calls this many times over target mean the server is struggling
+
+
+class ScanGovernor:
+    """Shared SCAN COUNT and rate share for the walkers of one server."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = settings.SCAN_COUNT_START
+        self.share = 1.0
+        self.busy = ''  # why the last check found the server busy
+        self.ops_per_sec = None
+        self.scan_ms = None  # moving average of SCAN call time
+        self.floor_ms = None  # fastest SCAN call
+        self.checked_at = None  # monotonic
+        self.latency_seen = {}  # event -> last spike seen (unix seconds)
+        self.latency_primed = False
+
+    def count_for(self, requested=None):
+        return max(1, min(requested or self.count, self.count))
+
+    def observe(self, seconds, count):
+        """Fold in one SCAN call of ``count`` that took ``seconds``."""
+        ms = seconds * 1000
+        with self._lock:
+            self.scan_ms = ms if self.scan_ms is None else 0.8 * self.scan_ms + 0.2 * ms
+            self.floor_ms = ms if self.floor_ms is None else min(self.floor_ms, ms)
+            # The fastest call seen approximates the round trip; the rest is the server's work.
+            ideal = settings.SCAN_TARGET_MS * count / max(ms - self.floor_ms, 0.01)
+            if ms < settings.SCAN_TARGET_MS and count < self.count:
+                return  # a small call that was fast says nothing about a bigger one
+            self.count = int(min(settings.SCAN_COUNT_MAX,
+                                 max(settings.SCAN_COUNT_MIN, 0.7 * self.count + 0.3 * ideal)))
+
+    def check(self, r):
+        """Re-read the server's load if due; only one walker does it per interval."""
+        now = time.monotonic()
+        with self._lock:
+            if self.checked_at is not None and now - self.checked_at < settings.SCAN_LOAD_CHECK_INTERVAL:
+                return
+            self.checked_at = now
+        # A failed load check must never fail the walk: each signal is just skipped.
+        busy = []
+        try:
+            self.ops_per_sec = r.info('stats').get('instantaneous_ops_per_sec', 0)
+            if settings.SCAN_BUSY_OPS and self.ops_per_sec >= settings.SCAN_BUSY_OPS:
+                busy.append(f'{self.ops_per_sec} ops/s')
+        except Exception:
+            pass
+        try:
+            # LATENCY may be renamed away on managed servers.
+            latest = r.execute_command('LATENCY', 'LATEST')
+            for row in latest:
+                event, at, latest_ms = row[0], int(row[1]), int(row[2])
+                seen = self.latency_seen.get(event)
+                fresh = at > seen if seen is not None else self.latency_primed
+                if fresh and latest_ms >= settings.SCAN_BUSY_LATENCY_MS:
+                    busy.append(f'{event} latency {latest_ms}ms')
+                self.latency_seen[event] = at
+            self.latency_primed = True  # spikes from before the first check don't count
+        except Exception:
+            pass
+        if self.scan_ms is not None and self.scan_ms > _SLOW * settings.SCAN_TARGET_MS + self.floor_ms:
+            busy.append(f'SCAN taking {self.scan_ms:.1f}ms')
+        with self._lock:
+            self.busy = ', '.join(busy)
+            if busy:
+                self.share = max(settings.SCAN_MIN_SHARE, self.share / 2)
+                self.count = max(settings.SCAN_COUNT_MIN, self.count // 2)
+            else:
+                self.share = min(1.0, self.share + 0.1)
+
+    def state(self):
+        return {
+            'count': self.count,
+            'share': round(self.share, 3),
+            'busy': self.busy,
+            'ops_per_sec': self.ops_per_sec,
+            'scan_ms': None if self.scan_ms is None else round(self.scan_ms, 2),
+        }
+
+
+_governors = weakref.WeakKeyDictionary()
+_governors_lock = threading.Lock()
+
+
+def governor_for(r):
+    """The governor shared by every client of ``r``'s server (its pool, or the cluster client itself)."""
+    target = getattr(r, 'connection_pool', None) or r
+    with _governors_lock:
+        governor = _governors.get(target)
+        if governor is None:
+            governor = _governors[target] = ScanGovernor()
+    return governor
+
+
+_walkers = {}
+_walkers_lock = threading.Lock()
+_ids = itertools.count(1)
+
+
+class KeyspaceWalker:
+    """
+    SCAN from ``cursor`` through the keyspace, a batch per ``step()``, or
+    paced with ``batches()``. ``count`` caps the COUNT per call; ``rate``
+    caps keys visited per second (None: ``SCAN_RATE``, 0: no cap while the
+    server is calm).
+    """
+
+    def __init__(self, r, match=None, count=None, rate=None, cursor=0, label='scan', instance=None):
+        self.r = r
+        self.match = match
+        self.requested_count = count
+        self.rate = settings.SCAN_RATE if rate is None else rate
+        self.cursor = cursor
+        self.label = label
+        self.instance = instance
+        self.governor = governor_for(r)
+        self.id = next(_ids)
+        self.scanned = 0  # keys returned
+        self.visited = 0  # COUNT asked, i.e. roughly keys the server looked at
+        self.last_count = None  # COUNT of the last SCAN call
+        self.calls = 0
+        self.done = False
+        self.started_at = timezone.now()
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def step(self):
+        """
+        One SCAN call; returns its keys and advances ``cursor`` (``done`` once
+        back at 0). Single pages don't read the server's load themselves:
+        they use the COUNT the governor last settled on.
+        """
+        count = self.governor.count_for(self.requested_count)
+        started = time.perf_counter()
+        cursor, keys = self.r.scan(cursor=self.cursor, match=self.match, count=count)
+        self.governor.observe(time.perf_counter() - started, count)
+        self.cursor = cursor
+        self.last_count = count
+        self.scanned += len(keys)
+        self.visited += count
+        self.calls += 1
+        self.done = str(cursor) == '0'
+        return keys
+
+    def effective_rate(self):
+        share = self.governor.share
+        if share >= 1:
+            return self.rate
+        return (self.rate or settings.SCAN_RATE) * share
+
+    def batches(self):
+        """
+        Yield each batch of keys (possibly empty, with MATCH) until the walk
+        is done or cancelled, registered for ``/api/keys/walkers/`` meanwhile.
+        """
+        with _walkers_lock:
+            _walkers[self.id] = self
+        try:
+            while not self.cancelled:
+                started = time.monotonic()
+                visited = self.visited
+                self.governor.check(self.r)
+                yield self.step()
+                if self.done:
+                    return
+                rate = self.effective_rate()
+                if rate:
+                    ahead = (self.visited - visited) / rate - (time.monotonic() - started)
+                    if ahead > 0:
+                        self._cancelled.wait(ahead)
+        finally:
+            with _walkers_lock:
+                _walkers.pop(self.id, None)
+
+    def progress(self):
+        return {
+            'id': self.id,
+            'label': self.label,
+            'instance': self.instance,
+            'match': self.match,
+            'cursor': str(self.cursor),
+            'scanned': self.scanned,
+            'visited': self.visited,
+            'calls': self.calls,
+            'rate': self.effective_rate(),
+            'started_at': self.started_at,
+            'cancelled': self.cancelled,
+            'governor': self.governor.state(),
+        }
+
+
+def running_walkers():
+    with _walkers_lock:
+        return list(_walkers.values())
+
+
+def get_walker(walker_id):
+    with _walkers_lock:
+        return _walkers.get(walker_id)